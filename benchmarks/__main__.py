@@ -0,0 +1,66 @@
+import os
+import sys
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench import run_benchmarks, compare_with_baseline, format_records
+from benchmarks.parity import check_metric_parity
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the CPU-side overhead of the evaluation harness")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Numbers of synthetic samples")
+    parser.add_argument("--pipeline", action="store_true", help="Use generate_strategy pipeline=True in end-to-end stages")
+    parser.add_argument("--global-batching", action="store_true", help="Use generate_strategy global_batching=True in end-to-end stages")
+    parser.add_argument("--sort-prompts", action="store_true", help="Use generate_strategy sort_prompts=True (local backend only)")
+    parser.add_argument("--backend", choices=["api", "local"], default="api", help="Fake API_Requester (api) or fake vllm.LLM with tokenization and StreamingEngine (local)")
+    parser.add_argument("--parse-workers", type=int, default=None, help="Number of tool-call parsing processes")
+    parser.add_argument("--score-workers", type=int, default=None, help="Number of metric computation processes")
+    parser.add_argument("--latency", type=float, default=None, help="Simulated API latency in milliseconds for the latency_* stages")
+    parser.add_argument("--output", type=str, default=None, help="Save the measurements to a json file")
+    parser.add_argument("--baseline", type=str, default=None, help="Compare throughput with a previously saved json file")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="Allowed relative throughput drop against the baseline")
+    parser.add_argument("--verbose", action="store_true", help="Show the output of the harness")
+    parser.add_argument("--parity", type=int, default=0, help="Check metric fast paths against the reference implementation on this many random cases first")
+    args = parser.parse_args()
+
+    if args.parity:
+        mismatches = check_metric_parity(args.parity)
+        for golden_answer, tool_calls, is_strict, fast, expected in mismatches[:10]:
+            print(f"指标不一致：golden={golden_answer} output={tool_calls} is_strict={is_strict}\n  {fast}\n  {expected}")
+        print(f"指标一致性检查：{args.parity} 个用例，{len(mismatches)} 个不一致")
+        if mismatches:
+            sys.exit(1)
+
+    generate_strategy = {}
+    if args.pipeline:
+        generate_strategy["pipeline"] = True
+    if args.global_batching:
+        generate_strategy["global_batching"] = True
+    if args.sort_prompts:
+        generate_strategy["sort_prompts"] = True
+
+    records = run_benchmarks(
+        args.sizes, generate_strategy=generate_strategy, parse_workers=args.parse_workers, score_workers=args.score_workers, quiet=not args.verbose,
+        latency=args.latency / 1000 if args.latency else None, backend=args.backend,
+    )
+    print(format_records(records))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fout:
+            json.dump(records, fout, ensure_ascii=False, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(records, baseline, tolerance=args.tolerance)
+        for size, stage, base, current in regressions:
+            print(f"吞吐下降：size={size} stage={stage} {base:.1f} -> {current:.1f} samples/s")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
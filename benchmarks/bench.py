@@ -0,0 +1,305 @@
+import gc
+import os
+import io
+import re
+import time
+import tempfile
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from run import prepare_datasets
+from evaluate import session as session_module
+from evaluate import evaluate_model_for_single_round_tool_call, evaluate_model_for_multiple_round_tool_call
+from evaluate.evaluate_model import get_prompt_for_data, parse_outputs, score_results, create_parse_pool, create_score_pool, golden_key, save_results, get_key_map
+from evaluate.scores import concat_tables
+from evaluate.statistics import score_statistics
+
+from .mock import MockEngine, MockLLM, MockFormatter, install_vllm_stub, write_synthetic_dataset
+
+METRICS = ["ExactMatch", "ToolAccuracy", "ParameterAccuracy"]
+
+MODEL_CONFIG = dict(
+    type="API_Requester",
+    path="gpt-4o",
+    api_key="mock",
+    base_url="http://localhost",
+    sampling_params=dict(max_tokens=512, temperature=0),
+)
+
+# 本地模型路径使用的假 vllm.LLM，prompt 经过 chat 模板、分词和 ModelSession 的排序与流式引擎
+LOCAL_MODEL_CONFIG = dict(
+    type="MockFormatter",
+    path="mock-local",
+    formatter=MockFormatter,
+    sampling_params=dict(max_tokens=512, temperature=0),
+)
+
+SAVE_STRATEGY = dict(
+    save_output=False,
+    save_input=False,
+    save_result=True,
+    save_golden_answer=True,
+    jsonl=True,
+)
+
+
+def reset_peak_rss():
+    """
+    把进程的内存峰值（/proc/self/status 中的 VmHWM）重置为当前占用，之后读取的峰值只反映这之后的阶段
+
+    Returns:
+        bool: 是否支持重置，只有 Linux 支持
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as fout:
+            fout.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """上次 reset_peak_rss 之后的内存峰值（MB），不支持时返回 None"""
+    try:
+        with open("/proc/self/status") as fin:
+            match = re.search(r"VmHWM:\s+(\d+) kB", fin.read())
+    except OSError:
+        return None
+    return int(match.group(1)) / 1024 if match else None
+
+
+class StageTimer:
+    """记录每个阶段的耗时、吞吐和内存峰值，内存峰值在每个阶段开始时重置，包括阶段开始时已经占用的内存"""
+
+    def __init__(self, size, quiet=True):
+        self.size = size
+        self.quiet = quiet
+        self.records = []
+
+    @contextlib.contextmanager
+    def stage(self, name, count=None):
+        count = self.size if count is None else count
+        output = io.StringIO() if self.quiet else None
+        gc.collect()
+        supported = reset_peak_rss()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(output) if self.quiet else contextlib.nullcontext():
+            yield
+        seconds = time.perf_counter() - start
+        self.records.append({
+            "size": self.size,
+            "stage": name,
+            "seconds": seconds,
+            "samples_per_sec": count / seconds if seconds > 0 else float("inf"),
+            "peak_rss_mb": peak_rss_mb() if supported else None,
+        })
+
+
+def install_mock_engine(model_config, latency=None):
+    """把假引擎放入引擎注册表，get_session 会直接复用它"""
+    engine = MockEngine(model=model_config["path"], latency=latency)
+    session_module._engines[session_module.get_engine_key(model_config)] = engine
+    return engine
+
+
+def install_mock_llm(model_config):
+    """把假的本地模型（MockLLM）放入引擎注册表，代替 build_engine 中加载的 vllm.LLM"""
+    install_vllm_stub()
+    engine = MockLLM()
+    session_module._engines[session_module.get_engine_key(model_config)] = engine
+    return engine
+
+
+def run_micro_stages(timer, dataset, dataset_name, session, save_path, model_config, parse_workers=None, score_workers=None):
+    """分别测量构造 prompt、分词、生成、解析、计算指标和保存的耗时，中间结果在返回时释放"""
+    formatter = session.formatter
+    with timer.stage("prompt"):
+        prompt_list = [get_prompt_for_data(formatter, data) for data in dataset]
+
+    with timer.stage("encode"):
+        encoded = session.encode(prompt_list)
+
+    with timer.stage("generate"):
+        output_list = session.generate(prompt_list, encoded=encoded)
+    del prompt_list, encoded
+
+    with timer.stage("parse"):
+        parse_pool = create_parse_pool(parse_workers, formatter)
+        result_list = parse_outputs(formatter, output_list, pool=parse_pool)
+        if parse_pool:
+            parse_pool.shutdown()
+
+    # score 与 score_parallel 使用同样的解析结果，只比较计算指标的部分
+    with timer.stage("score"):
+        scored_list = score_results(dataset, result_list)
+
+    if score_workers and score_workers > 1:
+        golden_keys = [golden_key(dataset_name, i, data) for i, data in enumerate(dataset)]
+        with timer.stage("score_parallel"):
+            score_pool = create_score_pool(score_workers, {dataset_name: dataset})
+            parallel_list = score_results(dataset, result_list, score_pool=score_pool, golden_keys=golden_keys)
+            score_pool.shutdown()
+        timer.records[-1]["speedup"] = timer.records[-2]["seconds"] / timer.records[-1]["seconds"]
+        # 并行计算的结果应与逐条计算完全相同
+        assert [test_result for _, _, test_result in parallel_list] == [test_result for _, _, test_result in scored_list]
+        del parallel_list, golden_keys
+    del result_list, output_list
+
+    save_list = [
+        {
+            "data_id": data[0]["content"],
+            "golden_answer": golden_answer,
+            "golden_role": data[-1]["role"],
+            "result": result,
+            "metrics": test_result,
+        }
+        for data, (result, golden_answer, test_result) in zip(dataset, scored_list)
+    ]
+    del scored_list
+
+    with timer.stage("save"):
+        save_results(save_list, {**SAVE_STRATEGY, "save_path": save_path}, model_config, dataset_name, get_key_map(SAVE_STRATEGY))
+
+
+def run_multiple_stages(timer, dataset_path, engine, model_config, strategy):
+    """测量多轮评测，返回每个数据集的逐样本指标；多轮数据只在这里加载，返回时释放"""
+    with timer.stage("load_multiple"):
+        multiple_datasets = prepare_datasets([dataset_path], "multiple_seq", lambda x: True)
+    rounds = sum(
+        1 for dataset in multiple_datasets.values() for data in dataset for message in data
+        if message["role"] == "tool_call"
+    )
+    engine.calls = 0
+    multiple_tables = {}
+    with timer.stage("end_to_end_multiple_seq"):
+        evaluate_model_for_multiple_round_tool_call(
+            model_config, multiple_datasets, METRICS, {}, evaluate_mode="seq", generate_strategy=strategy,
+            score_tables=multiple_tables,
+        )
+    timer.records[-1]["generated_rounds"] = engine.calls
+    timer.records[-1]["total_rounds"] = rounds
+    return multiple_tables
+
+
+def run_benchmark(size, work_dir, generate_strategy=None, parse_workers=None, score_workers=None, quiet=True, latency=None, backend="api"):
+    """
+    对 size 条合成数据分别测量评测流程中各阶段的耗时
+    backend 为 api 时使用 MockEngine 替换 API_Requester 的请求；为 local 时使用 MockLLM 替换 vllm.LLM，
+    测量本地模型路径上的 chat 模板、分词、sort_prompts、StreamingEngine（pipeline）和文本解析（parse_workers）
+    score_workers 大于 1 时增加 score_parallel 阶段，在进程池中根据同样的解析结果计算指标，记录相对 score 阶段的加速比，
+    耗时包括启动进程池和发送标准答案
+    latency（秒）不为空时，用模拟延迟的假引擎比较分阶段评测（latency_staged）、每批等待最慢请求的流水线
+    （latency_pipeline_serial，in_flight=1）和默认同时生成多批的流水线（latency_pipeline）
+
+    各阶段的中间结果在阶段结束后释放，单轮和多轮数据不会同时留在内存中。
+    peak_rss_mb 为阶段中的内存峰值：每个阶段开始时重置进程的 VmHWM（仅 Linux，其它平台为 None），
+    包括阶段开始时已经占用的内存，但不受之前阶段和其它规模的峰值影响
+
+    Returns:
+        list: 每个阶段一条记录，包含 seconds、samples_per_sec 和 peak_rss_mb
+    """
+    timer = StageTimer(size, quiet=quiet)
+    dataset_path = os.path.join(work_dir, f"Bench_{size}.jsonl")
+    save_path = os.path.join(work_dir, "results")
+    os.makedirs(save_path, exist_ok=True)
+    write_synthetic_dataset(dataset_path, size)
+
+    if backend == "local":
+        model_config = dict(LOCAL_MODEL_CONFIG)
+        engine = install_mock_llm(model_config)
+    else:
+        model_config = dict(MODEL_CONFIG)
+        engine = install_mock_engine(model_config)
+    session = session_module.ModelSession(model_config, engine, generate_strategy)
+
+    with timer.stage("load"):
+        datasets = prepare_datasets([dataset_path], "single_first", lambda x: True)
+    dataset_name, dataset = next(iter(datasets.items()))
+    run_micro_stages(timer, dataset, dataset_name, session, save_path, model_config, parse_workers, score_workers)
+    del dataset
+
+    strategy = dict(generate_strategy or {})
+    if parse_workers:
+        strategy["parse_workers"] = parse_workers
+    if score_workers:
+        strategy["score_workers"] = score_workers
+    single_tables = {}
+    with timer.stage("end_to_end_single"):
+        evaluate_model_for_single_round_tool_call(
+            model_config, datasets, METRICS, {}, generate_strategy=strategy, score_tables=single_tables,
+        )
+    if not latency:
+        del datasets
+    gc.collect()
+
+    multiple_tables = run_multiple_stages(timer, dataset_path, engine, model_config, strategy)
+    gc.collect()
+
+    # 把单轮结果作为基线与多轮结果按 (数据集, data_id) 配对，计算置信区间和置换检验
+    with timer.stage("statistics"):
+        score_statistics(concat_tables(multiple_tables.values()), METRICS, concat_tables(single_tables.values()))
+    del single_tables, multiple_tables
+
+    if latency:
+        # 模拟延迟只用于 API 模型
+        session_module.release_engines()
+        model_config = dict(MODEL_CONFIG)
+        install_mock_engine(model_config, latency=latency)
+        for name, extra in (
+            ("latency_staged", {"pipeline": False}),
+            ("latency_pipeline_serial", {"pipeline": True, "in_flight": 1}),
+            ("latency_pipeline", {"pipeline": True}),
+        ):
+            with timer.stage(name):
+                evaluate_model_for_single_round_tool_call(model_config, datasets, METRICS, {}, generate_strategy={**strategy, **extra})
+
+    session_module.release_engines()
+    return timer.records
+
+
+def run_benchmarks(sizes, generate_strategy=None, parse_workers=None, score_workers=None, quiet=True, work_dir=None, latency=None, backend="api"):
+    """
+    依次测量多个数据规模，work_dir 为空时使用临时目录
+    每个规模在单独的子进程中运行，之前的规模留下的内存不影响之后的测量
+    """
+    records = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                records.extend(executor.submit(
+                    run_benchmark, size, work_dir or tmp_dir,
+                    generate_strategy=generate_strategy, parse_workers=parse_workers, score_workers=score_workers, quiet=quiet,
+                    latency=latency, backend=backend,
+                ).result())
+    return records
+
+
+def compare_with_baseline(records, baseline, tolerance=0.3):
+    """
+    与基线比较吞吐，返回吞吐下降超过 tolerance 的阶段
+
+    Returns:
+        list: (size, stage, 基线吞吐, 当前吞吐)
+    """
+    base = {(r["size"], r["stage"]): r["samples_per_sec"] for r in baseline}
+    regressions = []
+    for record in records:
+        key = (record["size"], record["stage"])
+        if key in base and record["samples_per_sec"] < base[key] * (1 - tolerance):
+            regressions.append((record["size"], record["stage"], base[key], record["samples_per_sec"]))
+    return regressions
+
+
+def format_records(records):
+    """把测量结果格式化为表格"""
+    lines = [f"{'size':>8}  {'stage':<24}{'seconds':>10}{'samples/s':>12}{'peak RSS(MB)':>14}"]
+    for r in records:
+        rss = f"{r['peak_rss_mb']:.1f}" if r["peak_rss_mb"] is not None else "-"
+        line = f"{r['size']:>8}  {r['stage']:<24}{r['seconds']:>10.3f}{r['samples_per_sec']:>12.1f}{rss:>14}"
+        if "generated_rounds" in r:
+            line += f"  (生成 {r['generated_rounds']}/{r['total_rounds']} 轮)"
+        if "speedup" in r:
+            line += f"  (加速 {r['speedup']:.2f} 倍)"
+        lines.append(line)
+    return "\n".join(lines)
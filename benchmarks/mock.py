@@ -0,0 +1,308 @@
+import re
+import sys
+import json
+import zlib
+import types
+import asyncio
+import importlib.util
+
+from openai.types.chat import ChatCompletion
+from openai.types.chat.chat_completion import Choice
+
+from models.api_requester import API_Requester
+from models.base import BaseFormatter
+
+TOOL_POOL_SIZE = 64
+TOOLS_PER_SAMPLE = 8
+
+
+def make_tool(j):
+    """构造第 j 个候选工具的文档"""
+    return {
+        "name": f"tool_{j}",
+        "description": f"Synthetic tool number {j} used for benchmarking.",
+        "parameters": {
+            "type": "dict",
+            "properties": {
+                "city": {"type": "str", "description": "The city to query."},
+                "days": {"type": "int", "description": "Number of days."},
+                "unit": {"type": "str", "description": "Unit of the result.", "enum": ["metric", "imperial"]},
+            },
+            "required": ["city", "days"],
+        },
+    }
+
+
+def make_sample(i, dataset_name="Bench"):
+    """
+    构造一条处理后格式的合成数据，轮数为 1~3，每 3 条中有一条在同一轮中并行调用两个工具
+    同一样本的候选工具固定，不同样本之间按序号共享候选工具，便于观察前缀缓存的效果
+    """
+    start = (i * 7) % TOOL_POOL_SIZE
+    tools = [make_tool((start + k) % TOOL_POOL_SIZE) for k in range(TOOLS_PER_SAMPLE)]
+    data = [
+        {"role": "id", "content": f"{dataset_name}_synthetic_{i}"},
+        {"role": "candidate_tools", "content": tools},
+    ]
+    for r in range(1 + i % 3):
+        names = [tools[(i + r) % TOOLS_PER_SAMPLE]["name"]]
+        if i % 3 == 0:
+            names.append(tools[(i + r + 1) % TOOLS_PER_SAMPLE]["name"])
+        city = f"C{i}R{r}"
+        days = (i + r) % 7 + 1
+        data.append({
+            "role": "user",
+            "content": f"Please call {' and '.join(names)} for {city} over the next {days} days.",
+        })
+        data.append({
+            "role": "tool_call",
+            "content": [{"name": name, "parameters": {"city": city, "days": days}} for name in names],
+        })
+        data.append({
+            "role": "tool_response",
+            "content": {f"{name}.{k}": {"status": "ok", "value": k} for k, name in enumerate(names)},
+        })
+    return data
+
+
+def write_synthetic_dataset(path, size, dataset_name="Bench"):
+    """写入 size 条合成数据，格式与 datasets/processed 中的 jsonl 相同"""
+    with open(path, "w", encoding="utf-8") as fout:
+        for i in range(size):
+            fout.write(json.dumps(make_sample(i, dataset_name), ensure_ascii=False) + "\n")
+
+
+class MockEngine(API_Requester):
+    """
+    确定性的假推理引擎，替换 API_Requester.generate，不访问网络也不需要 GPU
+
+    根据最后一条用户消息中的工具名、城市和天数构造工具调用，
+    按消息内容的 crc32 让约四分之一的天数出错，使各项指标不全为 100。
+
+    latency（秒）不为空时模拟 API 的延迟：请求经过 API_Requester 的并发控制，只替换发送的部分，
+    每个请求等待 latency，其中约 5% 的请求等待 10 倍的时间，模拟长尾
+    """
+
+    USER_PATTERN = re.compile(r"call (.+) for (\S+) over the next (\d+) days")
+
+    def __init__(self, model="gpt-4o", tool_choice="auto", latency=None, concurrency=64):
+        super().__init__(
+            model=model, api_key="mock", base_url="http://localhost", tool_choice=tool_choice,
+            max_workers=1 if latency is None else concurrency,
+        )
+        # API_Requester.latency 记录每个请求的耗时，模拟的延迟使用另外的名字
+        self.simulated_latency = latency
+        self.calls = 0
+
+    def respond(self, prompt):
+        return self.respond_to_messages(prompt["new_messages"])
+
+    def respond_to_messages(self, messages):
+        user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        tool_calls = []
+        match = self.USER_PATTERN.search(user)
+        if match:
+            days = int(match.group(3))
+            if zlib.crc32(user.encode("utf-8")) % 4 == 0:
+                days += 1
+            for k, name in enumerate(match.group(1).split(" and ")):
+                tool_calls.append({
+                    "id": f"call_{k}",
+                    "type": "function",
+                    "function": {"name": name, "arguments": json.dumps({"city": match.group(2), "days": days})},
+                })
+        return Choice.model_validate({
+            "index": 0,
+            "finish_reason": "tool_calls" if tool_calls else "stop",
+            "message": {"role": "assistant", "content": None if tool_calls else "", "tool_calls": tool_calls or None},
+        })
+
+    def generate(self, prompt_list, sampling_params, tags=None):
+        self.calls += len(prompt_list)
+        if self.simulated_latency is not None:
+            return super().generate(prompt_list, sampling_params, tags=tags)
+        return [self.MockVLLMResponse(self.respond(prompt)) for prompt in prompt_list]
+
+    async def send(self, completion_kwargs, tag=None, exclude=None, sent=None):
+        messages = completion_kwargs["messages"]
+        key = zlib.crc32(json.dumps(messages[-1], ensure_ascii=False).encode("utf-8"))
+        await asyncio.sleep(self.simulated_latency * (10 if key % 20 == 0 else 1))
+        choice = self.respond_to_messages(messages)
+        return ChatCompletion.model_validate({
+            "id": "mock", "object": "chat.completion", "created": 0, "model": self.model,
+            "choices": [choice.model_dump()],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+
+def install_vllm_stub():
+    """
+    没有安装 vllm 时注册只包含 SamplingParams 和 inputs.TokensPrompt 的替代模块，
+    ModelSession 的本地模型路径（分词、sort_prompts、StreamingEngine）可以在没有 GPU 的环境中运行；
+    已经安装 vllm 时直接使用其中的类，只有 LLM 被 MockLLM 替换
+    """
+    # 先检查 sys.modules：已注册的替代模块没有 __spec__，find_spec 会报错
+    if "vllm" in sys.modules or importlib.util.find_spec("vllm") is not None:
+        return
+
+    class SamplingParams:
+        def __init__(self, **kwargs):
+            self.__dict__.update(kwargs)
+
+    vllm = types.ModuleType("vllm")
+    vllm.SamplingParams = SamplingParams
+    vllm.inputs = types.ModuleType("vllm.inputs")
+    vllm.inputs.TokensPrompt = dict
+    sys.modules["vllm"] = vllm
+    sys.modules["vllm.inputs"] = vllm.inputs
+
+
+class MockTokenizer:
+    """
+    按空白和标点切分的确定性分词器，词表在分词时增长，token ids 可以还原为文本
+    chat 模板把候选工具放在最前面，与真实模板一样，使用相同工具的 prompt 有较长的公共前缀
+    """
+
+    TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+    def __init__(self):
+        self.vocab = {"</think>": 0}
+        self.tokens = ["</think>"]
+        self.truncation_side = "right"
+
+    def get_vocab(self):
+        return dict(self.vocab)
+
+    def apply_chat_template(self, messages, tools=None, tokenize=False, add_generation_prompt=True, **kwargs):
+        parts = [f"<tools> {json.dumps(tools, ensure_ascii=False)} </tools>"] if tools else []
+        for message in messages:
+            content = message["content"]
+            if not isinstance(content, str):
+                content = json.dumps(content, ensure_ascii=False)
+            parts.append(f"<{message['role']}> {content}")
+        if add_generation_prompt:
+            parts.append("<assistant>")
+        return "\n".join(parts)
+
+    def encode(self, text):
+        ids = []
+        for token in self.TOKEN_PATTERN.findall(text):
+            if token not in self.vocab:
+                self.vocab[token] = len(self.tokens)
+                self.tokens.append(token)
+            ids.append(self.vocab[token])
+        return ids
+
+    def decode(self, ids):
+        return " ".join(self.tokens[i] for i in ids)
+
+    def batch_encode_plus(self, texts, truncation=False, max_length=None):
+        input_ids = [self.encode(text) for text in texts]
+        if truncation and max_length is not None:
+            input_ids = [ids[-max_length:] if self.truncation_side == "left" else ids[:max_length] for ids in input_ids]
+        return types.SimpleNamespace(input_ids=input_ids)
+
+
+class MockToolParser:
+    """解析 <tool_call>{json}</tool_call> 格式的输出，返回与 vllm 的 tool parser 相同结构的结果"""
+
+    TOOL_CALL_PATTERN = re.compile(r"<tool_call>(.*?)</tool_call>", re.DOTALL)
+
+    def extract_tool_calls(self, output, request):
+        tool_calls = []
+        for text in self.TOOL_CALL_PATTERN.findall(output):
+            call = json.loads(text)
+            tool_calls.append(types.SimpleNamespace(
+                type="function",
+                function=types.SimpleNamespace(name=call["name"], arguments=json.dumps(call["arguments"])),
+            ))
+        content = self.TOOL_CALL_PATTERN.sub("", output).strip()
+        return types.SimpleNamespace(content=content or None, tool_calls=tool_calls)
+
+
+class MockFormatter(BaseFormatter):
+    """与 MockLLM 配套的格式化器，prompt 的构造和输出的解析与真实的本地模型格式化器相同"""
+
+    SAMPLING_PARAMS = {
+        "temperature": 0,
+        "max_tokens": 512,
+    }
+
+    def __init__(self, tokenizer, additional_prompt="", **kwargs):
+        self.tokenizer = tokenizer
+        self.parser = MockToolParser()
+        self.additional_prompt = additional_prompt
+
+    def get_prompt(self, messages, candidate_tools, add_generation_prompt=True):
+        new_messages = []
+        for message in messages:
+            if message["role"] == "tool_call":
+                new_messages.append({
+                    "role": "assistant",
+                    "content": "\n".join(
+                        f"<tool_call>{json.dumps({'name': call['name'], 'arguments': call['parameters']})}</tool_call>"
+                        for call in message["content"]
+                    ),
+                })
+            else:
+                new_messages.append(message)
+        return self.tokenizer.apply_chat_template(new_messages, tools=candidate_tools, add_generation_prompt=add_generation_prompt)
+
+
+class MockRequestOutput:
+    def __init__(self, request_id, text):
+        self.request_id = request_id
+        self.outputs = [API_Requester.MockVLLMResponse.Output(text)]
+        self.finished = True
+
+
+class MockLLMEngine:
+    """LLMEngine 的 add_request / step 接口，每次 step 完成最多 max_num_seqs 个请求，供 StreamingEngine 使用"""
+
+    def __init__(self, llm, max_num_seqs=256):
+        self.llm = llm
+        self.max_num_seqs = max_num_seqs
+        self.waiting = []
+
+    def add_request(self, request_id, request, sampling_params):
+        self.waiting.append((request_id, request))
+
+    def step(self):
+        batch, self.waiting = self.waiting[:self.max_num_seqs], self.waiting[self.max_num_seqs:]
+        return [MockRequestOutput(request_id, self.llm.respond(request)) for request_id, request in batch]
+
+    def has_unfinished_requests(self):
+        return len(self.waiting) > 0
+
+
+class MockLLM:
+    """
+    确定性的假 vllm.LLM：把 token ids 还原为文本，按 MockEngine 同样的规则对最后一条用户消息构造
+    <tool_call> 格式的输出，使本地模型路径上的分词、排序、生成和解析都可以在没有 GPU 的环境中测量
+    """
+
+    def __init__(self, **kwargs):
+        self.tokenizer = MockTokenizer()
+        self.llm_engine = MockLLMEngine(self)
+        self.calls = 0
+
+    def get_tokenizer(self):
+        return self.tokenizer
+
+    def respond(self, request):
+        self.calls += 1
+        text = self.tokenizer.decode(request["prompt_token_ids"])
+        user = text.rsplit("< user >", 1)[-1]
+        match = MockEngine.USER_PATTERN.search(user)
+        if not match:
+            return ""
+        days = int(match.group(3))
+        if zlib.crc32(user.encode("utf-8")) % 4 == 0:
+            days += 1
+        return "\n".join(
+            f"<tool_call>{json.dumps({'name': name, 'arguments': {'city': match.group(2), 'days': days}})}</tool_call>"
+            for name in match.group(1).split(" and ")
+        )
+
+    def generate(self, request_list, sampling_params=None):
+        return [MockRequestOutput(str(i), self.respond(request)) for i, request in enumerate(request_list)]
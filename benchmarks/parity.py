@@ -0,0 +1,57 @@
+import random
+
+from evaluate.metrics import metrics_for_single_round_tool_call, compare_params_simple, compare_params_bfcl
+
+NAMES = ["search", "weather", "book"]
+VALUES = ["a", "b", " a ", 1, 1.0, True, 2, [1, 2], None, {"x": 1, "y": " b"}, {"y": " b", "x": 1}]
+
+def random_call(rng, keys=3):
+    return {
+        "name": rng.choice(NAMES),
+        "parameters": {f"p{k}": rng.choice(VALUES) for k in range(rng.randint(0, keys))},
+    }
+
+
+def random_case(rng):
+    """
+    随机构造一对 (golden_answer, tool_calls)：大部分为 1 对 1，部分为同名工具的多次调用，
+    输出由答案复制后随机修改参数、打乱顺序、增删调用得到，使精确匹配、部分匹配和歧义匹配都会出现
+    """
+    golden_answer = [random_call(rng) for _ in range(rng.choice([0, 1, 1, 1, 2, 3, 4]))]
+    tool_calls = []
+    for call in golden_answer:
+        output = {"name": call["name"], "parameters": dict(call["parameters"])}
+        for key in list(output["parameters"]):
+            if rng.random() < 0.2:
+                output["parameters"][key] = rng.choice(VALUES)
+        tool_calls.append(output)
+    if rng.random() < 0.3:
+        tool_calls.append(random_call(rng))
+    if tool_calls and rng.random() < 0.2:
+        tool_calls.pop(rng.randrange(len(tool_calls)))
+    rng.shuffle(tool_calls)
+    return golden_answer, tool_calls
+
+
+def check_metric_parity(count=10000, seed=0):
+    """
+    在随机用例上比较 fast_path 与原来的 linear_sum_assignment 实现，固定的回归用例见 tests/test_metrics.py
+
+    Returns:
+        list: 结果不一致的 (golden_answer, tool_calls, is_strict, fast 的结果, 原实现的结果)
+    """
+    rng = random.Random(seed)
+    mismatches = []
+    for _ in range(count):
+        golden_answer, tool_calls = random_case(rng)
+        is_strict = rng.random() < 0.5
+        compare_params = rng.choice([compare_params_simple, compare_params_bfcl])
+        try:
+            expected = metrics_for_single_round_tool_call(golden_answer, tool_calls, is_strict, compare_params, fast_path=False)
+        except Exception:
+            # 原实现对某些参数会出错（如 bfcl 比较字典值），这样的用例不比较
+            continue
+        fast = metrics_for_single_round_tool_call(golden_answer, tool_calls, is_strict, compare_params, fast_path=True)
+        if fast != expected:
+            mismatches.append((golden_answer, tool_calls, is_strict, fast, expected))
+    return mismatches
@@ -22,6 +22,7 @@ tagger = dict(
     api_key="Your_API_Key", # 替换为你的 API Key
     base_url="Your_API_URL", # 替换为你的 API URL
     max_workers=4,
+    # http=dict(http2=False, max_connections=16, keepalive_expiry=60), # 每个进程中保持连接的连接池
 )
 # 使用模型打标签时需要实现 preprocess_func 和 postprocess_func 函数
 
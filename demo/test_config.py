@@ -25,13 +25,54 @@ test_models = [
     #     type="API_Requester", # 也可以不指定类型，可自动推测
     #     path="gpt-4o",
     #     api_key="Your-API-Key", # 替换为你的API密钥
-    #     base_url="Your-API-Base-URL", # 替换为你的API基础URL
+    #     base_url="Your-API-Base-URL", # 替换为你的API基础URL，也可以是多个地址的列表（如多个 vLLM 副本）
     #     sampling_params=dict(
     #         max_tokens=4096,
     #         temperature=0.7,
     #     ),
     #     tool_choice="required", # default: auto
     #     max_workers=4, # default: 1
+    #     stream=False, # 流式请求，记录首 token 时间（TTFT）、token 间隔（ITL）和每秒输出 token 数的 p50/p95/p99 并写入报告
+    #     dedup=None, # 合并完全相同的请求只发送一次，默认仅在 temperature=0 时合并，合并比例写入报告
+    #     concurrency=256, # 同时进行的请求数，使用异步客户端，默认与 max_workers 相同
+    #     rate_limit=dict( # 限速与重试策略，重试、超时、限流和放弃的次数会写入报告
+    #         requests_per_min=600, # 每分钟请求数，默认不限制
+    #         tokens_per_min=200000, # 每分钟 token 数（按输入长度估计，加上 max_tokens），默认不限制
+    #         max_retries=5, # 429、5xx、超时和连接错误的最大重试次数，优先使用响应头中的 Retry-After
+    #         base_delay=1, # 指数退避的初始等待时间（秒），带随机抖动
+    #         max_delay=60, # 最长等待时间（秒）
+    #         timeout=120, # 单个请求的超时时间（秒）
+    #         adaptive=True, # 被限流时并发数减半，之后逐渐恢复
+    #     ),
+    #     load_balance=dict( # base_url 为列表时的负载均衡，concurrency 和限速为所有端点的总和
+    #         policy="least_outstanding", # least_outstanding: 进行中请求最少; latency: 按平均延迟加权
+    #         max_failures=3, # 连续失败（5xx、超时、连接错误）多少次后摘除该端点
+    #         eject_seconds=30, # 摘除时间（秒），之后请求 /models 探测，失败则时间加倍
+    #     ),
+    #     budget=dict( # 预算，按估计的用量从小到大发送请求，用完后剩余的请求不再发送（计入 BudgetSkipped）；
+    #                  # 没有发送的样本不计入得分，报告中 Scored 为实际计分的样本数。预算在同一模型的所有评测之间共享，Cost 等统计按每次评测计算
+    #         max_tokens=10000000, # 输入与输出 token 的总数，默认不限制
+    #         max_cost=20, # 总费用，默认不限制
+    #         prices=dict(prompt=2.5, completion=10), # 每百万 token 的价格，用于计算报告中的 Cost
+    #     ),
+    #     hedge=dict( # 对冲请求：超过近期耗时的分位数仍未返回时，向另一个端点重复发送，使用先返回的结果；
+    #                 # 对冲请求同样受并发数、限速和预算约束，被取消的请求按返回结果的用量计入
+    #         percentile=95,
+    #         min_delay=1, # 最短等待时间（秒）
+    #         max_ratio=0.1, # 对冲请求最多占请求总数的比例，发出和胜出的次数（Hedges、HedgeWins）写入报告
+    #     ),
+    #     http=dict( # HTTP 连接池，所有端点共用并保持连接
+    #         http2=False, # 需要安装 httpx[http2]
+    #         max_connections=256, # 默认与 concurrency 相同
+    #         keepalive_expiry=60, # 空闲连接的保持时间（秒）
+    #     ),
+    #     batch=dict( # 批处理模式，适合大规模评测，请求写入 jsonl 文件后一次提交，按 custom_id 取回结果
+    #         backend="openai", # openai: 使用 Batch API; local: 在本地按同样的文件格式逐条请求 base_url，用于测试
+    #         work_dir="./batches", # 输入输出文件的目录，同样的请求已有输出文件时直接使用，已提交的任务中断后继续等待
+    #         poll_interval=30, # 轮询任务状态的间隔（秒）
+    #         completion_window="24h",
+    #         max_requests_per_file=50000, # 每个批处理文件的最大请求数，超出后拆分为多个任务同时执行
+    #     ),
     # ),
 
 ]
@@ -74,12 +115,12 @@ test_tags = dict(
     ]
 )
 
-test_mode = "single_first"
+test_mode = "single_first" # 也可以是列表，如 ["single_first", "multiple_seq"]，同一个模型只加载一次
 # - single_*
 #   - single_first 以第一个 tool_call 块为答案，忽略后续内容
 #   - single_last 以最后个 tool_call 块为答案，之前的部分使用 golden 值
 # - multiple_*
-#   - multiple_seq 多轮调用中，当前面的调用正确，才评估接下来的调用，计算平均分
+#   - multiple_seq 多轮调用中，当前面的调用正确，才评估接下来的调用，计算平均分（不会计分的轮次不再生成，长度报告为按实际生成轮次平均的 avg_*_generated）
 #   - multiple_avg 多轮调用中，默认前面调用正确，直接评估所有轮次，计算平均分
 test_metrics = [
     "ExactMatch",
@@ -97,11 +138,54 @@ save_strategy = dict(
     only_date=True,
 )
 
+# 断点续评：每生成 chunk_size 条输出就保存一次，中断后重新执行相同的配置会跳过已经生成的数据
+# 断点按 模型路径、生成参数、test_mode、数据集名称、data_id（多轮评测中为 data_id + 轮次）区分，prompt 与保存时不同的输出会重新生成
+# checkpoint_strategy = dict(
+#     path="./checkpoints",
+#     chunk_size=512,
+# )
+
+# 生成缓存：以 模型路径、采样参数 和最终请求内容（token ids 或 API 请求参数）为键，可在不同配置之间共享
+# 只修改 is_strict、test_metrics、test_tags 等参数重新评测时，已缓存的请求无需再次推理，命中情况会写入报告
+# cache_strategy = dict(
+#     path="./cache/generation.sqlite",
+#     max_size_mb=4096, # 超出后按最近访问时间淘汰
+# )
+
+# 生成的调度策略
+# generate_strategy = dict(
+#     global_batching=True, # 合并所有数据集的 prompt 一起生成，生成后再按数据集分别计算指标
+#     sort_prompts=True, # 本地模型按共享前缀（候选工具）排序后提交，配合模型配置中的 enable_prefix_caching=True 使用
+#     pipeline=True, # 仅用于单轮评测（single_* 模式），multiple_* 模式会提示并忽略。使用流水线：构造 prompt、分词、生成和计算指标同时进行，不再一次性保存所有 prompt 和输出
+#     chunk_size=256, # 流水线中每批提交生成的 prompt 数
+#     queue_size=4, # 流水线各段之间最多缓存的批数
+#     in_flight=8, # 流水线中同时生成的批数，某一批只剩长尾请求时其它批仍在生成，引擎不会在批尾空闲
+#     parse_workers=8, # 解析工具调用的进程数（仅本地模型），同一次评测共用一个进程池，一批输出不少于 64 条时并行解析
+#     score_workers=8, # 计算指标的进程数，同一次评测共用一个进程池，流水线的每一批也分块并行计算，结果按原顺序合并
+# )
+
 report_strategy = [
     "json",
     # "lark",
 ]
 
+# 除了各数据集和平均结果外，额外报告的分组结果，从每个样本的得分中直接统计，不需要重新评测
+# report_breakdown = [
+#     "benchmark", # 按评测集分组，如 Benchmark-BFCL
+#     "tag", # 按 test_tags 中各标签体系的标签分组，如 Tag-multi-turn，一个样本可以属于多个标签
+# ]
+
+# 报告中附带各指标的 bootstrap 置信区间，如 ExactMatch-AllTools-CI-Low / -CI-High
+# report_statistics = dict(
+#     n_resamples=1000, # bootstrap 的重采样次数
+#     n_permutations=10000, # 配对置换检验的次数
+#     confidence=0.95,
+#     seed=0,
+#     # 另一个模型保存的单轮评测结果（文件或目录），按 (数据集, data_id) 配对比较，基线中没有的指标列在 Unmatched-Metrics 中，
+#     # 报告中增加 Matched、<指标>-Diff、<指标>-Diff-CI-Low / -Diff-CI-High 和 <指标>-p
+#     baseline="./results/2025-01-01/",
+# )
+
 json_config = dict(
     path="./results",
 )
@@ -1,6 +1,11 @@
 from .evaluate_model import evaluate_model_for_single_round_tool_call, evaluate_model_for_multiple_round_tool_call
+from .rescore import rescore_results
+from .session import get_session, release_engines
 
 __all__ = [
     "evaluate_model_for_single_round_tool_call",
     "evaluate_model_for_multiple_round_tool_call",
+    "rescore_results",
+    "get_session",
+    "release_engines",
 ]
\ No newline at end of file
@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+from .checkpoint import dump_output, load_output
+
+
+class GenerationCache:
+    """
+    基于 SQLite 的生成结果缓存，可以在不同的评测配置之间共享
+
+    缓存的键是 (模型路径, 采样参数) 与最终请求内容的哈希：本地模型为截断后的 token ids，API 模型为请求参数。
+    因此只改变 is_strict、评测指标或数据筛选条件时，重复的请求不需要再次推理。
+    缓存总大小超过 max_size_mb 时按最近访问时间淘汰（LRU）。
+    流水线中多批请求同时生成，读写通过锁串行执行。
+    """
+
+    def __init__(self, path, namespace, max_size_mb=4096):
+        dir_path = os.path.dirname(path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+        self.namespace = namespace
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.hits = {}
+        self.misses = {}
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS generation ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS generation_last_access ON generation (last_access)")
+        self.conn.commit()
+        # 缓存总大小的计数，写入和淘汰时更新，只在超过上限时重新扫描全表
+        self.total_size = self._scan_size()
+
+    def key(self, payload):
+        """计算请求内容的键，payload 为 token ids 或 API 的请求参数"""
+        text = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256((self.namespace + "\n" + text).encode("utf-8", "ignore")).hexdigest()
+
+    def get_many(self, keys, tags=None):
+        """
+        批量读取缓存，返回 key -> 输出 的字典，并更新命中与未命中的计数
+        tags 与 keys 一一对应（如请求所属的数据集），用于分别统计命中情况
+        """
+        with self.lock:
+            found = {}
+            unique_keys = list(dict.fromkeys(keys))
+            for start in range(0, len(unique_keys), 500):
+                chunk = unique_keys[start:start + 500]
+                rows = self.conn.execute(
+                    "SELECT key, value FROM generation WHERE key IN ({})".format(",".join("?" * len(chunk))),
+                    chunk,
+                ).fetchall()
+                for key, value in rows:
+                    found[key] = load_output(json.loads(value))
+            if found:
+                now = time.time()
+                self.conn.executemany("UPDATE generation SET last_access = ? WHERE key = ?", [(now, key) for key in found])
+                self.conn.commit()
+            if tags is None:
+                tags = [None] * len(keys)
+            for key, tag in zip(keys, tags):
+                counter = self.hits if key in found else self.misses
+                counter[tag] = counter.get(tag, 0) + 1
+            return found
+
+    def put_many(self, keys, outputs):
+        """批量写入缓存，空输出（如 API 请求失败）不缓存"""
+        now = time.time()
+        rows = {}
+        for key, output in zip(keys, outputs):
+            record = dump_output(output)
+            if record.get("text") == "":
+                continue
+            value = json.dumps(record)
+            rows[key] = (key, value, len(value), now)
+        if not rows:
+            return
+        with self.lock:
+            # 替换已有的记录时减去原来的大小
+            replaced = 0
+            unique_keys = list(rows)
+            for start in range(0, len(unique_keys), 500):
+                chunk = unique_keys[start:start + 500]
+                replaced += self.conn.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM generation WHERE key IN ({})".format(",".join("?" * len(chunk))),
+                    chunk,
+                ).fetchone()[0]
+            self.conn.executemany("INSERT OR REPLACE INTO generation VALUES (?, ?, ?, ?)", rows.values())
+            self.conn.commit()
+            self.total_size += sum(row[2] for row in rows.values()) - replaced
+            self.evict()
+
+    def _scan_size(self):
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM generation").fetchone()[0]
+
+    def evict(self):
+        """
+        淘汰最久未访问的记录，直到缓存总大小不超过上限
+        计数超过上限时才扫描全表，同时校正其它进程共用同一个缓存文件时计数的偏差
+        """
+        if self.total_size <= self.max_size:
+            return
+        self.total_size = self._scan_size()
+        if self.total_size <= self.max_size:
+            return
+        to_free = self.total_size - self.max_size
+        rows = self.conn.execute("SELECT key, size FROM generation ORDER BY last_access ASC").fetchall()
+        to_delete = []
+        for key, size in rows:
+            if to_free <= 0:
+                break
+            to_delete.append((key,))
+            to_free -= size
+            self.total_size -= size
+        self.conn.executemany("DELETE FROM generation WHERE key = ?", to_delete)
+        self.conn.commit()
+
+    def stats(self, tag=None):
+        """返回某个 tag 的命中情况，tag 为空时返回总的命中情况"""
+        if tag is None:
+            return {
+                "CacheHit": sum(self.hits.values()),
+                "CacheMiss": sum(self.misses.values()),
+            }
+        return {
+            "CacheHit": self.hits.get(tag, 0),
+            "CacheMiss": self.misses.get(tag, 0),
+        }
+
+    def close(self):
+        self.conn.close()
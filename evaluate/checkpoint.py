@@ -0,0 +1,114 @@
+import os
+import json
+import hashlib
+import threading
+
+from models.api_requester import API_Requester
+
+
+def hash_config(config):
+    """对生成相关的配置计算稳定的哈希值"""
+    text = json.dumps(config, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.md5(text.encode("utf-8")).hexdigest()[:12]
+
+
+def hash_prompt(prompt):
+    """对实际发送的 prompt（文本或 API 的消息和工具）计算哈希，断点中的输出只在 prompt 相同时复用"""
+    if not isinstance(prompt, str):
+        prompt = json.dumps(prompt, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.md5(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def dump_output(output):
+    """把 llm.generate 的单条输出转换为可以写入 json 的记录"""
+    text = output.outputs[0].text
+    if isinstance(text, str):
+        return {"text": text}
+    # API_Requester 的输出是 openai 的 Choice 对象
+    return {"choice": text.model_dump()}
+
+
+def load_output(record):
+    """把记录还原为与 llm.generate 输出相同结构的对象"""
+    if "choice" in record:
+        from openai.types.chat.chat_completion import Choice
+        return API_Requester.MockVLLMResponse(Choice.model_validate(record["choice"]))
+    return API_Requester.MockVLLMResponse(record["text"])
+
+
+class CheckpointStore:
+    """
+    评测过程中的断点存储
+
+    以 (模型路径, 生成配置的哈希, test_mode, 数据集名称, data_id) 为键，每生成一批输出就追加写入对应的 jsonl 文件，
+    每条记录同时保存 prompt 的哈希，读取时 prompt 不同的记录视为不存在。
+    重新执行相同的评测配置时，已经生成的输出会被直接读取，只对剩余的数据进行生成。
+    """
+
+    def __init__(self, path, model_path, generation_config, test_mode=None):
+        self.generation_hash = hash_config(generation_config)
+        model_name = model_path.strip("/").split("/")[-1]
+        model_hash = hashlib.md5(model_path.encode("utf-8")).hexdigest()[:6]
+        self.path = os.path.join(path, f"{model_name}_{model_hash}_{self.generation_hash}")
+        # 不同 test_mode 中同一 data_id 的 prompt 不同（如 single_first 和 single_last），分目录保存
+        self.mode_path = os.path.join(self.path, test_mode) if test_mode else self.path
+        os.makedirs(self.mode_path, exist_ok=True)
+        meta_path = os.path.join(self.path, "meta.json")
+        if not os.path.exists(meta_path):
+            with open(meta_path, "w", encoding="utf-8") as fout:
+                json.dump({
+                    "model": model_path,
+                    "generation_config": generation_config,
+                }, fout, ensure_ascii=False, indent=4, default=str)
+        # 已读取的断点保存在内存中，分批生成时不需要反复读取文件
+        self._loaded = {}
+        # 流水线中多批请求同时生成并保存
+        self._lock = threading.RLock()
+
+    def _file(self, dataset_name):
+        return os.path.join(self.mode_path, dataset_name.replace("/", "_") + ".jsonl")
+
+    def load(self, dataset_name):
+        """读取某个数据集已经生成的输出，返回 key -> (prompt 的哈希, 输出) 的字典，同一 key 以最后写入的为准"""
+        with self._lock:
+            if dataset_name in self._loaded:
+                return self._loaded[dataset_name]
+            saved = self._loaded[dataset_name] = {}
+            path = self._file(dataset_name)
+            if not os.path.exists(path):
+                return saved
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 中断时可能写入了不完整的最后一行
+                        continue
+                    saved[record["key"]] = (record.get("prompt_hash"), load_output(record["output"]))
+            return saved
+
+    def get(self, dataset_name, key, prompt_hash):
+        """读取一条输出，没有保存或保存时的 prompt 与本次不同时返回 None"""
+        saved_hash, output = self.load(dataset_name).get(key, (None, None))
+        return output if saved_hash == prompt_hash else None
+
+    def append(self, dataset_name, keys, outputs, prompt_hashes):
+        """追加保存一批输出及其 prompt 的哈希，空输出（如 API 请求失败）不保存，以便下次重新生成"""
+        lines, saved = [], []
+        for key, output, prompt_hash in zip(keys, outputs, prompt_hashes):
+            record = dump_output(output)
+            if record.get("text") == "":
+                continue
+            lines.append(json.dumps({"key": key, "prompt_hash": prompt_hash, "output": record}))
+            saved.append((key, prompt_hash, output))
+        if not lines:
+            return
+        # 内存中的断点与文件在同一把锁内更新，其它线程的 load 不会在两者之间读取
+        with self._lock:
+            if dataset_name in self._loaded:
+                for key, prompt_hash, output in saved:
+                    self._loaded[dataset_name][key] = (prompt_hash, output)
+            with open(self._file(dataset_name), "a", encoding="utf-8") as fout:
+                fout.write("\n".join(lines) + "\n")
+                fout.flush()
+                os.fsync(fout.fileno())
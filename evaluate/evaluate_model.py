@@ -1,21 +1,97 @@
 import os
 import json
 import datetime
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
-from .metrics import metrics_for_single_round_tool_call, metrics_for_bfcl
-from models.api_requester import API_Requester
+from models.base import BaseFormatter, _init_worker as _init_parse_worker
 
-VLLM_LLM_OPTS = [
-    "max_model_len",
-    "max_num_seqs",
-    "max_seq_len_to_capture",
-    "gpu_memory_utilization",
-    "trust_remote_code",
-]
+from .metrics import metrics_for_single_round_tool_call, metrics_for_bfcl
+from .checkpoint import CheckpointStore, hash_config, hash_prompt
+from .cache import GenerationCache
+from .session import get_session, get_truncate_prompt_tokens
+from .pipeline import run_pipeline
+from .scores import ScoreTable, GENERATED_LENGTH_KEYS
+
+# 输出少于这个数量时在当前进程中计算指标，进程间通信的开销超过并行的收益
+MIN_PARALLEL_SCORE = 64
+
+# 标准答案所在消息的角色
+GOLDEN_ROLES = ("tool_call", "tool_call_ground_truth")
+
+# 子进程中的标准答案和 is_strict，由进程池的 initializer 设置
+_worker_golden = None
+_worker_is_strict = True
+
+def _init_score_worker(golden, is_strict):
+    global _worker_golden, _worker_is_strict
+    _worker_golden = golden
+    _worker_is_strict = is_strict
+
+def _score_chunk(task):
+    golden_keys, tool_calls_list = task
+    results = []
+    for (dataset_name, index, message_index), tool_calls in zip(golden_keys, tool_calls_list):
+        golden_answer, golden_role = _worker_golden[dataset_name][index][message_index]
+        results.append(compute_metrics(golden_answer, golden_role, tool_calls, is_strict=_worker_is_strict))
+    return results
+
+def golden_key(dataset_name, index, data):
+    """标准答案在进程池中的键：(数据集名称, 样本序号, 标准答案所在消息的位置)，data 为截止到标准答案的消息"""
+    return dataset_name, index, len(data) - 1
+
+def create_score_pool(score_workers, datasets, is_strict=True):
+    """
+    创建计算指标的进程池，同一次评测的所有数据集、轮次和流水线的每一批共用，评测结束后调用 shutdown
+    所有标准答案通过 initializer 在子进程启动时发送一次，任务中只包含标准答案的键（见 golden_key）和解析出的工具调用
+    score_workers 为空或不大于 1 时返回 None，在当前进程中计算
 
-THINKING_MODLES = [
-    "Qwen_3",
-]
+    子进程通过 forkserver（不支持时为 spawn）启动：评测时进程中已经有引擎、流水线和 API 请求的线程，
+    从多线程的进程中 fork 可能死锁
+    """
+    if not score_workers or score_workers <= 1:
+        return None
+    golden = {
+        dataset_name: [
+            {
+                j: (message["content"], message["role"])
+                for j, message in enumerate(data)
+                if message["role"] in GOLDEN_ROLES or j == len(data) - 1
+            }
+            for data in dataset
+        ]
+        for dataset_name, dataset in datasets.items()
+    }
+    return ProcessPoolExecutor(
+        max_workers=score_workers, mp_context=get_worker_context(),
+        initializer=_init_score_worker, initargs=(golden, is_strict),
+    )
+
+def create_parse_pool(parse_workers, formatter):
+    """
+    创建解析工具调用的进程池，与计算指标的进程池一样每次评测创建一个，评测结束后调用 shutdown
+    格式化器在子进程启动时发送一次；API 模型的输出已经是结构化的，不需要进程池，返回 None
+    """
+    if not parse_workers or parse_workers <= 1 or not isinstance(formatter, BaseFormatter):
+        return None
+    if formatter.tokenizer is not None:
+        # 发送前计算好，子进程中不需要再构建词表
+        formatter.has_think_token()
+    return ProcessPoolExecutor(
+        max_workers=parse_workers, mp_context=get_worker_context(),
+        initializer=_init_parse_worker, initargs=(formatter,),
+    )
+
+def get_worker_context():
+    """
+    子进程的启动方式：优先使用 forkserver，forkserver 进程预先导入本模块，之后的子进程从它 fork，不需要重新导入；
+    不支持时使用 spawn
+    """
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload([__name__])
+    return context
 
 def clean_surrogates(text):
     if isinstance(text, str):
@@ -32,27 +108,158 @@ def clean_data_for_json(data):
         return clean_surrogates(data)
     else:
         return data
-        
-def evaluate_model_for_single_round_tool_call(model_config, datasets, metrics, save_strategy, debug=False, is_strict=True, report=None):
+
+def get_checkpoint_store(model_config, sampling_config, checkpoint_strategy, debug=False, test_mode=None):
+    """根据断点策略创建断点存储，生成配置中包含所有会影响模型输出的参数，不同 test_mode 的断点分开保存"""
+    if not checkpoint_strategy or debug:
+        return None
+    generation_config = {
+        "sampling_params": sampling_config,
+        "truncate_prompt_tokens": get_truncate_prompt_tokens(model_config),
+        "additional_prompt": model_config.get("additional_prompt", ""),
+        "enable_thinking": model_config.get("enable_thinking"),
+        "tool_choice": model_config.get("tool_choice"),
+    }
+    return CheckpointStore(checkpoint_strategy.get("path", "./checkpoints"), model_config["path"], generation_config, test_mode=test_mode)
+
+def get_generation_cache(model_config, sampling_config, cache_strategy, debug=False):
+    """根据缓存策略打开生成缓存，同一模型和采样参数下的相同请求共享缓存"""
+    if not cache_strategy or debug:
+        return None
+    namespace = hash_config({
+        "model": model_config["path"],
+        "sampling_params": sampling_config,
+    })
+    return GenerationCache(
+        cache_strategy.get("path", "./cache/generation.sqlite"),
+        namespace,
+        max_size_mb=cache_strategy.get("max_size_mb", 4096),
+    )
+
+def report_generation_stats(report, dataset_name, result, session, cache=None):
+    """把数据集的指标连同缓存命中情况和前缀共享比例交给 report，后两者只出现在报告中，不参与数据集之间的平均"""
+    cache_stats = cache.stats(dataset_name) if cache else {}
+    report(dataset_name, {**result, **cache_stats, **session.stats(dataset_name)})
+
+def generate_with_checkpoint(session, prompt_list, key_list, dataset_list, checkpoint=None, chunk_size=512, cache=None, encoded=None, verbose=True):
     """
-    评估模型进行单轮工具调用的性能
-    
+    带断点的批量生成
+
+    已经保存在断点中、且保存时 prompt 相同的输出直接读取，剩余的 prompt 按 chunk_size 分批生成，每批生成后立即保存。
+    dataset_list 与 prompt_list 一一对应，记录每个 prompt 来自哪个数据集。
+    encoded 为 session.encode 的返回值，流水线中已经在后台线程分词时传入。
+    """
+    if checkpoint is None:
+        return session.generate(prompt_list, cache=cache, tags=dataset_list, encoded=encoded)
+
+    prompt_hashes = [hash_prompt(prompt) for prompt in prompt_list]
+    output_list = [
+        checkpoint.get(dataset_name, key, prompt_hash)
+        for key, dataset_name, prompt_hash in zip(key_list, dataset_list, prompt_hashes)
+    ]
+    todo = [i for i, output in enumerate(output_list) if output is None]
+    if verbose:
+        print(f"断点中已有 {len(prompt_list) - len(todo)} 条输出，还需生成 {len(todo)} 条")
+    for start in range(0, len(todo), chunk_size):
+        chunk = todo[start:start + chunk_size]
+        chunk_encoded = None
+        if encoded is not None:
+            chunk_encoded = ([encoded[0][i] for i in chunk], [encoded[1][i] for i in chunk])
+        chunk_outputs = session.generate(
+            [prompt_list[i] for i in chunk], cache=cache, tags=[dataset_list[i] for i in chunk],
+            encoded=chunk_encoded,
+        )
+        to_append = {}
+        for i, output in zip(chunk, chunk_outputs):
+            output_list[i] = output
+            keys, outputs, hashes = to_append.setdefault(dataset_list[i], ([], [], []))
+            keys.append(key_list[i])
+            outputs.append(output)
+            hashes.append(prompt_hashes[i])
+        for dataset_name, (keys, outputs, hashes) in to_append.items():
+            checkpoint.append(dataset_name, keys, outputs, hashes)
+    return output_list
+
+def generate_for_datasets(session, prepared, checkpoint=None, chunk_size=512, cache=None):
+    """
+    把所有数据集的 prompt 合并为一次生成，使推理引擎在整个评测过程中保持满载，再按来源拆分回各个数据集
+
     Args:
-        model_config (dict): 模型配置，包含路径、tokenizer和采样参数等
-        datasets (dict): 数据集字典，键为数据集名称，值为数据集内容
-        metrics (list): 需要计算的指标列表
-        save_strategy (dict): 结果保存策略
-        debug (bool): 是否启用调试模式
-        is_strict: 是否严格匹配参数的值
-        
+        prepared (dict): 数据集名称 -> (prompt_list, key_list)
+
     Returns:
-        dict: 所有数据集的评估结果
-    """            
+        dict: 数据集名称 -> output_list
+    """
+    prompt_list, key_list, dataset_list = [], [], []
+    for dataset_name, (prompts, keys) in prepared.items():
+        prompt_list.extend(prompts)
+        key_list.extend(keys)
+        dataset_list.extend([dataset_name] * len(prompts))
+    print(f"\n\n合并 {len(prepared)} 个数据集的 {len(prompt_list)} 条 prompt 进行生成\n\n")
+    output_list = generate_with_checkpoint(
+        session, prompt_list, key_list, dataset_list,
+        checkpoint=checkpoint, chunk_size=chunk_size, cache=cache,
+    )
+    split_outputs = {}
+    start = 0
+    for dataset_name, (prompts, keys) in prepared.items():
+        split_outputs[dataset_name] = output_list[start:start + len(prompts)]
+        start += len(prompts)
+    return split_outputs
+
+def get_prompt_for_data(formatter, data):
+    """用数据中的对话历史和候选工具生成提示文本，data 的最后一条消息是标准答案"""
+    chat_history = []
+    candidate_tools = None
+    current_date=None
+    for message in data[:-1]:
+        if message["role"] == "id":
+            continue
+        elif message["role"] == "current_date":
+            current_date=message["content"]
+        elif message["role"] == "candidate_tools":
+            candidate_tools = message["content"]
+            if len(candidate_tools)==0:
+                candidate_tools=[{}]
+        else:
+            chat_history.append(message)
+    if not candidate_tools:
+        return None
+
+    prompt = formatter.get_prompt(chat_history, candidate_tools)
+    if current_date and isinstance(prompt, str):
+        # 针对 Qwen 的 prompt
+        prompt=prompt.replace(datetime.date.today().strftime('%Y-%m-%d'),current_date)
+        # 针对 Llama 的 prompt
+        prompt=prompt.replace(datetime.date.today().strftime('%d %b %Y'),current_date)
+    return prompt
+
+def save_results(save_list, save_strategy, model_config, dataset_name, key_map, test_mode=None):
+    """
+    根据保存策略保存输出和结果，每条记录中写入模型名、数据集名和 test_mode，重新计算指标时不需要从文件名中拆分
+    文件名中也带上 test_mode，同一分钟内评测不同 test_mode 时不会互相覆盖
+    """
+    if save_strategy.get("save_output") or save_strategy.get("save_result"):
+        model_name = model_config.get('path').strip('/').split('/')[-1]
+        meta = {"model": model_name, "dataset": dataset_name.split("/")[-1]}
+        name_parts = [datetime.datetime.now().strftime("%m%d_%H%M"), model_name, dataset_name.split("/")[-1]]
+        if test_mode:
+            meta["test_mode"] = test_mode
+            name_parts.append(test_mode)
+        path = os.path.join(save_strategy['save_path'], "_".join(name_parts))
+        if save_strategy.get("jsonl", False):     
+            with open(f"{path}.jsonl", "w", encoding='utf-8') as fout:
+                fout.write("\n".join(json.dumps({**key_map(save), **meta}, ensure_ascii=False) for save in clean_data_for_json(save_list)))
+        else:
+            with open(f"{path}.json", "w", encoding='utf-8') as fout:
+                json.dump([{**save, **meta} for save in clean_data_for_json(save_list)], fout, ensure_ascii=False, indent=4)
+
+def get_key_map(save_strategy):
     def key_map(save):
         """将需要保存的内容映射到字典"""
         to_map = {
             "data_id": save["data_id"],
-            "metrics": test_result,
+            "metrics": save["metrics"],
         }
         if save_strategy.get("save_output"):
             to_map["output"] = save["output"]
@@ -62,174 +269,181 @@ def evaluate_model_for_single_round_tool_call(model_config, datasets, metrics, s
             to_map["result"] = save["result"]
         if save_strategy.get("save_golden_answer", False):
             to_map["golden_answer"] = save["golden_answer"]
+            to_map["golden_role"] = save["golden_role"]
 
         return to_map
+    return key_map
+
+def parse_outputs(formatter, output_list, pool=None):
+    """批量从输出中提取工具调用信息，pool 为 create_parse_pool 创建的进程池，不为空且输出较多时在多个进程中解析"""
+    return formatter.get_tool_calls([output.outputs[0].text for output in output_list], pool=pool)
+
+def is_budget_skipped(output):
+    """API 模型因预算用完没有发送的请求，对应的样本不计入得分，报告中的 Scored 为实际计分的样本数"""
+    return getattr(output, "skipped", False)
+
+def compute_metrics(golden_answer, golden_role, tool_calls, is_strict=True):
+    """根据标准答案的类型计算指标"""
+    if golden_role == "tool_call":
+        return metrics_for_single_round_tool_call(golden_answer, tool_calls, is_strict=is_strict)
+    elif golden_role == "tool_call_ground_truth":
+        return metrics_for_bfcl(golden_answer, tool_calls, is_strict=is_strict)
+
+def score_outputs(formatter, data_list, output_list, is_strict=True, parse_pool=None, score_pool=None, golden_keys=None):
+    """
+    批量解析输出，并根据不同类型的标准答案计算指标
+
+    Returns:
+        list: 每条输出的 (result, golden_answer, test_result)
+    """
+    result_list = parse_outputs(formatter, output_list, pool=parse_pool)
+    return score_results(data_list, result_list, is_strict=is_strict, score_pool=score_pool, golden_keys=golden_keys)
+
+def score_results(data_list, result_list, is_strict=True, score_pool=None, golden_keys=None, chunk_size=32):
+    """
+    根据已经解析出的工具调用计算指标
+
+    score_pool 为 create_score_pool 创建的进程池，不为空且结果不少于 MIN_PARALLEL_SCORE 条时，
+    标准答案的键 golden_keys（与 data_list 一一对应）和工具调用每 chunk_size 条一块发送给进程池计算，各块的结果按顺序合并；
+    子进程使用创建进程池时的 is_strict
+
+    Returns:
+        list: 每条结果的 (result, golden_answer, test_result)
+    """
+    golden_answers = [(data[-1]["content"], data[-1]["role"]) for data in data_list[:len(result_list)]]
+    if score_pool is None or golden_keys is None or len(result_list) < MIN_PARALLEL_SCORE:
+        test_results = [
+            compute_metrics(golden_answer, golden_role, result["tool_call"], is_strict=is_strict)
+            for (golden_answer, golden_role), result in zip(golden_answers, result_list)
+        ]
+    else:
+        tasks = [
+            (
+                golden_keys[start:start + chunk_size],
+                [result["tool_call"] for result in result_list[start:start + chunk_size]],
+            )
+            for start in range(0, len(result_list), chunk_size)
+        ]
+        test_results = []
+        for chunk_results in score_pool.map(_score_chunk, tasks):
+            test_results.extend(chunk_results)
+    return [
+        (result, golden_answer, test_result)
+        for result, (golden_answer, _), test_result in zip(result_list, golden_answers, test_results)
+    ]
+
+def evaluate_model_for_single_round_tool_call(model_config, datasets, metrics, save_strategy, debug=False, is_strict=True, report=None, checkpoint_strategy=None, cache_strategy=None, generate_strategy=None, score_tables=None, test_mode=None):
+    """
+    评估模型进行单轮工具调用的性能
     
+    Args:
+        model_config (dict): 模型配置，包含路径、tokenizer和采样参数等
+        datasets (dict): 数据集字典，键为数据集名称，值为数据集内容
+        metrics (list): 需要计算的指标列表
+        save_strategy (dict): 结果保存策略
+        debug (bool): 是否启用调试模式
+        is_strict: 是否严格匹配参数的值
+        checkpoint_strategy (dict): 断点策略，为空时不保存断点
+        cache_strategy (dict): 生成缓存策略，为空时不使用缓存
+        generate_strategy (dict): 生成的调度策略，如 global_batching 合并所有数据集一起生成，sort_prompts 按共享前缀排序，
+            pipeline 使用流水线边生成边计算指标（仅单轮评测，debug 模式下不使用），
+            parse_workers 为解析工具调用的进程数（仅本地模型），score_workers 为计算指标的进程数，
+            两者都在每次评测开始时创建一个进程池，一批输出不少于 64 条时使用
+        score_tables (dict): 不为空时写入每个数据集的 ScoreTable（每个样本的得分），用于按标签等维度分组统计
+        test_mode (str): 数据集的截取方式（如 single_first），不同 test_mode 的断点和结果文件分开保存
+        
+    Returns:
+        dict: 所有数据集的评估结果
+    """            
+    key_map = get_key_map(save_strategy)
+    generate_strategy = generate_strategy or {}
 
     all_result = {}
     
-    # 初始化LLM模型
-    if model_config["path"] in [
-        "gpt-4o",
-        "gpt_4o",
-        "o3-mini",
-        "deepseek-chat",
-        "deepseek-reasoner"
-    ]:
-        llm = formatter = API_Requester(
-                model=model_config["path"],
-                api_key=model_config.get("api_key",""),
-                base_url=model_config.get("base_url",""),
-                max_workers=model_config.get("max_workers", 1),
-                tool_choice=model_config.get("tool_choice", "auto"),
-                additional_prompt=model_config.get("additional_prompt", ""),
-            )
-        sampling_params = {
-            **formatter.SAMPLING_PARAMS,
-            **model_config.get("sampling_params",{}),
-            "skip_special_tokens": False,
-        }
-    else:
-        try:
-            from vllm import LLM, SamplingParams
-            from vllm.inputs import TokensPrompt
-        except ImportError:
-            print("没有安装 vllm ，仅支持通过 API 进行评测。\n\n")
-            return {}
-        opts = {
-            key: model_config[key] for key in model_config if key in VLLM_LLM_OPTS
-        }
-        llm = LLM(
-            model=model_config["path"],
-            tokenizer=model_config.get("tokenizer", model_config["path"]),
-            tensor_parallel_size=model_config.get("tp", 1),
-            pipeline_parallel_size=model_config.get("pp", 1),
-            **opts
-        )
-        additional_params = {}
-        if "enable_thinking" in model_config:
-            if model_config["type"] in THINKING_MODLES:
-                additional_params["enable_thinking"] = model_config["enable_thinking"]
-            else:
-                print("enable_thinking 仅对 {} 系列模型生效，已忽略".format(THINKING_MODLES))
-        # 获取格式化器
-        formatter = model_config["formatter"](
-            llm.get_tokenizer(), 
-            additional_prompt=model_config.get("additional_prompt", ""),
-            **additional_params
-        )
-        # 设置采样参数
-        sampling_params = SamplingParams(**{
-            **formatter.SAMPLING_PARAMS,
-            **model_config.get("sampling_params",{}),
-            "skip_special_tokens": False,
-        })
-
-    # 对每个数据集进行评估
-    for dataset_name, dataset in datasets.items():
-        print(f"\n\n正在评测数据集：{dataset_name}\n\n")
-        save_list = []
+    # 获取模型的推理会话，同一模型的引擎会被复用
+    session = get_session(model_config, generate_strategy)
+    if session is None:
+        return {}
+    formatter = session.formatter
+    sampling_config = session.sampling_config
+    checkpoint = get_checkpoint_store(model_config, sampling_config, checkpoint_strategy, debug=debug, test_mode=test_mode)
+    checkpoint_chunk_size = (checkpoint_strategy or {}).get("chunk_size", 512)
+    parse_pool = create_parse_pool(generate_strategy.get("parse_workers"), formatter)
+    score_pool = create_score_pool(generate_strategy.get("score_workers"), datasets, is_strict=is_strict)
+    cache = get_generation_cache(model_config, sampling_config, cache_strategy, debug=debug)
+
+    def prepare(dataset_name, dataset):
+        """为每个数据样本准备输入提示，返回 prompt 列表和断点中的键"""
         prompt_list = []
-        # dataset = dataset[0:1]
-        # 为每个数据样本准备输入提示
         for data in dataset:
-            chat_history = []
-            candidate_tools = None
-            current_date=None
-            for message in data[:-1]:
-                # print(message)
-                if message["role"] == "id":
-                    data_id = message["content"]
-                elif message["role"] == "current_date":
-                    current_date=message["content"]
-                elif message["role"] == "candidate_tools":
-                    candidate_tools = message["content"]
-                    if len(candidate_tools)==0:
-                        candidate_tools=[{}]
-                else:
-                    chat_history.append(message)
-            if not candidate_tools:
+            prompt = get_prompt_for_data(formatter, data)
+            if prompt is None:
                 continue
-            
-            # 生成提示文本
-            # print(chat_history)
-            # print(candidate_tools)
-            prompt = formatter.get_prompt(chat_history, candidate_tools)
-            if current_date and isinstance(prompt, str):
-                # 针对 Qwen 的 prompt
-                prompt=prompt.replace(datetime.date.today().strftime('%Y-%m-%d'),current_date)
-                # 针对 Llama 的 prompt
-                prompt=prompt.replace(datetime.date.today().strftime('%d %b %Y'),current_date)
             prompt_list.append(prompt)
 
-            # 调试模式下只处理一个样本并打印提示
+            # 调试模式下只处理一个样本
             if debug:
-                # print("\n"*3)
-                # print(prompt)
                 break
+        key_list = [data[0]["content"] for data in dataset[:len(prompt_list)]]
+        return prompt_list, key_list
 
-        # 批量生成模型输出
-        tokenizer = llm.get_tokenizer()
-        tokenizer.truncation_side = "left"
-        truncate_prompt_tokens = model_config.get("sampling_params",{}).get("truncate_prompt_tokens", None)
-        if truncate_prompt_tokens is None:
-            truncate_prompt_tokens = model_config.get("truncate_prompt_tokens", None)
-        batch_input_ids = tokenizer.batch_encode_plus(
-            prompt_list, 
-            truncation=truncate_prompt_tokens is not None,
-            max_length=truncate_prompt_tokens,
-        ).input_ids
-        output_list = llm.generate(
-            [TokensPrompt(prompt_token_ids=ids) for ids in batch_input_ids],
-            sampling_params=sampling_params,
-        )
+    keep_saves = bool(save_strategy.get("save_output") or save_strategy.get("save_result"))
 
-        # 调试模式下打印第一个输出
-        if debug:
-            print("\n"*3)
-            print(output_list[0].outputs[0].text)
+    def new_state(dataset_name):
+        return {"table": ScoreTable(dataset_name), "save_list": []}
 
-        # 初始化结果字典，包含平均值指标
-        final_result = {
-            "avg_think": 0,     # 思考部分的平均长度
-            "avg_content": 0,   # 内容部分的平均长度
-            "avg_tool_call": 0, # 工具调用部分的平均长度
-        }
-        
-        # 处理每个数据样本的输出结果
-        for data, prompt, output in zip(dataset, prompt_list, output_list):
-            # 从输出文本中提取工具调用信息
-            result = formatter.get_tool_call(output.outputs[0].text)
-
-            # 累计各部分长度
-            final_result["avg_think"] += len(result["think"])
-            final_result["avg_content"] += len(result["content"])
-            final_result["avg_tool_call"] += len(result["tool_call"])
-            
-            # 根据不同类型的标准答案计算指标
-            if data[-1]["role"] == "tool_call":
-                golden_answer = data[-1]["content"]
-                test_result = metrics_for_single_round_tool_call(golden_answer, result["tool_call"],is_strict=is_strict)
-            elif data[-1]["role"] == "tool_call_ground_truth":
-                golden_answer = data[-1]["content"]
-                test_result = metrics_for_bfcl(golden_answer, result["tool_call"],is_strict=is_strict)
-                
-            # 累计计算结果
-            for k,v in test_result.items():
-                if k in final_result:
-                    final_result[k] += v
-                else:
-                    final_result[k] = v
+    def accumulate(state, data, prompt, output, scored):
+        """记录一条输出的指标，scored 为 score_outputs 返回的 (result, golden_answer, test_result)"""
+        result, golden_answer, test_result = scored
+        if is_budget_skipped(output):
+            state["table"].skip(data[0]["content"])
+            return result, test_result
+        state["table"].add(data[0]["content"], result, test_result)
 
-            save_list.append({
+        # 不保存结果时不保留输入输出，减少大数据集的内存占用
+        if keep_saves:
+            state["save_list"].append({
                 "data_id": data[0]["content"],
                 "input": prompt,
                 "output": str(output.outputs[0].text),
                 "golden_answer": golden_answer,
+                "golden_role": data[-1]["role"],
                 "result": result,
                 "metrics": test_result,
             })
-            
+        return result, test_result
+
+    def finalize(dataset_name, dataset, state):
+        """保存一个数据集的结果，计算最终指标并发送报告"""
+        save_results(state["save_list"], save_strategy, model_config, dataset_name, key_map, test_mode=test_mode)
+
+        # 计算最终结果，没有输出的样本按 0 分计入
+        all_result[dataset_name] = state["table"].summarize(metrics, size=len(dataset))
+        if score_tables is not None:
+            score_tables[dataset_name] = state["table"]
+        print(f"\n\n数据集：{dataset_name} 的评测结果：\n")
+        print(all_result[dataset_name])
+        print()
+        if not debug and report:
+            report_generation_stats(report, dataset_name, all_result[dataset_name], session, cache)
+
+    def evaluate(dataset_name, dataset, prompt_list, output_list):
+        """计算一个数据集的指标，保存结果并发送报告"""
+        state = new_state(dataset_name)
+
+        # 调试模式下打印第一个输出
+        if debug:
+            print("\n"*3)
+            print(output_list[0].outputs[0].text)
+
+        # 处理每个数据样本的输出结果
+        scored_list = score_outputs(
+            formatter, dataset, output_list, is_strict=is_strict, parse_pool=parse_pool, score_pool=score_pool,
+            golden_keys=[golden_key(dataset_name, i, data) for i, data in enumerate(dataset[:len(output_list)])],
+        )
+        for data, prompt, output, scored in zip(dataset, prompt_list, output_list, scored_list):
+            result, test_result = accumulate(state, data, prompt, output, scored)
+
             # 调试模式下只处理一个样本
             if debug:
                 print("\n"*3)
@@ -238,36 +452,112 @@ def evaluate_model_for_single_round_tool_call(model_config, datasets, metrics, s
                 print(test_result)
                 break
 
-        # 根据保存策略保存输出和结果
-        if save_strategy.get("save_output") or save_strategy.get("save_result"):
-            model_name = model_config.get('path').strip('/').split('/')[-1]
-            timestamp = datetime.datetime.now().strftime("%m%d_%H%M")
-            path = os.path.join(save_strategy['save_path'], "_".join([timestamp, model_name, dataset_name.split("/")[-1]]))
-            if save_strategy.get("jsonl", False):     
-                with open(f"{path}.jsonl", "w", encoding='utf-8') as fout:
-                    fout.write("\n".join(json.dumps(key_map(save), ensure_ascii=False) for save in clean_data_for_json(save_list)))
-            else:
-                with open(f"{path}.json", "w", encoding='utf-8') as fout:
-                    json.dump(clean_data_for_json(save_list), fout, ensure_ascii=False, indent=4)
+        finalize(dataset_name, dataset, state)
+
+    def evaluate_with_pipeline():
+        """
+        流水线评测：后台线程构造 prompt 并分词，分批生成，另一个后台线程在输出到达时解析并计算指标
+        同时生成 in_flight 批（默认 8），某一批只剩少数长尾请求时其它批的请求仍在生成，引擎不会在每批的末尾空闲
+        数据集的最后一批计算完成后立即保存结果并发送报告
+        """
+        pipeline_chunk_size = generate_strategy.get("chunk_size", 256)
+        global_batching = generate_strategy.get("global_batching", False)
+
+        def make_task(chunk, finished):
+            prompt_list = [item[2] for item in chunk]
+            encoded = session.encode(prompt_list, with_payload=cache is not None) if chunk else None
+            return chunk, encoded, finished
+
+        def produce():
+            chunk = []
+            finished = [] # 所有样本都已放入 chunk 的数据集
+            for dataset_name, dataset in datasets.items():
+                print(f"\n\n正在评测数据集：{dataset_name}\n\n")
+                for i, data in enumerate(dataset):
+                    prompt = get_prompt_for_data(formatter, data)
+                    if prompt is None:
+                        continue
+                    chunk.append((dataset_name, data, prompt, data[0]["content"], golden_key(dataset_name, i, data)))
+                    if len(chunk) >= pipeline_chunk_size:
+                        yield make_task(chunk, finished)
+                        chunk, finished = [], []
+                finished.append(dataset_name)
+                # 不合并数据集时，每个数据集单独成批
+                if not global_batching:
+                    yield make_task(chunk, finished)
+                    chunk, finished = [], []
+            if chunk or finished:
+                yield make_task(chunk, finished)
+
+        def process(task):
+            chunk, encoded, finished = task
+            output_list = []
+            if chunk:
+                output_list = generate_with_checkpoint(
+                    session,
+                    [item[2] for item in chunk],
+                    [item[3] for item in chunk],
+                    [item[0] for item in chunk],
+                    checkpoint=checkpoint, chunk_size=checkpoint_chunk_size, cache=cache,
+                    encoded=encoded, verbose=False,
+                )
+            return chunk, output_list, finished
+
+        states = {}
+
+        def consume(result):
+            chunk, output_list, finished = result
+            scored_list = score_outputs(
+                formatter, [item[1] for item in chunk], output_list,
+                is_strict=is_strict, parse_pool=parse_pool, score_pool=score_pool,
+                golden_keys=[item[4] for item in chunk],
+            )
+            for (dataset_name, data, prompt, key, _), output, scored in zip(chunk, output_list, scored_list):
+                if dataset_name not in states:
+                    states[dataset_name] = new_state(dataset_name)
+                accumulate(states[dataset_name], data, prompt, output, scored)
+            for dataset_name in finished:
+                finalize(dataset_name, datasets[dataset_name], states.pop(dataset_name, None) or new_state(dataset_name))
+
+        run_pipeline(
+            produce, process, consume,
+            queue_size=generate_strategy.get("queue_size", 4), in_flight=generate_strategy.get("in_flight", 8),
+        )
 
-        # 计算最终结果
-        all_result[dataset_name] = {
-            k: (v/len(dataset) if k.startswith("avg_") else v*100/len(dataset))
-            for k,v in final_result.items()
-                if k.split("-")[0] in metrics or k.startswith("avg_")
+    if generate_strategy.get("pipeline") and not debug:
+        evaluate_with_pipeline()
+    elif generate_strategy.get("global_batching"):
+        prepared = {
+            dataset_name: prepare(dataset_name, dataset)
+            for dataset_name, dataset in datasets.items()
         }
-        # 添加数据集大小信息
-        all_result[dataset_name]["Size"] = len(dataset)
-        print(f"\n\n数据集：{dataset_name} 的评测结果：\n")
-        print(all_result[dataset_name])
-        print()
-        if not debug and report:
-            report(dataset_name, all_result[dataset_name])
-    
+        output_lists = generate_for_datasets(
+            session, prepared, checkpoint=checkpoint, chunk_size=checkpoint_chunk_size, cache=cache,
+        )
+        for dataset_name, dataset in datasets.items():
+            print(f"\n\n正在评测数据集：{dataset_name}\n\n")
+            evaluate(dataset_name, dataset, prepared[dataset_name][0], output_lists[dataset_name])
+    else:
+        # 对每个数据集进行评估
+        for dataset_name, dataset in datasets.items():
+            print(f"\n\n正在评测数据集：{dataset_name}\n\n")
+            prompt_list, key_list = prepare(dataset_name, dataset)
+            # 批量生成模型输出
+            output_list = generate_with_checkpoint(
+                session, prompt_list, key_list, [dataset_name] * len(prompt_list),
+                checkpoint=checkpoint, chunk_size=checkpoint_chunk_size, cache=cache,
+            )
+            evaluate(dataset_name, dataset, prompt_list, output_list)
+
+    if cache:
+        cache.close()
+    for pool in (parse_pool, score_pool):
+        if pool:
+            pool.shutdown()
     return all_result
         
 
-def evaluate_model_for_multiple_round_tool_call(model_config, datasets, metrics, save_strategy, evaluate_mode, debug=False, is_strict=True, report=None):
+def evaluate_model_for_multiple_round_tool_call(model_config, datasets, metrics, save_strategy, evaluate_mode, debug=False, is_strict=True, report=None, checkpoint_strategy=None, cache_strategy=None, generate_strategy=None, score_tables=None, test_mode=None):
 
     """
     综合评估多轮工具调用
@@ -277,221 +567,119 @@ def evaluate_model_for_multiple_round_tool_call(model_config, datasets, metrics,
         datasets (dict): 数据集字典，键为数据集名称，值为数据集内容
         metrics (list): 需要计算的指标列表
         save_strategy (dict): 结果保存策略
-        evaluate_mode(str): 多轮评估策略
+        evaluate_mode(str): 多轮评估策略，seq 模式按轮次分波次生成，前面轮次出错的样本不再生成后续轮次，
+            长度按实际生成的轮次平均并报告为 avg_*_generated（debug 模式生成所有轮次，仍报告 avg_*）
         debug (bool): 是否启用调试模式
         is_strict: 是否严格匹配参数的值
+        checkpoint_strategy (dict): 断点策略，为空时不保存断点
+        cache_strategy (dict): 生成缓存策略，为空时不使用缓存
+        generate_strategy (dict): 生成的调度策略，如 global_batching 合并所有数据集一起生成，sort_prompts 按共享前缀排序，
+            parse_workers 为解析工具调用的进程数（仅本地模型），score_workers 为计算指标的进程数，
+            两者都在每次评测开始时创建一个进程池，一批输出不少于 64 条时使用；
+            pipeline 只用于单轮评测，多轮评测后续轮次的 prompt 依赖前面轮次的结果，设置后会提示并按波次生成
+        score_tables (dict): 不为空时写入每个数据集的 ScoreTable（每个样本的得分），用于按标签等维度分组统计
+        test_mode (str): 数据集的截取方式（如 single_first），不同 test_mode 的断点和结果文件分开保存
         
     Returns:
         dict: 所有数据集的评估结果
     """            
-    def key_map(save):
-        """将需要保存的内容映射到字典"""
-        to_map = {
-            "data_id": save["data_id"],
-            "metrics": test_result,
-        }
-        if save_strategy.get("save_output"):
-            to_map["output"] = save["output"]
-        if save_strategy.get("save_input"):
-            to_map["input"] = save["input"]
-        if save_strategy.get("save_result"):
-            to_map["result"] = save["result"]
-        if save_strategy.get("save_golden_answer", False):
-            to_map["golden_answer"] = save["golden_answer"]
-
-        return to_map
-    
+    key_map = get_key_map(save_strategy)
+    generate_strategy = generate_strategy or {}
+    if generate_strategy.get("pipeline"):
+        print(f"提示: pipeline 只用于单轮评测，multiple_{evaluate_mode} 模式按波次生成")
 
     all_result = {}
     
-    # 初始化LLM模型
-    if model_config["path"] in [
-        "gpt-4o",
-        "gpt_4o",
-        "o3-mini",
-        "deepseek-chat",
-        "deepseek-reasoner"
-    ]:
-        llm = formatter = API_Requester(
-                model=model_config["path"],
-                api_key=model_config.get("api_key",""),
-                base_url=model_config.get("base_url",""),
-                max_workers=model_config.get("max_workers", 1),
-                tool_choice=model_config.get("tool_choice", "auto"),
-                additional_prompt=model_config.get("additional_prompt", ""),
-            )
-        sampling_params = {
-            **formatter.SAMPLING_PARAMS,
-            **model_config.get("sampling_params",{}),
-            "skip_special_tokens": False,
-        }
-    else:
-        try:
-            from vllm import LLM, SamplingParams
-            from vllm.inputs import TokensPrompt
-        except ImportError:
-            print("没有安装 vllm ，仅支持通过 API 进行评测。\n\n")
-            return {}
-        opts = {
-            key: model_config[key] for key in model_config if key in VLLM_LLM_OPTS
-        }
-        llm = LLM(
-            model=model_config["path"],
-            tokenizer=model_config.get("tokenizer", model_config["path"]),
-            tensor_parallel_size=model_config.get("tp", 1),
-            pipeline_parallel_size=model_config.get("pp", 1),
-            **opts
-        )
-        additional_params = {}
-        if "enable_thinking" in model_config:
-            if model_config["type"] in THINKING_MODLES:
-                additional_params["enable_thinking"] = model_config["enable_thinking"]
-            else:
-                print("enable_thinking 仅对 {} 系列模型生效，已忽略".format(THINKING_MODLES))
-        # 获取格式化器
-        formatter = model_config["formatter"](
-            llm.get_tokenizer(), 
-            additional_prompt=model_config.get("additional_prompt", ""),
-            **additional_params
-        )
-        # 设置采样参数
-        sampling_params = SamplingParams(**{
-            **formatter.SAMPLING_PARAMS,
-            **model_config.get("sampling_params",{}),
-            "skip_special_tokens": False,
-        })
-
-    # 对每个数据集进行评估
-    for dataset_name, dataset in datasets.items():
+    # 获取模型的推理会话，同一模型的引擎会被复用
+    session = get_session(model_config, generate_strategy)
+    if session is None:
+        return {}
+    formatter = session.formatter
+    sampling_config = session.sampling_config
+    test_mode = test_mode or f"multiple_{evaluate_mode}"
+    checkpoint = get_checkpoint_store(model_config, sampling_config, checkpoint_strategy, debug=debug, test_mode=test_mode)
+    checkpoint_chunk_size = (checkpoint_strategy or {}).get("chunk_size", 512)
+    parse_pool = create_parse_pool(generate_strategy.get("parse_workers"), formatter)
+    score_pool = create_score_pool(generate_strategy.get("score_workers"), datasets, is_strict=is_strict)
+    cache = get_generation_cache(model_config, sampling_config, cache_strategy, debug=debug)
+
+    def prepare(dataset_name, dataset):
+        """
+        为每个数据样本的各轮调用准备输入提示
+
+        Returns:
+            prompt_list, key_list: 所有轮次的 prompt 和断点中的键 <data_id>_round_<轮次>
+            new_dataset: 每轮调用对应的数据（截止到该轮的标准答案）
+            data_num: 每个样本的工具调用轮数
+            golden_keys: 每轮调用的标准答案在进程池中的键
+        """
+        golden_keys = []
         new_dataset=[]
-        if len(dataset)==0:
-            print(f"\n\n数据集：{dataset_name}中没有符合条件的数据\n\n")
-            continue
-        print(f"\n\n正在评测数据集：{dataset_name}\n\n")
-        save_list = []
         prompt_list = []
-        data_num={} # 记录每个样本的工具调用轮数
-        
-        # 为每个数据样本的各轮调用准备输入提示
+        key_list = []
+        data_num={}
         for j, data in enumerate(dataset):
             tool_call_index_list=[]
             for i, message in enumerate(data):
                 if message["role"] in ["tool_call", "tool_call_ground_truth"] and len(message["content"]) > 0:
                     tool_call_index_list.append(i)
                     new_dataset.append(data[:i+1])
+                    golden_keys.append(golden_key(dataset_name, j, data[:i+1]))
             data_num[j]=len(tool_call_index_list)
-            for i in tool_call_index_list:
-
-                chat_history = []
-                candidate_tools = None
-                current_date=None
-                for message in data[:i]:
-                    # print(message)
-                    if message["role"] == "id":
-                        data_id = message["content"]
-                    elif message["role"] == "current_date":
-                        current_date=message["content"]
-                    elif message["role"] == "candidate_tools":
-                        candidate_tools = message["content"]
-                        if len(candidate_tools)==0:
-                            candidate_tools=[{}]
-                    else:
-                        chat_history.append(message)
-                if not candidate_tools:
+            for round_idx, i in enumerate(tool_call_index_list):
+                prompt = get_prompt_for_data(formatter, data[:i+1])
+                if prompt is None:
                     continue
-                
-                # 生成提示文本
-                # print(chat_history)
-                # print(candidate_tools)
-
-                prompt = formatter.get_prompt(chat_history, candidate_tools)
-                if current_date and isinstance(prompt, str):
-                    # 针对 Qwen 的 prompt
-                    prompt=prompt.replace(datetime.date.today().strftime('%Y-%m-%d'),current_date)
-                    # 针对 Llama 的 prompt
-                    prompt=prompt.replace(datetime.date.today().strftime('%d %b %Y'),current_date)
                 prompt_list.append(prompt)
+                key_list.append(f"{data[0]['content']}_round_{round_idx+1}")
             # 调试模式下只处理一个样本并打印提示
             if debug:
                 print("\n"*3)
                 print(prompt_list)
                 break
+        return prompt_list, key_list, new_dataset, data_num, golden_keys
 
-        # 批量生成模型输出
-        tokenizer = llm.get_tokenizer()
-        tokenizer.truncation_side = "left"
-        truncate_prompt_tokens = model_config.get("sampling_params",{}).get("truncate_prompt_tokens", None)
-        if truncate_prompt_tokens is None:
-            truncate_prompt_tokens = model_config.get("truncate_prompt_tokens", None)
-        batch_input_ids = tokenizer.batch_encode_plus(
-            prompt_list, 
-            truncation=truncate_prompt_tokens is not None,
-            max_length=truncate_prompt_tokens,
-        ).input_ids
-        output_list = llm.generate(
-            [TokensPrompt(prompt_token_ids=ids) for ids in batch_input_ids],
-            sampling_params=sampling_params,
-        )
+    def evaluate(dataset_name, dataset, prepared, output_list):
+        """按照多轮评估策略计算一个数据集的指标，保存结果并发送报告"""
+        prompt_list, key_list, new_dataset, data_num, golden_keys = prepared
+        save_list = []
 
         # 调试模式下打印第一个输出
         if debug:
             print("\n"*3)
             print(output_list[0].outputs[0].text)
 
-        # 初始化结果字典，包含平均值指标
-        final_result = {
-            "avg_think": 0,     # 思考部分的平均长度
-            "avg_content": 0,   # 内容部分的平均长度
-            "avg_tool_call": 0, # 工具调用部分的平均长度
-        }
+        table = ScoreTable(dataset_name)
         
+        scored_list = score_outputs(
+            formatter, new_dataset, output_list, is_strict=is_strict, parse_pool=parse_pool, score_pool=score_pool,
+            golden_keys=golden_keys,
+        )
         cur_idx=0
-        for i in range(len(dataset)):
+        for i in range(len(data_num)):
             tag=True # 用来标记样本内之前轮次是否正确
             for j in range(data_num[i]):
                 data=new_dataset[cur_idx+j]
                 prompt=prompt_list[cur_idx+j]
                 output=output_list[cur_idx+j]
                 
-                # 从输出文本中提取工具调用信息
-                result = formatter.get_tool_call(output.outputs[0].text)
+                result, golden_answer, test_result = scored_list[cur_idx+j]
+                if is_budget_skipped(output):
+                    table.skip(data[0]["content"], row=i)
+                    continue
 
-                # 累计各部分长度
-                final_result["avg_think"] += len(result["think"])
-                final_result["avg_content"] += len(result["content"])
-                final_result["avg_tool_call"] += len(result["tool_call"])
-                
-                # 根据不同类型的标准答案计算指标
-                if data[-1]["role"] == "tool_call":
-                    golden_answer = data[-1]["content"]
-                    test_result = metrics_for_single_round_tool_call(golden_answer, result["tool_call"],is_strict=is_strict)
-                elif data[-1]["role"] == "tool_call_ground_truth":
-                    golden_answer = data[-1]["content"]
-                    test_result = metrics_for_bfcl(golden_answer, result["tool_call"],is_strict=is_strict)
-                
-                if evaluate_mode=="avg":
-                    # 累计计算平均结果
-                    for k,v in test_result.items():
-                        if k in final_result:
-                            final_result[k] += v/data_num[i]
-                        else:
-                            final_result[k] = v/data_num[i]
-                # 防止错误输入，默认使用顺序评估方式
-                else:
-                    if tag:
-                        for k,v in test_result.items():
-                            if k in final_result:
-                                final_result[k] += v/data_num[i]
-                            else:
-                                final_result[k] = v/data_num[i]
+                # avg 模式累计所有轮次的平均结果；防止错误输入，其它模式均使用顺序评估方式，只累计之前轮次都正确的结果
+                # 同一样本的各轮记录在同一行
+                table.add(data[0]["content"], result, test_result, num_rounds=data_num[i], counted=evaluate_mode=="avg" or tag, row=i)
                 if evaluate_mode != "avg" and tag==False:
                     pass
                 else:
                     save_list.append({
-                        "data_id": f"{data[0]["content"]}_round_{j+1}",
+                        "data_id": f"{data[0]['content']}_round_{j+1}",
                         "input": prompt,
                         "output": str(output.outputs[0].text),
                         "golden_answer": golden_answer,
+                        "golden_role": data[-1]["role"],
                         "result": result,
                         "metrics": test_result,
                     })
@@ -501,33 +689,156 @@ def evaluate_model_for_multiple_round_tool_call(model_config, datasets, metrics,
 
             cur_idx+=data_num[i]
 
-        # 根据保存策略保存输出和结果
-        if save_strategy.get("save_output") or save_strategy.get("save_result"):
-            model_name = model_config.get('path').strip('/').split('/')[-1]
-            timestamp = datetime.datetime.now().strftime("%m%d_%H%M")
-            path = os.path.join(save_strategy['save_path'], "_".join([timestamp, model_name, dataset_name.split("/")[-1]]))
-            if save_strategy.get("jsonl", False):     
-                with open(f"{path}.jsonl", "w", encoding='utf-8') as fout:
-                    fout.write("\n".join(json.dumps(key_map(save), ensure_ascii=False) for save in clean_data_for_json(save_list)))
-            else:
-                with open(f"{path}.json", "w", encoding='utf-8') as fout:
-                    json.dump(clean_data_for_json(save_list), fout, ensure_ascii=False, indent=4)
+        save_results(save_list, save_strategy, model_config, dataset_name, key_map, test_mode=test_mode)
 
         # 计算最终结果
         # 长度和工具调用数按调用轮次进行平均
         # 正确率指标按照样本平均
-        all_result[dataset_name] = {
-            k: (v/len(new_dataset) if k.startswith("avg_") else v*100/len(dataset))
-            for k,v in final_result.items()
-                if k.split("-")[0] in metrics or k.startswith("avg_")
-        }
-        # 添加数据集大小信息
-        all_result[dataset_name]["Size"] = len(dataset)
+        all_result[dataset_name] = table.summarize(metrics, size=len(dataset))
+        if score_tables is not None:
+            score_tables[dataset_name] = table
 
         print(f"\n\n数据集：{dataset_name} 的评测结果：\n")
         print(all_result[dataset_name])
         print()
         if not debug and report:
-            report(dataset_name, all_result[dataset_name])
-    
+            report_generation_stats(report, dataset_name, all_result[dataset_name], session, cache)
+
+    def evaluate_seq_in_waves(group):
+        """
+        按轮次分波次评测 seq 模式：先生成所有样本的第 1 轮并计算指标，
+        只有之前各轮都完全正确（ExactMatch-AllTools == 1）的样本才提交下一轮，
+        不会计入得分的轮次不再生成
+
+        Args:
+            group (dict): 一起生成的数据集，global_batching 时为所有数据集
+        """
+        states = {}
+        active = [] # (数据集名称, 样本序号, 该样本所有工具调用的位置)
+        for dataset_name, dataset in group.items():
+            states[dataset_name] = {
+                "table": ScoreTable(dataset_name, length_keys=GENERATED_LENGTH_KEYS),
+                "save_list": [],
+                "total_rounds": 0,
+            }
+            for i, data in enumerate(dataset):
+                tool_call_index_list = [
+                    j for j, message in enumerate(data)
+                    if message["role"] in ["tool_call", "tool_call_ground_truth"] and len(message["content"]) > 0
+                ]
+                states[dataset_name]["total_rounds"] += len(tool_call_index_list)
+                if tool_call_index_list:
+                    active.append((dataset_name, i, tool_call_index_list))
+
+        round_idx = 0
+        while active:
+            prompt_list, key_list, dataset_list, wave = [], [], [], []
+            for dataset_name, i, tool_call_index_list in active:
+                data = group[dataset_name][i][:tool_call_index_list[round_idx]+1]
+                prompt = get_prompt_for_data(formatter, data)
+                if prompt is None:
+                    continue
+                prompt_list.append(prompt)
+                key_list.append(f"{data[0]['content']}_round_{round_idx+1}")
+                dataset_list.append(dataset_name)
+                wave.append((dataset_name, i, tool_call_index_list, data))
+            print(f"\n\n第 {round_idx+1} 轮：生成 {len(prompt_list)} 条\n\n")
+            output_list = generate_with_checkpoint(
+                session, prompt_list, key_list, dataset_list,
+                checkpoint=checkpoint, chunk_size=checkpoint_chunk_size, cache=cache,
+            )
+
+            next_active = []
+            scored_list = score_outputs(
+                formatter, [item[3] for item in wave], output_list,
+                is_strict=is_strict, parse_pool=parse_pool, score_pool=score_pool,
+                golden_keys=[golden_key(dataset_name, i, data) for dataset_name, i, _, data in wave],
+            )
+            for (dataset_name, i, tool_call_index_list, data), prompt, output, (result, golden_answer, test_result) in zip(wave, prompt_list, output_list, scored_list):
+                state = states[dataset_name]
+                data_num = len(tool_call_index_list)
+                if is_budget_skipped(output):
+                    state["table"].skip(data[0]["content"], row=i)
+                    continue
+
+                # 累计计算平均结果，同一样本的各轮记录在同一行
+                state["table"].add(data[0]["content"], result, test_result, num_rounds=data_num, row=i)
+                state["save_list"].append(((i, round_idx), {
+                    "data_id": f"{data[0]['content']}_round_{round_idx+1}",
+                    "input": prompt,
+                    "output": str(output.outputs[0].text),
+                    "golden_answer": golden_answer,
+                    "golden_role": data[-1]["role"],
+                    "result": result,
+                    "metrics": test_result,
+                }))
+
+                if test_result["ExactMatch-AllTools"] == 1 and round_idx + 1 < data_num:
+                    next_active.append((dataset_name, i, tool_call_index_list))
+            active = next_active
+            round_idx += 1
+
+        for dataset_name, dataset in group.items():
+            print(f"\n\n正在评测数据集：{dataset_name}\n\n")
+            state = states[dataset_name]
+            print(f"共 {state['total_rounds']} 轮调用，实际生成 {sum(state['table'].rounds)} 轮")
+            # 按样本和轮次的顺序保存
+            save_list = [save for _, save in sorted(state["save_list"], key=lambda x: x[0])]
+            save_results(save_list, save_strategy, model_config, dataset_name, key_map, test_mode=test_mode)
+
+            # 计算最终结果
+            # 长度和工具调用数按实际生成的轮次进行平均，报告为 avg_*_generated，与按全部轮次平均的 avg_* 区分
+            # 正确率指标按照样本平均
+            all_result[dataset_name] = state["table"].summarize(metrics, size=len(dataset))
+            if score_tables is not None:
+                score_tables[dataset_name] = state["table"]
+
+            print(f"\n\n数据集：{dataset_name} 的评测结果：\n")
+            print(all_result[dataset_name])
+            print()
+            if report:
+                report_generation_stats(report, dataset_name, all_result[dataset_name], session, cache)
+
+    for dataset_name, dataset in list(datasets.items()):
+        if len(dataset)==0:
+            print(f"\n\n数据集：{dataset_name}中没有符合条件的数据\n\n")
+    datasets = {dataset_name: dataset for dataset_name, dataset in datasets.items() if len(dataset) > 0}
+
+    if evaluate_mode != "avg" and not debug:
+        # seq 模式只生成仍可能计入得分的轮次
+        if generate_strategy.get("global_batching"):
+            evaluate_seq_in_waves(datasets)
+        else:
+            for dataset_name, dataset in datasets.items():
+                evaluate_seq_in_waves({dataset_name: dataset})
+    elif generate_strategy.get("global_batching"):
+        prepared = {
+            dataset_name: prepare(dataset_name, dataset)
+            for dataset_name, dataset in datasets.items()
+        }
+        output_lists = generate_for_datasets(
+            session, {dataset_name: p[:2] for dataset_name, p in prepared.items()},
+            checkpoint=checkpoint, chunk_size=checkpoint_chunk_size, cache=cache,
+        )
+        for dataset_name, dataset in datasets.items():
+            print(f"\n\n正在评测数据集：{dataset_name}\n\n")
+            evaluate(dataset_name, dataset, prepared[dataset_name], output_lists[dataset_name])
+    else:
+        # 对每个数据集进行评估
+        for dataset_name, dataset in datasets.items():
+            print(f"\n\n正在评测数据集：{dataset_name}\n\n")
+            prepared = prepare(dataset_name, dataset)
+            prompt_list, key_list = prepared[:2]
+            # 批量生成模型输出
+            output_list = generate_with_checkpoint(
+                session, prompt_list, key_list, [dataset_name] * len(prompt_list),
+                checkpoint=checkpoint, chunk_size=checkpoint_chunk_size, cache=cache,
+            )
+            evaluate(dataset_name, dataset, prepared, output_list)
+
+    if cache:
+        cache.close()
+    for pool in (parse_pool, score_pool):
+        if pool:
+            pool.shutdown()
     return all_result
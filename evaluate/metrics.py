@@ -61,6 +61,28 @@ def compare_params_simple(gold_args, output_args):
 
     return total_params, matched_params, exact_match
 
+
+def fingerprint_params(args):
+    """
+    把参数转换为 参数名 -> json.dumps(参数值) 的指纹，每个调用只序列化一次
+    比较指纹与 compare_params_simple 的结果相同，参数不是字典或无法序列化时返回 None
+    """
+    if not isinstance(args, dict):
+        return None
+    try:
+        return {key: json.dumps(value) for key, value in args.items()}
+    except (TypeError, ValueError):
+        return None
+
+
+def compare_fingerprints(gold_fingerprint, output_fingerprint):
+    """按指纹比较参数，缺少的参数与 None 相同，序列化为 null"""
+    matched_params = sum(
+        1 for key, gold_value in gold_fingerprint.items() if output_fingerprint.get(key, "null") == gold_value
+    )
+    total_params = len(gold_fingerprint)
+    return total_params, matched_params, matched_params == total_params
+
 def compare_params_bfcl(gold_args, output_args):
     exact_match = True
     total_params, matched_params = 0, 0
@@ -107,9 +129,50 @@ def compare_params_bfcl(gold_args, output_args):
     return total_params, matched_params, exact_match
 
 
-def metrics_for_single_round_tool_call(golden_answer, tool_calls, is_strict=True, compare_params=compare_params_simple):
+def assign_by_row_minimum(cost_matrix):
+    """
+    行数不多于列数、每行都取最小成本且取到的列互不相同时，这就是最优匹配，不需要求解指派问题
+    此时每个答案调用都会被匹配，成本相同的匹配方式得到的指标也相同；
+    行数多于列数时，哪些答案调用被匹配会影响参数总数，需要与 KM 算法的选择保持一致，因此不走快速路径
+
+    Returns:
+        list: 匹配的 (行, 列)，无法直接确定时返回 None
+    """
+    rows, cols = len(cost_matrix), len(cost_matrix[0])
+    if rows > cols:
+        return None
+    pairs = [(i, min(range(cols), key=cost_matrix[i].__getitem__)) for i in range(rows)]
+    if len({j for _, j in pairs}) != rows:
+        return None
+    return pairs
+
+
+def assign_by_hungarian(cost_matrix):
+    """把成本矩阵补齐为方阵，使用 KM 算法找到最优匹配"""
+    rows, cols = len(cost_matrix), len(cost_matrix[0])
+    cost_matrix_np = np.array(cost_matrix)
+
+    # 如果matrix不是方阵，需要填充
+    if rows < cols:
+        padding = np.zeros((cols - rows, cols))
+        cost_matrix_np = np.vstack([cost_matrix_np, padding])
+    elif cols < rows:
+        padding = np.zeros((rows, rows - cols))
+        cost_matrix_np = np.hstack([cost_matrix_np, padding])
+
+    row_ind, col_ind = linear_sum_assignment(cost_matrix_np)
+    return [(i, j) for i, j in zip(row_ind, col_ind) if i < rows and j < cols]
+
+
+def metrics_for_single_round_tool_call(golden_answer, tool_calls, is_strict=True, compare_params=compare_params_simple, fast_path=True):
+    """
+    fast_path=True 时，同名工具的每对调用只比较一次，1x1、单个答案调用、以及各行最优位置互不冲突（如全部精确匹配）时
+    直接得到最优匹配，只有真正存在歧义时才调用 linear_sum_assignment；
+    使用 compare_params_simple 时每个调用的参数只序列化一次，比较时只需比较字符串。结果与 fast_path=False 相同
+    """
     golden_dict = convert_to_dict(golden_answer, is_strict)
     output_dict = convert_to_dict(tool_calls, is_strict)
+    use_fingerprints = fast_path and compare_params is compare_params_simple
 
     total_tool = 0
     tool_name_matches = 0
@@ -131,15 +194,26 @@ def metrics_for_single_round_tool_call(golden_answer, tool_calls, is_strict=True
             output_args_list = output_dict[tool_name]
             tool_name_matches += min(len(gold_args_list), len(output_args_list))
             
-            # 创建成本矩阵
+            if use_fingerprints:
+                gold_fingerprints = [fingerprint_params(args) for args in gold_args_list]
+                output_fingerprints = [fingerprint_params(args) for args in output_args_list]
+
+            # 创建成本矩阵，同时保存每对调用的比较结果
+            compared = []
             cost_matrix = []
-            for gold_args in gold_args_list:
+            for i, gold_args in enumerate(gold_args_list):
+                row_results = []
                 row_costs = []
-                for output_args in output_args_list:
-                    total_count, matched_count, is_exact = compare_params(gold_args, output_args)
+                for j, output_args in enumerate(output_args_list):
+                    if use_fingerprints and gold_fingerprints[i] is not None and output_fingerprints[j] is not None:
+                        total_count, matched_count, is_exact = compare_fingerprints(gold_fingerprints[i], output_fingerprints[j])
+                    else:
+                        total_count, matched_count, is_exact = compare_params(gold_args, output_args)
+                    row_results.append((total_count, matched_count, is_exact))
                     # 使用负的匹配参数数作为成本（因为我们要最大化匹配）
                     # 优先考虑精确匹配，其次考虑参数匹配数
                     row_costs.append(-int(is_exact) * 1000 - matched_count)
+                compared.append(row_results)
                 cost_matrix.append(row_costs)
 
             rows = len(cost_matrix)
@@ -148,25 +222,18 @@ def metrics_for_single_round_tool_call(golden_answer, tool_calls, is_strict=True
             if rows == 0 or cols == 0:
                 continue
             
-            cost_matrix_np = np.array(cost_matrix)
-
-            # 如果matrix不是方阵，需要填充
-            if rows < cols:
-                padding = np.zeros((cols - rows, cols))
-                cost_matrix_np = np.vstack([cost_matrix_np, padding])
-            elif cols < rows:
-                padding = np.zeros((rows, rows - cols))
-                cost_matrix_np = np.hstack([cost_matrix_np, padding])
-            
-            # 使用 KM 算法找到最优匹配
-            row_ind, col_ind = linear_sum_assignment(cost_matrix_np)
+            pairs = assign_by_row_minimum(cost_matrix) if fast_path else None
+            if pairs is None:
+                pairs = assign_by_hungarian(cost_matrix)
 
-            for i, j in zip(row_ind, col_ind):
-                if i < rows and j < cols:
+            for i, j in pairs:
+                if fast_path:
+                    total_count, matched_count, is_exact = compared[i][j]
+                else:
                     total_count, matched_count, is_exact = compare_params(gold_args_list[i], output_args_list[j])
-                    matched_params += matched_count
-                    all_matched += is_exact
-                    total_params += total_count
+                matched_params += matched_count
+                all_matched += is_exact
+                total_params += total_count
     
     tool_exact_match = all_matched / len(golden_answer) if len(golden_answer) > 0 else 0
     tool_acc = tool_name_matches / total_tool if total_tool > 0 else 0
@@ -0,0 +1,110 @@
+import queue
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+_DONE = object()
+
+
+def _put(q, item, stop):
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return _DONE
+
+
+def run_pipeline(produce, process, consume, queue_size=4, in_flight=1):
+    """
+    三段式流水线：准备 -> 生成 -> 计算指标，各段之间使用有界队列连接
+
+    Args:
+        produce (callable): 返回任务迭代器，在后台线程中执行（构造 prompt、分词）
+        process (callable): process(task) -> result，模型生成；in_flight 为 1 时在当前线程中执行
+        consume (callable): consume(result)，在后台线程中执行（解析工具调用、计算指标）
+        queue_size (int): 每个队列中最多缓存的任务数，用于限制内存占用
+        in_flight (int): 同时执行 process 的任务数。大于 1 时一批只剩最后几个请求时，其它批的请求已经提交，
+            引擎不会在每批的末尾空闲；process 必须可以在多个线程中同时调用，结果仍按任务的顺序交给 consume
+
+    任意一段出错时，其它段会停止，并在当前线程中重新抛出异常
+    """
+    task_queue = queue.Queue(maxsize=queue_size)
+    result_queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+
+    def producer():
+        try:
+            for task in produce():
+                if not _put(task_queue, task, stop):
+                    return
+            _put(task_queue, _DONE, stop)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    def consumer():
+        try:
+            while True:
+                result = _get(result_queue, stop)
+                if result is _DONE:
+                    return
+                consume(result)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    threads = [
+        threading.Thread(target=producer, name="pipeline-producer", daemon=True),
+        threading.Thread(target=consumer, name="pipeline-consumer", daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        if in_flight <= 1:
+            while True:
+                task = _get(task_queue, stop)
+                if task is _DONE:
+                    break
+                if not _put(result_queue, process(task), stop):
+                    break
+        else:
+            # 任意一批完成后立即提交下一批，不等待更早的批次，结果按提交顺序交给 consume；
+            # 已完成但还在等待更早批次的结果最多 queue_size 批
+            with ThreadPoolExecutor(max_workers=in_flight, thread_name_prefix="pipeline-process") as executor:
+                pending = collections.deque()
+                exhausted = False
+                while True:
+                    while not exhausted and len(pending) < in_flight + queue_size and sum(not f.done() for f in pending) < in_flight:
+                        task = _get(task_queue, stop)
+                        if task is _DONE:
+                            exhausted = True
+                        else:
+                            pending.append(executor.submit(process, task))
+                    if not pending:
+                        break
+                    if pending[0].done() or exhausted or len(pending) >= in_flight + queue_size:
+                        if not _put(result_queue, pending.popleft().result(), stop):
+                            break
+                    else:
+                        wait([f for f in pending if not f.done()], return_when=FIRST_COMPLETED)
+        _put(result_queue, _DONE, stop)
+        # 等待所有结果计算完成
+        threads[1].join()
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
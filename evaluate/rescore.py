@@ -0,0 +1,135 @@
+import os
+import json
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+from .metrics import metrics_for_single_round_tool_call, metrics_for_bfcl
+from .scores import ScoreTable
+
+
+def iter_saved_results(file_path):
+    """逐条读取 save_strategy 保存的结果文件，支持 .json 和 .jsonl"""
+    if file_path.endswith(".jsonl"):
+        with open(file_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(file_path, "r", encoding="utf-8") as f:
+            for save in json.load(f):
+                yield save
+
+
+def is_bfcl_answer(save):
+    """判断标准答案是否为 BFCL 的 tool_call_ground_truth 格式，旧的结果文件中没有 golden_role 时按 data_id 推断"""
+    if "golden_role" in save:
+        return save["golden_role"] == "tool_call_ground_truth"
+    return str(save["data_id"]).startswith("BFCL_")
+
+
+def score_saved_result(item, is_strict=True):
+    """重新计算一条结果的指标，在子进程中执行"""
+    data_id, golden_answer, result, use_bfcl = item
+    if use_bfcl:
+        test_result = metrics_for_bfcl(golden_answer, result["tool_call"], is_strict=is_strict)
+    else:
+        test_result = metrics_for_single_round_tool_call(golden_answer, result["tool_call"], is_strict=is_strict)
+    return data_id, result, test_result
+
+
+def split_result_name(file_path, save):
+    """
+    确定结果文件的模型名和数据集名，优先使用保存时写入记录的 model 和 dataset
+    之前保存的结果中没有这两项，从文件名 <月日>_<时分>_<模型名>_<数据集名> 中拆分，
+    数据集名通过 data_id（<数据集>_<子集名称>_<编号>）确定；模型名中含有 _ 时可能拆分错误
+    """
+    if "model" in save and "dataset" in save:
+        return save["model"], save["dataset"]
+    data_id = save["data_id"]
+    stem = os.path.basename(file_path).rsplit(".", 1)[0]
+    parts = stem.split("_", 2)
+    name = parts[2] if len(parts) == 3 else stem
+    dataset_name = str(data_id).rsplit("_", 1)[0]
+    if name.endswith("_" + dataset_name):
+        return name[:-len(dataset_name) - 1], dataset_name
+    return name, name
+
+
+def unique_dataset_name(all_result, dataset_name, file_path, save):
+    """
+    为同名数据集的另一个结果文件确定不重复的名称，优先加上保存时写入的 test_mode，否则加上文件名
+    名称仍以数据集名开头，按 Benchmark 分组求平均时不受影响
+    """
+    if save.get("test_mode") and f"{dataset_name}_{save['test_mode']}" not in all_result:
+        return f"{dataset_name}_{save['test_mode']}"
+    return f"{dataset_name}_{os.path.basename(file_path).rsplit('.', 1)[0]}"
+
+
+def rescore_results(results_path, metrics, is_strict=True, workers=None, chunk_size=256, report=None, score_tables=None):
+    """
+    不加载模型，根据保存的 result 和 golden_answer 重新计算指标
+
+    Args:
+        results_path (str): 结果文件或包含结果文件的目录
+        metrics (list): 需要计算的指标列表
+        is_strict: 是否严格匹配参数的值
+        workers (int): 计算指标的进程数，默认为 CPU 核数
+        chunk_size (int): 每次发送给子进程的结果条数
+        report (callable): report(model_name, dataset_name, result)
+        score_tables (dict): 不为空时写入 模型名 -> 数据集名 -> ScoreTable
+
+    Returns:
+        dict: 模型名 -> 该模型所有数据集的评估结果
+    """
+    if os.path.isdir(results_path):
+        file_paths = sorted(
+            os.path.join(results_path, filename) for filename in os.listdir(results_path)
+            if filename.endswith((".json", ".jsonl")) and not filename.startswith("report_")
+        )
+    else:
+        file_paths = [results_path]
+
+    all_model_result = {}
+    score = partial(score_saved_result, is_strict=is_strict)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for file_path in file_paths:
+            items = []
+            first_save = None
+            skipped = False
+            for save in iter_saved_results(file_path):
+                if "result" not in save or "golden_answer" not in save:
+                    print(f"{file_path} 中没有保存 result 或 golden_answer，无法重新计算，已跳过")
+                    skipped = True
+                    break
+                if "_round_" in str(save["data_id"]):
+                    print(f"{file_path} 是多轮评测的结果，暂不支持重新计算，已跳过")
+                    skipped = True
+                    break
+                if first_save is None:
+                    first_save = save
+                items.append((save["data_id"], save["golden_answer"], save["result"], is_bfcl_answer(save)))
+            if skipped or len(items) == 0:
+                continue
+
+            model_name, dataset_name = split_result_name(file_path, first_save)
+            all_result = all_model_result.setdefault(model_name, {})
+            if dataset_name in all_result:
+                # 同一模型和数据集有多个结果文件（如不同 test_mode 或多次评测），不覆盖之前的结果
+                dataset_name = unique_dataset_name(all_result, dataset_name, file_path, first_save)
+                print(f"{model_name} 已有同名数据集的结果，{file_path} 的结果记为 {dataset_name}")
+            print(f"\n\n正在重新计算：{file_path}\n\n")
+
+            table = ScoreTable(dataset_name)
+            for data_id, result, test_result in executor.map(score, items, chunksize=chunk_size):
+                table.add(data_id, result, test_result)
+
+            all_result[dataset_name] = table.summarize(metrics)
+            if score_tables is not None:
+                score_tables.setdefault(model_name, {})[dataset_name] = table
+            print(f"\n\n模型：{model_name} 数据集：{dataset_name} 的重新计算结果：\n")
+            print(all_result[dataset_name])
+            print()
+            if report:
+                report(model_name, dataset_name, all_result[dataset_name])
+
+    return all_model_result
@@ -0,0 +1,174 @@
+import numpy as np
+
+# 输出各部分的长度，报告中按调用轮次平均
+LENGTH_KEYS = ["avg_think", "avg_content", "avg_tool_call"]
+# seq 模式分波次评测时只生成仍可能计入得分的轮次，长度按实际生成的轮次平均，
+# 与按全部轮次平均的 LENGTH_KEYS 不可比，使用不同的名称
+GENERATED_LENGTH_KEYS = [f"{key}_generated" for key in LENGTH_KEYS]
+
+
+class ScoreTable:
+    """
+    按列保存一个数据集每个样本的得分
+
+    每行是一个样本：data_id、样本的调用轮数、各部分长度之和，以及每个指标的得分（多轮评测中为各轮得分除以轮数之和）。
+    评测时逐条追加，完成后通过 columns() 转换为 NumPy 数组，数据集、标签、评测集等维度的平均值都可以从同一份数组计算。
+    """
+
+    def __init__(self, dataset_name, length_keys=LENGTH_KEYS):
+        self.dataset_name = dataset_name
+        self.data_ids = []
+        self.rounds = []
+        self.lengths = {key: [] for key in length_keys} # think、content、tool_call 的长度
+        self.scores = {} # 指标名 -> 每行的得分
+        self._rows = {}
+        self._skipped = set() # 因预算用完没有生成输出的行
+        self._columns = None
+
+    def __len__(self):
+        """计入结果的样本数"""
+        return len(self.data_ids) - len(self._skipped)
+
+    def add(self, data_id, result, test_result, num_rounds=1, counted=True, row=None):
+        """
+        记录一次工具调用的长度和指标
+
+        Args:
+            data_id: 样本的 id
+            result (dict): 解析出的 think、content 和 tool_call，为空时不记录长度
+            test_result (dict): 这次调用的指标
+            num_rounds (int): 样本的调用轮数，得分除以轮数后累加
+            counted (bool): 为 False 时只记录长度，如 seq 模式中之前轮次已经出错的样本
+            row: 样本的键，多轮评测中同一样本的各轮使用相同的键；为空时新增一行
+        """
+        index = self._row_index(data_id, row)
+        self.rounds[index] += 1
+        if result is not None:
+            for values, part in zip(self.lengths.values(), ("think", "content", "tool_call")):
+                values[index] += len(result[part])
+        if not counted:
+            return
+        for k, v in test_result.items():
+            if k not in self.scores:
+                self.scores[k] = [0] * len(self.data_ids)
+            self.scores[k][index] += v if num_rounds == 1 else v / num_rounds
+
+    def skip(self, data_id, row=None):
+        """
+        记录一个因预算用完没有生成输出的样本，该样本不计入得分、长度和样本数
+        多轮评测中同一样本的任意一轮被跳过时，整个样本都不计入，之前轮次已经记录的得分也一并去掉
+        """
+        self._skipped.add(self._row_index(data_id, row))
+
+    def _row_index(self, data_id, row):
+        """返回样本所在的行，row 为空或第一次出现时新增一行"""
+        self._columns = None
+        if row is not None and row in self._rows:
+            return self._rows[row]
+        index = len(self.data_ids)
+        if row is not None:
+            self._rows[row] = index
+        self.data_ids.append(data_id)
+        self.rounds.append(0)
+        for values in self.lengths.values():
+            values.append(0)
+        for values in self.scores.values():
+            values.append(0)
+        return index
+
+    @property
+    def num_skipped(self):
+        """因预算用完被跳过的样本数"""
+        return len(self._skipped)
+
+    def columns(self):
+        """返回 NumPy 数组形式的列：data_id、dataset、rounds、长度和各指标，不包括被跳过的样本"""
+        if self._columns is None:
+            columns = {
+                "data_id": np.array(self.data_ids, dtype=object),
+                "dataset": np.full(len(self.data_ids), self.dataset_name, dtype=object),
+                "rounds": np.array(self.rounds, dtype=np.int64),
+                **{key: np.array(values, dtype=np.float64) for key, values in self.lengths.items()},
+                **{key: np.array(values, dtype=np.float64) for key, values in self.scores.items()},
+            }
+            if self._skipped:
+                keep = np.ones(len(self.data_ids), dtype=bool)
+                keep[list(self._skipped)] = False
+                columns = {key: values[keep] for key, values in columns.items()}
+            self._columns = columns
+        return self._columns
+
+    def summarize(self, metrics, size=None):
+        """
+        计算数据集的结果：长度按调用轮次平均，metrics 中的指标按样本平均并乘以 100
+
+        Args:
+            size (int): 样本数，默认为表的行数；没有 prompt 的样本按 0 分计入
+            有样本因预算用完被跳过时，指标只在其余样本上平均，Size 仍为样本数，另外给出实际计分的样本数 Scored
+        """
+        size = len(self.data_ids) if size is None else size
+        scored = size - self.num_skipped
+        summary = summarize_columns(self.columns(), metrics, max(scored, 1))
+        summary["Size"] = size
+        if self.num_skipped:
+            summary["Scored"] = scored
+        return summary
+
+
+def summarize_columns(columns, metrics, size):
+    rounds = max(int(columns["rounds"].sum()), 1)
+    summary = {key: float(columns[key].sum()) / rounds for key in LENGTH_KEYS + GENERATED_LENGTH_KEYS if key in columns}
+    for key, values in columns.items():
+        if key in summary or key in ("data_id", "dataset", "rounds"):
+            continue
+        if key.split("-")[0] in metrics:
+            summary[key] = float(values.sum()) * 100 / size
+    summary["Size"] = size
+    return summary
+
+
+def concat_tables(tables):
+    """把多个数据集的表按行拼接为一份列数组，某个数据集没有的指标按 0 分补齐"""
+    tables = list(tables)
+    all_columns = [table.columns() for table in tables]
+    keys = list(dict.fromkeys(key for columns in all_columns for key in columns))
+    return {
+        key: np.concatenate([
+            columns[key] if key in columns else np.zeros(len(table))
+            for table, columns in zip(tables, all_columns)
+        ]) if all_columns else np.zeros(0)
+        for key in keys
+    }
+
+
+def group_results(columns, groups, metrics):
+    """
+    按分组计算结果，一次 bincount 得到所有分组的和
+
+    Args:
+        columns (dict): ScoreTable.columns() 或 concat_tables 的结果
+        groups: 每行所属的分组；元素为列表时该行属于列表中的每个分组（如样本的多个标签）
+        metrics (list): 需要计算的指标列表
+
+    Returns:
+        dict: 分组 -> 与 ScoreTable.summarize 相同格式的结果，Size 为分组中的样本数
+    """
+    rows, labels = [], []
+    for i, group in enumerate(groups):
+        for label in (group if isinstance(group, (list, tuple, set)) else [group]):
+            rows.append(i)
+            labels.append(label)
+    if not labels:
+        return {}
+    rows = np.array(rows, dtype=np.int64)
+    names, inverse = np.unique(np.array(labels, dtype=object).astype(str), return_inverse=True)
+    sizes = np.bincount(inverse, minlength=len(names))
+    sums = {
+        key: np.bincount(inverse, weights=values[rows], minlength=len(names))
+        for key, values in columns.items() if key not in ("data_id", "dataset")
+    }
+    results = {}
+    for g, name in enumerate(names):
+        group_columns = {key: values[g:g + 1] for key, values in sums.items()}
+        results[str(name)] = summarize_columns(group_columns, metrics, int(sizes[g]))
+    return results
@@ -0,0 +1,391 @@
+import gc
+import itertools
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+
+from models.api_requester import API_Requester
+
+VLLM_LLM_OPTS = [
+    "max_model_len",
+    "max_num_seqs",
+    "max_seq_len_to_capture",
+    "gpu_memory_utilization",
+    "trust_remote_code",
+    "enable_prefix_caching",
+]
+
+THINKING_MODLES = [
+    "Qwen_3",
+]
+
+API_MODELS = [
+    "gpt-4o",
+    "gpt_4o",
+    "o3-mini",
+    "deepseek-chat",
+    "deepseek-reasoner"
+]
+
+# 引擎注册表：同一进程中只保留当前模型的引擎，在不同评测模式、数据集和配置文件之间复用
+_engines = {}
+
+
+def get_truncate_prompt_tokens(model_config):
+    truncate_prompt_tokens = model_config.get("sampling_params",{}).get("truncate_prompt_tokens", None)
+    if truncate_prompt_tokens is None:
+        truncate_prompt_tokens = model_config.get("truncate_prompt_tokens", None)
+    return truncate_prompt_tokens
+
+
+def get_engine_key(model_config):
+    """只有会影响引擎构建的参数才作为键，采样参数、additional_prompt 等可以在复用的引擎上改变"""
+    if model_config["path"] in API_MODELS:
+        return (
+            "api",
+            model_config["path"],
+            model_config.get("api_key",""),
+            str(model_config.get("base_url","")),
+            model_config.get("max_workers", 1),
+            model_config.get("concurrency"),
+            str(sorted(model_config.get("rate_limit", {}).items())),
+            str(sorted(model_config.get("load_balance", {}).items())),
+            str(sorted(model_config.get("batch", {}).items())),
+            model_config.get("stream", False),
+            str(sorted(model_config.get("http", {}).items())),
+            model_config.get("dedup"),
+            str(sorted(model_config.get("budget", {}).items())),
+            str(sorted(model_config.get("hedge", {}).items())),
+            model_config.get("tool_choice", "auto"),
+            model_config.get("additional_prompt", ""),
+        )
+    return (
+        "vllm",
+        model_config["path"],
+        model_config.get("tokenizer", model_config["path"]),
+        model_config.get("tp", 1),
+        model_config.get("pp", 1),
+        tuple(sorted((key, str(model_config[key])) for key in model_config if key in VLLM_LLM_OPTS)),
+    )
+
+
+def build_engine(model_config):
+    if model_config["path"] in API_MODELS:
+        return API_Requester(
+            model=model_config["path"],
+            api_key=model_config.get("api_key",""),
+            base_url=model_config.get("base_url",""),
+            max_workers=model_config.get("max_workers", 1),
+            tool_choice=model_config.get("tool_choice", "auto"),
+            additional_prompt=model_config.get("additional_prompt", ""),
+            concurrency=model_config.get("concurrency"),
+            rate_limit=model_config.get("rate_limit"),
+            load_balance=model_config.get("load_balance"),
+            batch=model_config.get("batch"),
+            stream=model_config.get("stream", False),
+            http=model_config.get("http"),
+            dedup=model_config.get("dedup"),
+            budget=model_config.get("budget"),
+            hedge=model_config.get("hedge"),
+        )
+    from vllm import LLM
+    opts = {
+        key: model_config[key] for key in model_config if key in VLLM_LLM_OPTS
+    }
+    return LLM(
+        model=model_config["path"],
+        tokenizer=model_config.get("tokenizer", model_config["path"]),
+        tensor_parallel_size=model_config.get("tp", 1),
+        pipeline_parallel_size=model_config.get("pp", 1),
+        **opts
+    )
+
+
+def release_engines():
+    """释放所有已加载的引擎及其占用的显存，在加载下一个模型之前调用"""
+    while _engines:
+        key, llm = _engines.popitem()
+        if isinstance(llm, API_Requester):
+            llm.close()
+            continue
+        print("正在释放模型：", key[1])
+        streaming = getattr(llm, "_streaming_engine", None)
+        if streaming is not None:
+            streaming.close()
+        engine_core = getattr(llm.llm_engine, "engine_core", None)
+        if engine_core is not None and hasattr(engine_core, "shutdown"):
+            engine_core.shutdown()
+        try:
+            from vllm.distributed.parallel_state import destroy_model_parallel, destroy_distributed_environment
+            destroy_model_parallel()
+            destroy_distributed_environment()
+        except ImportError:
+            pass
+        del llm
+    gc.collect()
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except ImportError:
+        pass
+
+
+def common_prefix_len(a, b):
+    """两个 token ids 列表的公共前缀长度"""
+    n = min(len(a), len(b))
+    if n == 0:
+        return 0
+    diff = np.flatnonzero(np.asarray(a[:n]) != np.asarray(b[:n]))
+    return int(diff[0]) if len(diff) > 0 else n
+
+
+class StreamingEngine:
+    """
+    在后台线程中通过 LLMEngine 的 add_request / step 驱动 vLLM，多个线程提交的请求在同一个引擎中连续批处理
+
+    LLM.generate 会等待一批请求全部完成，批尾只剩少数长请求时引擎处于半空状态，且不能在多个线程中同时调用；
+    流水线中下一批请求在上一批完成之前就加入引擎，引擎始终保持满载
+    """
+
+    def __init__(self, llm):
+        self.engine = llm.llm_engine
+        self._ids = itertools.count()
+        self._futures = {} # request_id -> Future
+        self._lock = threading.Lock()
+        self._has_work = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="vllm-streaming", daemon=True)
+        self._thread.start()
+
+    def generate(self, request_list, sampling_params):
+        """提交一批请求并等待它们完成，结果与 request_list 的顺序一致，可以在多个线程中同时调用"""
+        futures = []
+        with self._lock:
+            for request in request_list:
+                request_id = f"stream-{next(self._ids)}"
+                future = Future()
+                self._futures[request_id] = future
+                self.engine.add_request(request_id, request, sampling_params)
+                futures.append(future)
+            self._has_work.set()
+        return [future.result() for future in futures]
+
+    def _run(self):
+        while True:
+            self._has_work.wait()
+            if self._closed:
+                return
+            try:
+                # add_request 与 step 不能同时执行
+                with self._lock:
+                    outputs = self.engine.step()
+                    if not self.engine.has_unfinished_requests():
+                        self._has_work.clear()
+                    finished = [(output, self._futures.pop(output.request_id, None)) for output in outputs if output.finished]
+            except BaseException as e:
+                with self._lock:
+                    futures, self._futures = list(self._futures.values()), {}
+                    self._has_work.clear()
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for output, future in finished:
+                if future is not None:
+                    future.set_result(output)
+
+    def close(self):
+        self._closed = True
+        self._has_work.set()
+        self._thread.join()
+
+
+_streaming_lock = threading.Lock()
+
+
+def get_streaming_engine(llm):
+    """同一个 LLM 只创建一个 StreamingEngine，随引擎一起复用和释放"""
+    with _streaming_lock:
+        if getattr(llm, "_streaming_engine", None) is None:
+            llm._streaming_engine = StreamingEngine(llm)
+        return llm._streaming_engine
+
+
+def get_session(model_config, generate_strategy=None):
+    """
+    获取模型的推理会话，已加载的引擎会被复用，加载新模型前会先释放之前的引擎
+    每次评测获取一个新的会话，复用的 API 引擎的请求统计在这里清空，报告中的计数和吞吐只包含本次评测
+
+    Returns:
+        ModelSession: 没有安装 vllm 且不是 API 模型时返回 None
+    """
+    key = get_engine_key(model_config)
+    if key not in _engines:
+        release_engines()
+        try:
+            _engines[key] = build_engine(model_config)
+        except ImportError:
+            print("没有安装 vllm ，仅支持通过 API 进行评测。\n\n")
+            return None
+    else:
+        print("复用已加载的模型：", model_config["path"])
+        if isinstance(_engines[key], API_Requester):
+            _engines[key].reset_stats()
+    return ModelSession(model_config, _engines[key], generate_strategy)
+
+
+class ModelSession:
+    """
+    一个模型的推理会话，持有 LLM（或 API_Requester）、tokenizer、formatter 和采样参数
+
+    generate_strategy 中 sort_prompts=True 时，本地模型的 prompt 会按 token ids 的字典序提交给 vLLM：
+    工具文档位于对话模板的开头，排序后使用相同候选工具的 prompt 相邻，共享前缀越长越靠近，
+    配合 enable_prefix_caching 可以减少重复计算，生成后再恢复原来的顺序。
+    pipeline=True 时本地模型通过 StreamingEngine 生成，流水线中多批请求可以同时提交。
+    """
+
+    def __init__(self, model_config, llm, generate_strategy=None):
+        self.model_config = model_config
+        self.llm = llm
+        self.generate_strategy = generate_strategy or {}
+        self.prefix_stats = {} # tag -> [与前一个 prompt 共享的 token 数, prompt 的 token 总数]
+        # 流水线中多个线程同时调用 _generate，prefix_stats 的更新需要加锁
+        self._stats_lock = threading.Lock()
+        if isinstance(llm, API_Requester):
+            self.tokenizer = None
+            self.formatter = llm
+            self.sampling_config = {
+                **self.formatter.SAMPLING_PARAMS,
+                **model_config.get("sampling_params",{}),
+                "skip_special_tokens": False,
+            }
+            self.sampling_params = self.sampling_config
+        else:
+            from vllm import SamplingParams
+            self.tokenizer = llm.get_tokenizer()
+            additional_params = {}
+            if "enable_thinking" in model_config:
+                if model_config["type"] in THINKING_MODLES:
+                    additional_params["enable_thinking"] = model_config["enable_thinking"]
+                else:
+                    print("enable_thinking 仅对 {} 系列模型生效，已忽略".format(THINKING_MODLES))
+            # 获取格式化器
+            self.formatter = model_config["formatter"](
+                self.tokenizer,
+                additional_prompt=model_config.get("additional_prompt", ""),
+                **additional_params
+            )
+            # 设置采样参数
+            self.sampling_config = {
+                **self.formatter.SAMPLING_PARAMS,
+                **model_config.get("sampling_params",{}),
+                "skip_special_tokens": False,
+            }
+            self.sampling_params = SamplingParams(**self.sampling_config)
+
+    @property
+    def is_api(self):
+        return isinstance(self.llm, API_Requester)
+
+    def encode(self, prompt_list, with_payload=True):
+        """
+        把 prompt 转换为提交给引擎的请求，本地模型需要先分词并从左侧截断
+        流水线中在后台线程里调用，使分词与生成重叠
+
+        Returns:
+            request_list, payload_list: 提交的请求，以及用于计算缓存键和排序的内容（本地模型为 token ids）
+        """
+        if self.is_api:
+            request_list = prompt_list
+            payload_list = request_list
+            if with_payload:
+                payload_list = [self.llm.get_completion_kwargs(prompt, self.sampling_params) for prompt in prompt_list]
+            return request_list, payload_list
+        from vllm.inputs import TokensPrompt
+        self.tokenizer.truncation_side = "left"
+        truncate_prompt_tokens = get_truncate_prompt_tokens(self.model_config)
+        payload_list = self.tokenizer.batch_encode_plus(
+            prompt_list,
+            truncation=truncate_prompt_tokens is not None,
+            max_length=truncate_prompt_tokens,
+        ).input_ids
+        request_list = [TokensPrompt(prompt_token_ids=ids) for ids in payload_list]
+        return request_list, payload_list
+
+    def generate(self, prompt_list, cache=None, tags=None, encoded=None):
+        """
+        批量生成模型输出，命中缓存的请求不再生成
+        tags 与 prompt_list 一一对应，用于分别统计缓存命中情况
+        encoded 为 encode 的返回值，已经分词时传入以避免重复分词
+        """
+        if encoded is None:
+            encoded = self.encode(prompt_list, with_payload=cache is not None)
+        request_list, payload_list = encoded
+        if tags is None:
+            tags = [None] * len(prompt_list)
+
+        if cache is None:
+            return self._generate(request_list, payload_list, tags)
+
+        cache_keys = [cache.key(payload) for payload in payload_list]
+        cached = cache.get_many(cache_keys, tags)
+        output_list = [cached.get(key) for key in cache_keys]
+        todo = [i for i, output in enumerate(output_list) if output is None]
+        if todo:
+            new_outputs = self._generate(
+                [request_list[i] for i in todo],
+                [payload_list[i] for i in todo],
+                [tags[i] for i in todo],
+            )
+            cache.put_many([cache_keys[i] for i in todo], new_outputs)
+            for i, output in zip(todo, new_outputs):
+                output_list[i] = output
+        return output_list
+
+    def _generate(self, request_list, payload_list, tags):
+        if self.is_api:
+            return self.llm.generate(request_list, self.sampling_params, tags=tags)
+        if not self.generate_strategy.get("sort_prompts") or len(request_list) < 2:
+            return self._llm_generate(request_list)
+
+        order = sorted(range(len(request_list)), key=lambda i: payload_list[i])
+        prev_ids = []
+        batch_stats = {}
+        for i in order:
+            stats = batch_stats.setdefault(tags[i], [0, 0])
+            stats[0] += common_prefix_len(prev_ids, payload_list[i])
+            stats[1] += len(payload_list[i])
+            prev_ids = payload_list[i]
+        with self._stats_lock:
+            for tag, (shared, total) in batch_stats.items():
+                stats = self.prefix_stats.setdefault(tag, [0, 0])
+                stats[0] += shared
+                stats[1] += total
+        sorted_outputs = self._llm_generate([request_list[i] for i in order])
+        output_list = [None] * len(request_list)
+        for i, output in zip(order, sorted_outputs):
+            output_list[i] = output
+        return output_list
+
+    def _llm_generate(self, request_list):
+        if self.generate_strategy.get("pipeline"):
+            return get_streaming_engine(self.llm).generate(request_list, self.sampling_params)
+        return self.llm.generate(request_list, sampling_params=self.sampling_params)
+
+    def stats(self, tag=None):
+        """
+        返回某个 tag 的生成统计，PrefixShare 为提交顺序下与前一个 prompt 共享前缀的 token 占比
+        API 模型返回请求、重试、超时、限流和放弃的次数，流式模式下还有延迟的分位数
+        """
+        if self.is_api:
+            return self.llm.stats(tag)
+        with self._stats_lock:
+            if tag is None:
+                shared = sum(v[0] for v in self.prefix_stats.values())
+                total = sum(v[1] for v in self.prefix_stats.values())
+            else:
+                shared, total = self.prefix_stats.get(tag, [0, 0])
+        if total == 0:
+            return {}
+        return {"PrefixShare": shared * 100 / total}
@@ -0,0 +1,177 @@
+import os
+from collections import Counter
+
+import numpy as np
+
+from .rescore import iter_saved_results, split_result_name
+from .scores import ScoreTable, LENGTH_KEYS, GENERATED_LENGTH_KEYS, concat_tables
+
+# 每批重采样使用的元素数上限（批数 x 不同得分的个数），控制内存占用
+CHUNK_ELEMENTS = 2_000_000
+
+
+def metric_keys(columns, metrics):
+    """需要统计的指标列，不包括长度等其它列"""
+    return [
+        key for key in columns
+        if key not in LENGTH_KEYS + GENERATED_LENGTH_KEYS and key not in ("data_id", "dataset", "rounds") and key.split("-")[0] in metrics
+    ]
+
+
+def compress_rows(values):
+    """
+    合并相同的行，返回不同的行和每行出现的次数
+    指标的取值很少（如 0、0.5、1），十万个样本通常只有几十种不同的行，重采样只需要在这些行上进行
+    """
+    return np.unique(values, axis=0, return_counts=True)
+
+
+def bootstrap_ci(values, n_resamples=1000, confidence=0.95, seed=0):
+    """
+    有放回地重采样样本，计算均值的百分位置信区间，各列同时计算
+    重采样得到的每种行的次数服从多项分布，因此直接按不同行的频率抽取多项分布，与逐个抽取样本等价
+
+    Args:
+        values (np.ndarray): 样本数 x 指标数
+
+    Returns:
+        tuple: (下界, 上界)，长度均为指标数
+    """
+    n = len(values)
+    rows, counts = compress_rows(values)
+    rng = np.random.default_rng(seed)
+    chunk = max(1, CHUNK_ELEMENTS // len(rows))
+    means = []
+    for start in range(0, n_resamples, chunk):
+        resampled = rng.multinomial(n, counts / n, size=min(chunk, n_resamples - start))
+        means.append(resampled @ rows / n)
+    means = np.concatenate(means)
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(means, [alpha, 1 - alpha], axis=0)
+    return low, high
+
+
+def paired_permutation_test(diff, n_resamples=10000, seed=0):
+    """
+    配对置换检验（随机交换每对样本的得分，即翻转差值的符号），双侧
+    同一种差值出现 c 次时，翻转后的和为 (2 * Binomial(c, 0.5) - c) 乘以该差值，因此只需要为每种差值抽取二项分布
+
+    Args:
+        diff (np.ndarray): 样本数 x 指标数，两组得分的差
+
+    Returns:
+        np.ndarray: 每个指标的 p 值
+    """
+    rows, counts = compress_rows(diff)
+    rng = np.random.default_rng(seed)
+    observed = np.abs(counts @ rows)
+    chunk = max(1, CHUNK_ELEMENTS // len(rows))
+    extreme = np.zeros(diff.shape[1], dtype=np.int64)
+    for start in range(0, n_resamples, chunk):
+        kept = rng.binomial(counts, 0.5, size=(min(chunk, n_resamples - start), len(rows)))
+        # 浮点误差内相等也视为同样极端
+        extreme += (np.abs((2 * kept - counts) @ rows) >= observed - 1e-9).sum(axis=0)
+    return (extreme + 1) / (n_resamples + 1)
+
+
+def sample_keys(columns):
+    """
+    每行样本的键 (数据集, data_id)，不同数据集中的 data_id 可能相同
+    数据集名称只取路径的最后一段，与保存结果时写入的 dataset 一致
+    """
+    datasets = columns.get("dataset", [None] * len(columns["data_id"]))
+    keys = [(str(dataset).split("/")[-1], data_id) for dataset, data_id in zip(datasets, columns["data_id"])]
+    if len(set(keys)) < len(keys):
+        duplicated = next(key for key, count in Counter(keys).items() if count > 1)
+        raise ValueError(f"数据集 {duplicated[0]} 中有重复的 data_id: {duplicated[1]}，无法与基线配对")
+    return keys
+
+
+def match_by_data_id(columns, baseline):
+    """按 (数据集, data_id) 配对两组得分，返回两组中配对样本的位置"""
+    baseline_index = {key: i for i, key in enumerate(sample_keys(baseline))}
+    pairs = [(i, baseline_index[key]) for i, key in enumerate(sample_keys(columns)) if key in baseline_index]
+    if not pairs:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    index, baseline_index = np.array(pairs, dtype=np.int64).T
+    return index, baseline_index
+
+
+def score_statistics(columns, metrics, baseline=None, n_resamples=1000, n_permutations=10000, confidence=0.95, seed=0):
+    """
+    计算指标的 bootstrap 置信区间；有 baseline 时按 (数据集, data_id) 配对，计算得分差的置信区间和配对置换检验的 p 值
+    基线中没有的指标不做比较（不能当作 0 分），列在 Unmatched-Metrics 中
+
+    Args:
+        columns (dict): ScoreTable.columns() 或 concat_tables 的结果
+        metrics (list): 需要统计的指标列表
+        baseline (dict): 用于比较的另一组结果，格式与 columns 相同
+
+    Returns:
+        dict: 与指标同样乘以 100 的 <指标>-CI-Low、<指标>-CI-High，
+            有 baseline 时还有 Matched、<指标>-Diff、<指标>-Diff-CI-Low、<指标>-Diff-CI-High 和 <指标>-p，
+            以及逗号分隔的 Unmatched-Metrics（基线中有缺少的指标时）
+    """
+    keys = metric_keys(columns, metrics)
+    if not keys or len(columns["data_id"]) == 0:
+        return {}
+    statistics = {}
+    values = np.stack([columns[key] for key in keys], axis=1)
+    low, high = bootstrap_ci(values, n_resamples, confidence, seed)
+    for key, l, h in zip(keys, low, high):
+        statistics[f"{key}-CI-Low"] = float(l) * 100
+        statistics[f"{key}-CI-High"] = float(h) * 100
+
+    if not baseline:
+        return statistics
+    index, baseline_index = match_by_data_id(columns, baseline)
+    statistics["Matched"] = len(index)
+    unmatched = [key for key in keys if key not in baseline]
+    if unmatched:
+        statistics["Unmatched-Metrics"] = ",".join(unmatched)
+    keys = [key for key in keys if key in baseline]
+    if len(index) == 0 or not keys:
+        return statistics
+    diff = np.stack([columns[key][index] - baseline[key][baseline_index] for key in keys], axis=1)
+    low, high = bootstrap_ci(diff, n_resamples, confidence, seed)
+    p_values = paired_permutation_test(diff, n_permutations, seed)
+    for key, mean, l, h, p in zip(keys, diff.mean(axis=0), low, high, p_values):
+        statistics[f"{key}-Diff"] = float(mean) * 100
+        statistics[f"{key}-Diff-CI-Low"] = float(l) * 100
+        statistics[f"{key}-Diff-CI-High"] = float(h) * 100
+        statistics[f"{key}-p"] = float(p)
+    return statistics
+
+
+def load_saved_scores(results_path):
+    """
+    从 save_strategy 保存的结果文件（或目录）中读取每个样本的指标，用作比较的基线
+    保存的结果中总是包含 data_id 和 metrics；多轮评测的结果中没有样本的总轮数，暂不支持
+
+    Returns:
+        dict: 所有文件拼接后的列，格式与 concat_tables 的结果相同
+    """
+    if os.path.isdir(results_path):
+        file_paths = sorted(
+            os.path.join(results_path, filename) for filename in os.listdir(results_path)
+            if filename.endswith((".json", ".jsonl")) and not filename.startswith("report_")
+        )
+    else:
+        file_paths = [results_path]
+
+    tables = []
+    for file_path in file_paths:
+        table = None
+        for save in iter_saved_results(file_path):
+            if "_round_" in str(save["data_id"]):
+                print(f"{file_path} 是多轮评测的结果，暂不支持作为基线，已跳过")
+                table = None
+                break
+            if table is None:
+                # 使用评测时的数据集名称，与当前结果按 (数据集, data_id) 配对
+                table = ScoreTable(split_result_name(file_path, save)[1])
+            table.add(save["data_id"], save.get("result"), save["metrics"])
+        if table is not None and len(table) > 0:
+            tables.append(table)
+    print(f"基线中读取了 {sum(len(table) for table in tables)} 条结果")
+    return concat_tables(tables)
@@ -1,11 +1,28 @@
+import os
 import json
-from time import sleep
+import time
+import asyncio
+import threading
 from tqdm import tqdm
 from datetime import date
 
-from openai import OpenAI
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion
 
 from .deepseek_r1 import DeepSeek_R1
+from .endpoints import Endpoint, EndpointPool
+from .streaming import consume_stream, summarize_latency
+from .transport import build_async_http_client
+from .budget import Budget
+from .hedge import Hedger
+from .batch import (
+    OpenAIBatchRunner, LocalBatchRunner,
+    custom_id, write_batch_file, read_batch_output, batch_file_name,
+)
+from .rate_limit import (
+    COUNTER_KEYS, RateLimiter, AdaptiveConcurrency,
+    estimate_usage, estimate_tokens, classify_error, get_retry_after, backoff_delay,
+)
 
 class API_Requester:
     
@@ -23,21 +40,42 @@ class API_Requester:
             def __init__(self, text):
                 self.text = text
             
-        def __init__(self, text):
+        def __init__(self, text, skipped=False):
             self.outputs = [self.Output(text)]
+            # 因预算用完没有发送的请求，评测时不计入得分
+            self.skipped = skipped
             
     
     def __init__(
             self, 
             model: str = "gpt-4o", 
             api_key: str = None,
-            base_url: str = None,
+            base_url: str = None, # 也可以是列表
             max_workers: int = 32,
             tool_choice: str = 'auto',
             additional_prompt: str = "",
+            concurrency: int = None,
+            rate_limit: dict = None,
+            load_balance: dict = None,
+            batch: dict = None,
+            stream: bool = False,
+            http: dict = None,
+            dedup: bool = None,
+            budget: dict = None,
+            hedge: dict = None,
         ):
         
         self.max_workers = max_workers
+        # 同时进行的请求数，默认与 max_workers 相同
+        self.concurrency = concurrency or max_workers
+        # 限速与重试策略
+        rate_limit = rate_limit or {}
+        self.max_retries = rate_limit.get("max_retries", 5)
+        self.base_delay = rate_limit.get("base_delay", 1)
+        self.max_delay = rate_limit.get("max_delay", 60)
+        self.limiter = RateLimiter(rate_limit.get("requests_per_min"), rate_limit.get("tokens_per_min"))
+        self.concurrency_limiter = AdaptiveConcurrency(self.concurrency, adaptive=rate_limit.get("adaptive", True))
+        self.counters = {} # tag -> 本次评测中请求、重试、超时、限流和放弃的次数，每次评测开始时由 reset_stats 清空
         self.tool_choice = tool_choice
         self.api_key = api_key
         self.additional_prompt = additional_prompt
@@ -48,14 +86,58 @@ class API_Requester:
             raise ValueError("未提供 base_url。请设置 base_url。")
         
         
-        self.client = OpenAI(
-            base_url = self.base_url,
-            api_key = self.api_key
+        client_kwargs = {}
+        if rate_limit.get("timeout"):
+            client_kwargs["timeout"] = rate_limit["timeout"]
+        # base_url 可以是列表，请求在多个端点之间负载均衡，concurrency 和限速是所有端点的总和
+        base_urls = self.base_url if isinstance(self.base_url, list) else [self.base_url]
+        # 所有端点共用一个保持连接的连接池，默认连接数与并发数相同，可以通过 http 开启 HTTP/2
+        self.http_client = build_async_http_client(http, max_connections=self.concurrency)
+        # 重试由 request 统一处理
+        self.endpoints = EndpointPool(
+            [
+                Endpoint(url, AsyncOpenAI(base_url=url, api_key=self.api_key, max_retries=0, http_client=self.http_client, **client_kwargs))
+                for url in base_urls
+            ],
+            **(load_balance or {})
         )
+        # 批处理模式：请求写入 jsonl 文件，通过 Batch API（或本地替代）执行后按 custom_id 取回结果
+        self.batch = batch
+        # 流式模式：拼接增量输出，并记录首 token 时间、token 间隔和输出速度
+        self.stream = stream
+        self.latency = {} # tag -> 每个成功请求的 timing
+        # 合并完全相同的请求，只发送一次；为空时仅在 temperature 为 0 时合并，否则相同的请求是独立的采样
+        self.dedup = dedup
+        # token 与费用预算，prices 同时用于计算报告中的费用
+        self.budget = Budget(**(budget or {}))
+        self.spans = {} # tag -> [第一个请求的发出时间, 最后一个请求的完成时间]，用于计算吞吐量
+        # 对冲请求，减少少数慢请求造成的长尾等待
+        self.hedger = Hedger(**(hedge or {"enabled": False}))
         self.model = model
+        # 转换后的名称 -> 原始名称，只用于还原此前缓存或断点中的输出，每个名称只在第一次转换时写入
         self.tool_name_dict = {}
+        self._tool_names = set() # 所有候选工具的原始名称
+        # 所有请求在同一个后台事件循环中执行，多次 generate 之间复用连接
+        self._loop = None
+        self._loop_lock = threading.Lock()
     
-    def convert_to_openai_tools(self, candidate_tools):
+    def convert_to_openai_tools(self, candidate_tools, name_map=None):
+        """
+        把候选工具转换为 OpenAI 的 tools 格式，不修改数据集中的工具定义
+        name_map 不为空时写入 转换后的名称 -> 原始名称
+        """
+        # 不缓存转换结果：按内容哈希作键比直接转换更慢（每次都要序列化），
+        # 按对象缓存则无法对 list/dict 弱引用，长期复用的引擎会一直持有整个数据集
+        formatted_tools = self._convert_tools(candidate_tools)
+        for tool, gpt_tool in zip(candidate_tools, formatted_tools):
+            converted_name = gpt_tool["function"]["name"]
+            self._tool_names.add(tool["name"])
+            self.tool_name_dict.setdefault(converted_name, tool["name"])
+            if name_map is not None:
+                name_map[converted_name] = tool["name"]
+        return formatted_tools
+
+    def _convert_tools(self, candidate_tools):
         param_type_map = {
             "str": "string",
             "int": "integer",
@@ -93,6 +175,8 @@ class API_Requester:
                         
                         # 处理数组项
                         if prop_value.get('type') == 'array' and 'items' in prop_value:
+                            if isinstance(prop_value['items'], dict):
+                                prop_value['items'] = dict(prop_value['items'])
                             if isinstance(prop_value['items'], dict) and 'type' in prop_value['items']:
                                 prop_value['items']['type'] = map_type(prop_value['items']['type'])
                             
@@ -108,7 +192,6 @@ class API_Requester:
         formatted_tools = []
         for tool in candidate_tools:
             tool_name = tool['name'].strip().replace(".", "_")
-            self.tool_name_dict[tool_name] = tool['name']
             gpt_tool = {
                 "type": "function",
                 "function": {
@@ -142,7 +225,8 @@ class API_Requester:
                             if param_info['type'] == 'array':
                                 param_info['items'] = {"type": "string"}
                                 if 'items' in prop:
-                                    param_info['items'] = prop['items']
+                                    # 复制一份，下面的类型映射不能改动数据集中的工具定义
+                                    param_info['items'] = dict(prop['items']) if isinstance(prop['items'], dict) else prop['items']
                                     # 处理items中的type
                                     if isinstance(param_info['items'], dict) and 'type' in param_info['items']:
                                         param_info['items']['type'] = map_type(param_info['items']['type'])
@@ -179,7 +263,7 @@ class API_Requester:
                             if param_info['type'] == 'array':
                                 param_info['items'] = {"type": "string"}
                                 if 'items' in param_details:
-                                    param_info['items'] = param_details['items']
+                                    param_info['items'] = dict(param_details['items']) if isinstance(param_details['items'], dict) else param_details['items']
                                     # 处理items中的type
                                     if isinstance(param_info['items'], dict) and 'type' in param_info['items']:
                                         param_info['items']['type'] = map_type(param_info['items']['type'])
@@ -263,13 +347,18 @@ class API_Requester:
             else:
                 new_messages.append(message)
                 
-        formatted_tools = self.convert_to_openai_tools(candidate_tools)
+        tool_name_map = {}
+        formatted_tools = self.convert_to_openai_tools(candidate_tools, tool_name_map)
 
-        prompt = {"new_messages":new_messages, "formatted_tools": formatted_tools}
+        prompt = {"new_messages":new_messages, "formatted_tools": formatted_tools, "tool_name_map": tool_name_map}
         return prompt
     
-    def convert_to_vllm_compatible(self, gpt_response):
+    def convert_to_vllm_compatible(self, gpt_response, tool_name_map=None):
         text = gpt_response.choices[0]
+        # 按本次请求的名称映射还原工具名，不依赖共享的 tool_name_dict
+        if tool_name_map and text.message.tool_calls:
+            for tool_call in text.message.tool_calls:
+                tool_call.function.name = tool_name_map.get(tool_call.function.name, tool_call.function.name)
         return self.MockVLLMResponse(text)
     
     def get_completion_kwargs(self, prompt, sampling_params):
@@ -290,76 +379,420 @@ class API_Requester:
                 "max_tokens": sampling_params["max_tokens"],
             }
 
-    def generate(self, prompt_list, sampling_params):
-        max_workers = min(self.max_workers, len(prompt_list))  # 限制最大并行数
-        if max_workers > 1:
+    def _run(self, coro):
+        """在后台事件循环中执行协程并等待结果，调用方本身处于事件循环中时也可以使用"""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="api-requester-loop", daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
 
-            from concurrent.futures import ThreadPoolExecutor, as_completed
-            import traceback
-            
-            responses = [None] * len(prompt_list)  # 预分配结果列表，确保顺序
-            
-            def process_prompt(idx, prompt):
-                completion_kwargs = self.get_completion_kwargs(prompt, sampling_params)
-                
-                t = 0
-                ATTEMPT_TIMES = 3
-                while t < ATTEMPT_TIMES:
-                    try:
-                        response = self.client.chat.completions.create(**completion_kwargs)
-                        response = self.convert_to_vllm_compatible(response)
-                        return idx, response
-                    except Exception as e:
-                        t += 1
-                        error_msg = traceback.format_exc()
-                        print(f"第 {t} 次尝试失败 (索引 {idx}):", error_msg, flush=True)
-                        sleep(5)
-                
-                return idx, self.MockVLLMResponse("")
-            
-            # 使用ThreadPoolExecutor而不是ProcessPoolExecutor，因为API调用是IO密集型
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                # 提交所有任务
-                future_to_idx = {
-                    executor.submit(process_prompt, idx, prompt): idx 
-                    for idx, prompt in enumerate(prompt_list)
-                }
-                
-                # 使用tqdm显示进度
-                with tqdm(total=len(prompt_list), desc="Generating responses", unit="prompt") as pbar:
-                    for future in as_completed(future_to_idx):
-                        try:
-                            idx, response = future.result()
-                            responses[idx] = response
-                        except Exception as exc:
-                            idx = future_to_idx[future]
-                            print(f'处理索引 {idx} 的请求时发生错误: {exc}')
-                            responses[idx] = self.MockVLLMResponse("")
-                        pbar.update(1)
+    async def request(self, prompt, sampling_params, tag=None):
+        """发送一个请求，失败时返回空输出，因预算用完没有发送时返回标记为 skipped 的空输出"""
+        state = {}
+        response = await self.create(self.get_completion_kwargs(prompt, sampling_params), tag, state)
+        if response is None:
+            return self.MockVLLMResponse("", skipped=state.get("budget_skipped", False))
+        return self.convert_to_vllm_compatible(response, prompt.get("tool_name_map"))
+
+    async def create(self, completion_kwargs, tag=None, state=None):
+        """
+        发送一个 chat completions 请求，按限速策略等待，可重试的错误（429、5xx、超时、连接错误）按 Retry-After 或指数退避重试
+        其它 4xx 错误不重试，多次失败后返回 None，并计入 GiveUps
+        预算不足时不发送，返回 None 并计入 BudgetSkipped，state 不为空时写入 state["budget_skipped"] = True
+        """
+        counter = self.counters.setdefault(tag, dict.fromkeys(COUNTER_KEYS, 0))
+        if state is None:
+            state = {}
+        # 预算用完后剩余的请求直接跳过，不再等待限速
+        if self.budget.exhausted:
+            counter["BudgetSkipped"] += 1
+            state["budget_skipped"] = True
+            return None
+        reservation = None
+        error = None
+        for attempt in range(self.max_retries + 1):
+            # 只在第一次尝试时预留预算，重试沿用同一份预留
+            acquired, attempt_reservation = await self.acquire(completion_kwargs, reserve=attempt == 0)
+            if not acquired:
+                counter["BudgetSkipped"] += 1
+                state["budget_skipped"] = True
+                return None
+            if attempt == 0:
+                reservation = attempt_reservation
+                counter["Requests"] += 1
+            start = time.monotonic()
+            try:
+                response = await self.attempt(completion_kwargs, tag)
+            except Exception as e:
+                error = e
+                kind = classify_error(error)
+            else:
+                end = time.monotonic()
+                self.concurrency_limiter.on_success()
+                span = self.spans.setdefault(tag, [start, end])
+                span[0], span[1] = min(span[0], start), max(span[1], end)
+                usage = self.record_usage(tag, response.usage)
+                if reservation is not None:
+                    self.budget.commit(reservation, usage)
+                return response
+            finally:
+                await self.concurrency_limiter.release()
+
+            if kind == "timeout":
+                counter["Timeouts"] += 1
+            elif kind == "throttled":
+                counter["Throttled"] += 1
+                self.concurrency_limiter.on_throttle()
+            if kind == "client" or attempt == self.max_retries:
+                break
+            delay = get_retry_after(error)
+            if delay is None:
+                delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+            if kind == "throttled":
+                self.limiter.pause(delay)
+            counter["Retries"] += 1
+            print(f"第 {attempt+1} 次请求失败（{kind}），{delay:.1f} 秒后重试: {error}", flush=True)
+            await asyncio.sleep(delay)
+        counter["GiveUps"] += 1
+        if reservation is not None:
+            self.budget.release(reservation)
+        print(f"请求失败，已放弃（{classify_error(error)}）: {error}", flush=True)
+        return None
+
+    async def acquire(self, completion_kwargs, reserve=False, wait_budget=True):
+        """
+        发送前依次取得并发名额、预留预算（reserve 为 True 时）并经过限速，普通请求和对冲请求都经过这里
+        先取得并发名额再经过限速：在名额上排队的请求发送前都会检查限流暂停，不会在暂停期间发出；
+        取得并发名额后才预留预算，避免排队中的请求占用预算。wait_budget 为 True 时预算被进行中的请求预留时等待它们结算
+
+        Returns:
+            tuple: (是否可以发送, 预留的预算)，预算不足时释放并发名额并返回 (False, None)；
+            可以发送时调用方负责释放并发名额，并结算或释放预留的预算
+        """
+        await self.concurrency_limiter.acquire()
+        reservation = None
+        try:
+            if reserve and self.budget.limited:
+                usage = estimate_usage(completion_kwargs)
+                reservation = self.budget.reserve(*usage)
+                while wait_budget and reservation is None and not self.budget.exhausted and self.budget.reserved_tokens > 0:
+                    await asyncio.sleep(0.1)
+                    reservation = self.budget.reserve(*usage)
+                if reservation is None:
+                    await self.concurrency_limiter.release()
+                    return False, None
+            await self.limiter.acquire(estimate_tokens(completion_kwargs))
+        except BaseException:
+            # 等待期间被取消（如对冲请求的原请求已经返回）
+            if reservation is not None:
+                self.budget.release(reservation)
+            await self.concurrency_limiter.release()
+            raise
+        return True, reservation
+
+    async def send(self, completion_kwargs, tag=None, exclude=None, sent=None):
+        """
+        向一个端点发送一次请求，不重试；exclude 为尽量避开的端点，sent 不为空时写入选中的端点
+        """
+        endpoint = self.endpoints.pick(exclude)
+        if sent is not None:
+            sent["endpoint"] = endpoint
+        start = time.monotonic()
+        try:
+            if self.stream:
+                stream = await endpoint.client.chat.completions.create(
+                    **completion_kwargs, stream=True, stream_options={"include_usage": True}
+                )
+                completion, timing = await consume_stream(stream, start)
+                response = ChatCompletion.model_validate(completion)
+                self.latency.setdefault(tag, []).append(timing)
+            else:
+                response = await endpoint.client.chat.completions.create(**completion_kwargs)
+        except asyncio.CancelledError:
+            self.endpoints.release(endpoint, kind="cancelled")
+            raise
+        except Exception as e:
+            self.endpoints.release(endpoint, kind=classify_error(e))
+            raise
+        elapsed = time.monotonic() - start
+        self.endpoints.release(endpoint, elapsed=elapsed)
+        self.hedger.observe(elapsed)
+        return response
+
+    async def attempt(self, completion_kwargs, tag=None):
+        """
+        一次尝试：请求超过对冲延迟仍未返回时，向另一个端点发送相同的请求，使用先成功返回的结果并取消另一个
+        两个请求都失败时抛出第一个请求的错误
+        """
+        delay = self.hedger.delay()
+        if delay is None:
+            return await self.send(completion_kwargs, tag)
+        sent = {}
+        primary = asyncio.ensure_future(self.send(completion_kwargs, tag, sent=sent))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or not self.hedger.allow():
+            return await primary
+        state = {}
+        hedge = asyncio.ensure_future(self.hedge(completion_kwargs, tag, sent.get("endpoint"), state))
+        pending = {primary, hedge}
+        response = loser = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    # 对冲请求因预算不足没有发送时返回 None，继续等待原请求
+                    if task.exception() is None and task.result() is not None:
+                        if task is hedge:
+                            self.counters[tag]["HedgeWins"] += 1
+                        response = task.result()
+                        loser = primary if task is hedge else hedge
+                        return response
+        finally:
+            for task in pending:
+                task.cancel()
+            self.settle_hedge(tag, state, response, loser if response is not None else None)
+        raise primary.exception()
+
+    async def hedge(self, completion_kwargs, tag, exclude, state):
+        """
+        对冲请求：与普通请求一样取得并发名额、预留预算并经过限速，预算不足时不等待，直接返回 None
+        state 中记录预留的预算和是否已经发送，由 settle_hedge 结算
+        """
+        acquired, state["reservation"] = await self.acquire(completion_kwargs, reserve=True, wait_budget=False)
+        if not acquired:
+            return None
+        try:
+            state["sent"] = True
+            self.counters.setdefault(tag, dict.fromkeys(COUNTER_KEYS, 0))["Hedges"] += 1
+            return await self.send(completion_kwargs, tag, exclude=exclude)
+        finally:
+            await self.concurrency_limiter.release()
+
+    def settle_hedge(self, tag, state, response, loser):
+        """
+        结算对冲请求多消耗的用量：create 只记录返回的 response 的用量，另一个请求 loser 的用量在这里计入，
+        预算从对冲请求的预留中结算。loser 发出后被取消时按 response 的 usage 计入（相同的请求用量相近），
+        没有 usage 时按预留的估计用量计入预算；loser 失败、对冲请求没有发送或两个请求都失败时只释放预留的预算
+        """
+        reservation = state.get("reservation")
+        if not state.get("sent") or loser is None or (loser.done() and (loser.cancelled() or loser.exception() is not None)):
+            if reservation is not None:
+                self.budget.release(reservation)
+            return
+        usage = self.record_usage(tag, (loser.result() if loser.done() else response).usage)
+        if reservation is not None:
+            self.budget.commit(reservation, usage)
+
+    def record_usage(self, tag, usage):
+        """
+        记录响应中的 token 用量
+
+        Returns:
+            tuple: (输入 token 数, 输出 token 数)，响应中没有 usage 时返回 None
+        """
+        if usage is None:
+            return None
+        if not isinstance(usage, dict):
+            usage = usage.model_dump()
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        completion_tokens = usage.get("completion_tokens") or 0
+        counter = self.counters.setdefault(tag, dict.fromkeys(COUNTER_KEYS, 0))
+        counter["PromptTokens"] += prompt_tokens
+        counter["CompletionTokens"] += completion_tokens
+        return prompt_tokens, completion_tokens
+
+    async def agenerate(self, prompt_list, sampling_params, tags=None):
+        """并发发送所有请求，同时进行的请求数不超过并发上限，结果与 prompt_list 的顺序一致"""
+        if tags is None:
+            tags = [None] * len(prompt_list)
+        pbar = tqdm(total=len(prompt_list), desc="Generating responses", unit="prompt")
+
+        async def process_prompt(prompt, tag):
+            response = await self.request(prompt, sampling_params, tag)
+            pbar.update(1)
+            return response
+
+        # 设置了预算时按估计的用量从小到大发送，预算能覆盖尽可能多的样本
+        order = list(range(len(prompt_list)))
+        if self.budget.limited:
+            order.sort(key=lambda i: estimate_tokens(self.get_completion_kwargs(prompt_list[i], sampling_params)))
+        try:
+            responses = await asyncio.gather(*(process_prompt(prompt_list[i], tags[i]) for i in order))
+            output_list = [None] * len(prompt_list)
+            for i, response in zip(order, responses):
+                output_list[i] = response
+            return output_list
+        finally:
+            pbar.close()
+            if len(self.endpoints) > 1:
+                print(self.endpoints.summary(), flush=True)
+
+    async def abatch_generate(self, prompt_list, sampling_params, tags=None):
+        """
+        批处理模式：把所有请求写入 work_dir 下的输入文件，执行后读取输出文件，结果与 prompt_list 的顺序一致
+        max_requests_per_file 条请求一个文件，多个文件同时执行
+        使用 Batch API 且设置了预算时，提交前按估计的用量从小到大预留预算，预算不足的请求不提交
+        """
+        if tags is None:
+            tags = [None] * len(prompt_list)
+        work_dir = self.batch.get("work_dir", "./batches")
+        os.makedirs(work_dir, exist_ok=True)
+        backend = self.batch.get("backend", "openai")
+        if backend == "openai":
+            runner = OpenAIBatchRunner(
+                self.endpoints.endpoints[0].client,
+                poll_interval=self.batch.get("poll_interval", 30),
+                completion_window=self.batch.get("completion_window", "24h"),
+            )
+        elif backend == "local":
+            runner = LocalBatchRunner(self)
         else:
-            responses = []
-        
-            for prompt in tqdm(prompt_list, desc="Generating responses", unit="prompt"):
-                completion_kwargs = self.get_completion_kwargs(prompt, sampling_params)
-
-                t = 0
-                ATTEMPT_TIMES = 3
-                while t < ATTEMPT_TIMES:
-                    try:
-                        response = self.client.chat.completions.create(**completion_kwargs)
-                        response = self.convert_to_vllm_compatible(response)
-                        responses.append(response)
-                        break
-                    except Exception as e:
-                        t += 1
-                        print(f"第 {t} 次尝试失败:", prompt["new_messages"], e, flush=True)
-                        sleep(5)
-                if t == ATTEMPT_TIMES:
-                    responses.append(self.MockVLLMResponse(""))
-                # sleep(1)
-        
-        return responses
-    
+            raise ValueError(f"不支持的批处理后端：{backend}，可选 openai、local")
+
+        payload_list = [self.get_completion_kwargs(prompt, sampling_params) for prompt in prompt_list]
+        send = list(range(len(prompt_list)))
+        reservations = {}
+        if backend == "openai" and self.budget.limited:
+            send = []
+            for i in sorted(range(len(payload_list)), key=lambda i: estimate_tokens(payload_list[i])):
+                reservation = None if self.budget.exhausted else self.budget.reserve(*estimate_usage(payload_list[i]))
+                if reservation is None:
+                    self.counters.setdefault(tags[i], dict.fromkeys(COUNTER_KEYS, 0))["BudgetSkipped"] += 1
+                else:
+                    reservations[i] = reservation
+                    send.append(i)
+            send.sort()
+        chunk_size = self.batch.get("max_requests_per_file", 50000)
+
+        async def run_chunk(start):
+            chunk = send[start:start+chunk_size]
+            payloads = [payload_list[i] for i in chunk]
+            input_path = os.path.join(work_dir, batch_file_name(payloads) + ".jsonl")
+            output_path = input_path[:-len(".jsonl")] + ".output.jsonl"
+            if not os.path.exists(output_path):
+                write_batch_file(input_path, payloads)
+                if backend == "local":
+                    await runner.run(input_path, output_path, [tags[i] for i in chunk])
+                else:
+                    await runner.run(input_path, output_path)
+            else:
+                print(f"使用已有的批处理结果：{output_path}", flush=True)
+            with open(output_path, encoding="utf-8") as fin:
+                results = read_batch_output(fin)
+            for k, i in enumerate(chunk):
+                if backend == "local" and custom_id(k) not in results:
+                    # 本地批处理中因预算用完没有发送的请求不写入输出文件
+                    output_list[i] = self.MockVLLMResponse("", skipped=True)
+                    continue
+                body = results.get(custom_id(k))
+                if backend == "openai":
+                    counter = self.counters.setdefault(tags[i], dict.fromkeys(COUNTER_KEYS, 0))
+                    counter["Requests"] += 1
+                    if body is None:
+                        counter["GiveUps"] += 1
+                    usage = self.record_usage(tags[i], (body or {}).get("usage"))
+                    if i in reservations:
+                        if body is None:
+                            self.budget.release(reservations[i])
+                        else:
+                            self.budget.commit(reservations[i], usage)
+                if body is not None:
+                    output_list[i] = self.convert_to_vllm_compatible(ChatCompletion.model_validate(body), prompt_list[i].get("tool_name_map"))
+
+        # 因预算不足没有提交的请求标记为 skipped
+        submitted = set(send)
+        output_list = [self.MockVLLMResponse("", skipped=i not in submitted) for i in range(len(prompt_list))]
+        await asyncio.gather(*(run_chunk(start) for start in range(0, len(send), chunk_size)))
+        return output_list
+
+    def generate(self, prompt_list, sampling_params, tags=None):
+        """
+        批量生成，tags 与 prompt_list 一一对应（如请求所属的数据集），用于分别统计重试等情况
+        """
+        if len(prompt_list) == 0:
+            return []
+        if tags is None:
+            tags = [None] * len(prompt_list)
+        dedup = self.dedup if self.dedup is not None else sampling_params.get("temperature") == 0
+        if dedup:
+            unique_index, index_of = self.dedup_prompts(prompt_list, sampling_params)
+            for i, tag in enumerate(tags):
+                if unique_index[index_of[i]] != i:
+                    counter = self.counters.setdefault(tag, dict.fromkeys(COUNTER_KEYS, 0))
+                    counter["Deduplicated"] += 1
+            prompt_list = [prompt_list[i] for i in unique_index]
+            tags = [tags[i] for i in unique_index]
+        if self.batch:
+            output_list = list(self._run(self.abatch_generate(prompt_list, sampling_params, tags)))
+        else:
+            output_list = list(self._run(self.agenerate(prompt_list, sampling_params, tags)))
+        if dedup:
+            output_list = [output_list[j] for j in index_of]
+        return output_list
+
+    def dedup_prompts(self, prompt_list, sampling_params):
+        """
+        找出请求参数完全相同的 prompt
+
+        Returns:
+            unique_index, index_of: 每个不同请求第一次出现的位置，以及每个 prompt 对应第几个不同的请求
+        """
+        unique_index, index_of, seen = [], [], {}
+        for i, prompt in enumerate(prompt_list):
+            key = json.dumps(
+                [self.get_completion_kwargs(prompt, sampling_params), prompt.get("tool_name_map")],
+                sort_keys=True, ensure_ascii=False, default=str,
+            )
+            if key not in seen:
+                seen[key] = len(unique_index)
+                unique_index.append(i)
+            index_of.append(seen[key])
+        return unique_index, index_of
+
+    def reset_stats(self):
+        """
+        清空请求计数、延迟和吞吐的统计，引擎在多次评测之间复用，每次评测开始时调用，报告中只包含本次评测的请求
+        端点的延迟估计和对冲延迟用于调度，不清空
+        """
+        self.counters = {}
+        self.latency = {}
+        self.spans = {}
+
+    def stats(self, tag=None):
+        """
+        返回某个 tag 的请求计数，tag 为空时返回总的计数
+        流式模式下还包括 TTFT（毫秒）、ITL（毫秒）和 TokensPerSec 的 p50、p95、p99
+        有重复的请求被合并时还包括 DedupRatio，即被合并的请求占全部请求的百分比
+        Cost 为按 budget.prices 计算的费用，Throughput 为每秒输出的 token 数（从第一个请求发出到最后一个请求完成）
+        """
+        if tag is None:
+            result = {key: sum(counter[key] for counter in self.counters.values()) for key in COUNTER_KEYS}
+            timings = [timing for values in self.latency.values() for timing in values]
+            spans = list(self.spans.values())
+        else:
+            result = dict(self.counters.get(tag, dict.fromkeys(COUNTER_KEYS, 0)))
+            timings = self.latency.get(tag, [])
+            spans = [self.spans[tag]] if tag in self.spans else []
+        if result["Deduplicated"]:
+            result["DedupRatio"] = result["Deduplicated"] * 100 / (result["Requests"] + result["Deduplicated"])
+        if self.budget.prompt_price or self.budget.completion_price:
+            result["Cost"] = self.budget.cost(result["PromptTokens"], result["CompletionTokens"])
+        if spans:
+            elapsed = max(span[1] for span in spans) - min(span[0] for span in spans)
+            if elapsed > 0:
+                result["Throughput"] = result["CompletionTokens"] / elapsed
+        result.update(summarize_latency(timings))
+        return result
+
+    def close(self):
+        """关闭客户端并停止后台事件循环"""
+        if self._loop is None:
+            return
+        self._run(self.http_client.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop = None
+
     def convert_tool_calls(self, tool_calls):
         converted_tool_calls = []
 
@@ -388,6 +821,10 @@ class API_Requester:
 
         return converted_tool_calls
     
+    def get_tool_calls(self, responses, pool=None, chunk_size=32):
+        """批量提取工具调用，API 的输出已经是结构化的，直接在当前进程中解析，不使用进程池"""
+        return [self.get_tool_call(response) for response in responses]
+
     def get_tool_call(self, response):
         if self.model == "deepseek-reasoner":
             return DeepSeek_R1(None).get_tool_call(response)
@@ -397,14 +834,15 @@ class API_Requester:
             "tool_call": []
         }
         try:
-            result["content"] = response.message.content
+            result["content"] = response.message.content or ""
             tool_calls = []
             if response.message.tool_calls:
                 gpt_tool_calls = self.convert_tool_calls(response.message.tool_calls)
                 for gpt_tool_call in gpt_tool_calls:
                     tool_call = {}
                     tool_call["name"] = gpt_tool_call["function"]["name"]
-                    if tool_call["name"] in self.tool_name_dict:
+                    # 已经还原过的名称不再映射，避免 a.b 与 a_b 这样的名称互相冲突
+                    if tool_call["name"] in self.tool_name_dict and tool_call["name"] not in self._tool_names:
                         tool_call["name"] = self.tool_name_dict[tool_call["name"]]
                     tool_call["parameters"] = json.loads(gpt_tool_call["function"]["arguments"])
                     tool_calls.append(tool_call)
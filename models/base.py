@@ -1,6 +1,16 @@
 import json
 import ast
 
+# 子进程中使用的格式化器，由进程池的 initializer 设置
+_worker_formatter = None
+
+def _init_worker(formatter):
+    global _worker_formatter
+    _worker_formatter = formatter
+
+def _parse_chunk(outputs):
+    return [_worker_formatter.get_tool_call(output) for output in outputs]
+
 class BaseFormatter:
 
     @staticmethod
@@ -17,10 +27,33 @@ class BaseFormatter:
                     return {}
 
 
+    def has_think_token(self):
+        """词表中是否有 </think>，get_vocab 每次都会重新构建字典，因此只计算一次"""
+        if getattr(self, "_has_think_token", None) is None:
+            self._has_think_token = "</think>" in self.tokenizer.get_vocab()
+        return self._has_think_token
+
+    def get_tool_calls(self, outputs, pool=None, chunk_size=32):
+        """
+        批量提取工具调用，结果与逐条调用 get_tool_call 相同
+
+        Args:
+            outputs (list): 模型输出的文本列表
+            pool: 以 _init_worker 为 initializer 创建的进程池（见 evaluate_model.create_parse_pool），为空时在当前进程中解析
+            chunk_size (int): 每次发送给子进程的输出条数，输出少于两块时在当前进程中解析
+        """
+        if pool is None or len(outputs) < chunk_size * 2:
+            return [self.get_tool_call(output) for output in outputs]
+        chunks = [outputs[start:start + chunk_size] for start in range(0, len(outputs), chunk_size)]
+        results = []
+        for chunk_results in pool.map(_parse_chunk, chunks):
+            results.extend(chunk_results)
+        return results
+
     def get_tool_call(self, output):
         try:
             result = self.parser.extract_tool_calls(output, {})
-            if result.content and "</think>" in self.tokenizer.get_vocab() and "</think>" in result.content:
+            if result.content and "</think>" in result.content and self.has_think_token():
                 think_parts = []
                 content_parts = []
 
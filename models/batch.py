@@ -0,0 +1,147 @@
+import os
+import json
+import asyncio
+import hashlib
+
+from tqdm import tqdm
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+# OpenAI Batch API 的终止状态
+FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def custom_id(index):
+    return f"request-{index}"
+
+
+def write_batch_file(path, payload_list):
+    """把 get_completion_kwargs 的结果写成 Batch API 的输入文件，custom_id 为 request-<序号>"""
+    with open(path, "w", encoding="utf-8") as fout:
+        for i, payload in enumerate(payload_list):
+            fout.write(json.dumps({
+                "custom_id": custom_id(i),
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": payload,
+            }, ensure_ascii=False) + "\n")
+
+
+def read_batch_output(lines):
+    """
+    解析 Batch API 的输出（或错误）文件
+
+    Returns:
+        dict: custom_id -> ChatCompletion 的 json，失败的请求为 None
+    """
+    results = {}
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        item = json.loads(line)
+        response = item.get("response") or {}
+        if item.get("error") or response.get("status_code") != 200:
+            results[item["custom_id"]] = None
+        else:
+            results[item["custom_id"]] = response["body"]
+    return results
+
+
+def batch_file_name(payload_list):
+    """按请求内容命名，同样的请求重新评测时可以找到之前提交的任务"""
+    digest = hashlib.sha256()
+    for payload in payload_list:
+        digest.update(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return "batch_" + digest.hexdigest()[:16]
+
+
+class OpenAIBatchRunner:
+    """
+    通过 OpenAI Batch API 执行输入文件：上传文件、创建任务、轮询直到结束，再下载输出和错误文件
+    任务 id 保存在输入文件旁边，中断后重新执行会继续等待同一个任务而不是重新提交
+    """
+
+    def __init__(self, client, poll_interval=30, completion_window="24h"):
+        self.client = client
+        self.poll_interval = poll_interval
+        self.completion_window = completion_window
+
+    async def run(self, input_path, output_path):
+        id_path = input_path + ".batch_id"
+        batch = None
+        if os.path.exists(id_path):
+            with open(id_path) as fin:
+                batch = await self.client.batches.retrieve(fin.read().strip())
+            if batch.status in ("failed", "expired", "cancelled"):
+                batch = None
+            else:
+                print(f"继续等待已提交的批处理任务：{batch.id}", flush=True)
+        if batch is None:
+            with open(input_path, "rb") as fin:
+                input_file = await self.client.files.create(file=fin, purpose="batch")
+            batch = await self.client.batches.create(
+                input_file_id=input_file.id,
+                endpoint=BATCH_ENDPOINT,
+                completion_window=self.completion_window,
+            )
+            with open(id_path, "w") as fout:
+                fout.write(batch.id)
+            print(f"已提交批处理任务：{batch.id}", flush=True)
+
+        while batch.status not in FINAL_STATUSES:
+            counts = batch.request_counts
+            if counts is not None:
+                print(f"批处理任务 {batch.id}：{batch.status}，已完成 {counts.completed}/{counts.total}，失败 {counts.failed}", flush=True)
+            await asyncio.sleep(self.poll_interval)
+            batch = await self.client.batches.retrieve(batch.id)
+        if batch.status != "completed":
+            os.remove(id_path)
+            raise RuntimeError(f"批处理任务 {batch.id} 未完成：{batch.status}，{batch.errors}")
+
+        with open(output_path, "w", encoding="utf-8") as fout:
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if file_id:
+                    content = await self.client.files.content(file_id)
+                    fout.write(content.text.rstrip("\n") + "\n")
+
+
+class LocalBatchRunner:
+    """
+    本地的批处理替代：读取同样格式的输入文件，通过 API_Requester 的 chat completions 请求逐条执行
+    （并发、限速和多端点负载均衡照常生效），再写出与 Batch API 相同格式的输出文件
+    可以配合本地 vLLM 的 OpenAI 兼容服务测试批处理流程，因预算用完没有发送的请求不写入输出文件
+    """
+
+    def __init__(self, requester):
+        self.requester = requester
+
+    async def run(self, input_path, output_path, tags=None):
+        with open(input_path, encoding="utf-8") as fin:
+            items = [json.loads(line) for line in fin if line.strip()]
+        if tags is None:
+            tags = [None] * len(items)
+        pbar = tqdm(total=len(items), desc="Running local batch", unit="prompt")
+
+        async def process_item(item, tag):
+            state = {}
+            response = await self.requester.create(item["body"], tag, state)
+            pbar.update(1)
+            if state.get("budget_skipped"):
+                return None
+            if response is None:
+                return {"custom_id": item["custom_id"], "response": None, "error": {"message": "request failed"}}
+            return {
+                "custom_id": item["custom_id"],
+                "response": {"status_code": 200, "body": response.model_dump(mode="json")},
+                "error": None,
+            }
+
+        try:
+            results = await asyncio.gather(*(process_item(item, tag) for item, tag in zip(items, tags)))
+        finally:
+            pbar.close()
+        with open(output_path, "w", encoding="utf-8") as fout:
+            for result in results:
+                if result is None:
+                    continue
+                fout.write(json.dumps(result, ensure_ascii=False) + "\n")
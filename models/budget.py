@@ -0,0 +1,70 @@
+class Budget:
+    """
+    评测的 token 和费用预算
+
+    发送请求前按估计的用量预留，收到响应后按 usage 中的实际用量结算；
+    剩余预算不足以预留时不再发送请求。prices 为每百万 token 的价格，如 dict(prompt=2.5, completion=10)
+    预算随引擎在同一模型的多次评测之间共享，限制的是整组评测的用量；报告中的 Cost 和 token 数按每次评测统计
+    """
+
+    def __init__(self, max_tokens=None, max_cost=None, prices=None):
+        prices = prices or {}
+        self.max_tokens = max_tokens
+        self.max_cost = max_cost
+        self.prompt_price = prices.get("prompt", 0)
+        self.completion_price = prices.get("completion", 0)
+        self.spent_tokens = 0
+        self.spent_cost = 0.0
+        self.reserved_tokens = 0
+        self.reserved_cost = 0.0
+        self.exhausted = False
+
+    @property
+    def limited(self):
+        return self.max_tokens is not None or self.max_cost is not None
+
+    def cost(self, prompt_tokens, completion_tokens):
+        return (prompt_tokens * self.prompt_price + completion_tokens * self.completion_price) / 1e6
+
+    def reserve(self, prompt_tokens, completion_tokens):
+        """
+        按估计的用量预留预算
+
+        Returns:
+            tuple: 预留的 (token 数, 费用)，预算不足时返回 None
+            只有不计预留、已经使用的部分加上这次请求也超出预算时才标记为用完，
+            否则是进行中的请求预留过多，等它们结算后可能还有剩余
+        """
+        tokens = prompt_tokens + completion_tokens
+        cost = self.cost(prompt_tokens, completion_tokens)
+        if not self._fits(tokens, cost, self.reserved_tokens, self.reserved_cost):
+            if not self.exhausted and not self._fits(tokens, cost, 0, 0):
+                self.exhausted = True
+                print(f"预算已用完（已使用 {self.spent_tokens} tokens，费用 {self.spent_cost:.4f}），之后的请求不再发送", flush=True)
+            return None
+        self.reserved_tokens += tokens
+        self.reserved_cost += cost
+        return tokens, cost
+
+    def _fits(self, tokens, cost, reserved_tokens, reserved_cost):
+        if self.max_tokens is not None and self.spent_tokens + reserved_tokens + tokens > self.max_tokens:
+            return False
+        if self.max_cost is not None and self.spent_cost + reserved_cost + cost > self.max_cost:
+            return False
+        return True
+
+    def commit(self, reservation, usage=None):
+        """释放预留的预算并记入实际用量，usage 为 (输入 token 数, 输出 token 数)，没有 usage 时按预留的用量计算"""
+        tokens, cost = reservation
+        self.reserved_tokens -= tokens
+        self.reserved_cost -= cost
+        if usage is not None:
+            tokens = sum(usage)
+            cost = self.cost(*usage)
+        self.spent_tokens += tokens
+        self.spent_cost += cost
+
+    def release(self, reservation):
+        """请求没有消耗 token（如被拒绝）时只释放预留的预算"""
+        self.reserved_tokens -= reservation[0]
+        self.reserved_cost -= reservation[1]
@@ -0,0 +1,140 @@
+import time
+import random
+import asyncio
+
+# 计入端点健康状况的错误类型，429 和其它 4xx 与端点本身是否可用无关
+FAILURE_KINDS = ("server", "timeout", "connection", "other")
+
+POLICIES = ("least_outstanding", "latency")
+
+
+class Endpoint:
+    """一个 OpenAI 兼容的服务地址，记录进行中的请求数、延迟和连续失败次数"""
+
+    def __init__(self, base_url, client):
+        self.base_url = base_url
+        self.client = client
+        self.outstanding = 0
+        self.latency = None # 成功请求耗时的指数滑动平均（秒）
+        self.failures = 0 # 连续失败次数
+        self.ejected_until = None # 被摘除时为恢复探测的时间
+        self.probing = False
+        self.requests = 0
+        self.errors = 0
+        self.ejections = 0
+        self.eject_streak = 0 # 连续摘除次数，恢复后清零
+
+    @property
+    def healthy(self):
+        return self.ejected_until is None
+
+    def summary(self):
+        latency = "-" if self.latency is None else f"{self.latency:.2f}s"
+        state = "正常" if self.healthy else "已摘除"
+        return f"{self.base_url}: 请求 {self.requests}，失败 {self.errors}，摘除 {self.ejections} 次，平均延迟 {latency}，{state}"
+
+
+class EndpointPool:
+    """
+    多个端点之间的负载均衡
+
+    policy 为 least_outstanding 时选择进行中请求最少的端点，
+    为 latency 时按 平均延迟 x (进行中请求数 + 1) 选择，更快的副本分到更多请求；
+    还没有延迟数据的端点按其它端点的平均延迟计算，都没有延迟数据时按进行中请求数选择。
+    连续失败 max_failures 次的端点被摘除 eject_seconds 秒，之后用 /models 探测，成功才重新加入，
+    失败则继续摘除且时间加倍。所有端点都被摘除时仍在全部端点中选择，交给重试逻辑处理。
+    """
+
+    def __init__(self, endpoints, policy="least_outstanding", max_failures=3, eject_seconds=30,
+                 max_eject_seconds=300, probe_timeout=5, ewma_alpha=0.2):
+        if policy not in POLICIES:
+            raise ValueError(f"不支持的负载均衡策略：{policy}，可选 {POLICIES}")
+        self.endpoints = endpoints
+        self.policy = policy
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self.max_eject_seconds = max_eject_seconds
+        self.probe_timeout = probe_timeout
+        self.ewma_alpha = ewma_alpha
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def _score(self, endpoint, default_latency=None):
+        if self.policy == "latency":
+            # 还没有延迟数据的端点按已知端点的平均延迟计算，所有端点都没有延迟数据时按进行中请求数选择
+            latency = endpoint.latency if endpoint.latency is not None else default_latency
+            if latency is not None:
+                return latency * (endpoint.outstanding + 1)
+        return endpoint.outstanding
+
+    def _default_latency(self):
+        """已有延迟数据的端点的平均延迟，都没有时返回 None"""
+        known = [endpoint.latency for endpoint in self.endpoints if endpoint.latency is not None]
+        return sum(known) / len(known) if known else None
+
+    def pick(self, exclude=None):
+        """
+        选择一个端点并把它的进行中请求数加一，请求结束后需要调用 release
+        exclude 为尽量避开的端点（如对冲请求避开原请求的端点），没有其它可用端点时仍可能选中
+        """
+        now = time.monotonic()
+        for endpoint in self.endpoints:
+            if not endpoint.healthy and not endpoint.probing and now >= endpoint.ejected_until:
+                endpoint.probing = True
+                asyncio.ensure_future(self.probe(endpoint))
+        candidates = [endpoint for endpoint in self.endpoints if endpoint.healthy] or self.endpoints
+        candidates = [endpoint for endpoint in candidates if endpoint is not exclude] or candidates
+        default_latency = self._default_latency() if self.policy == "latency" else None
+        scores = [self._score(endpoint, default_latency) for endpoint in candidates]
+        best = min(scores)
+        endpoint = random.choice([endpoint for endpoint, score in zip(candidates, scores) if score == best])
+        endpoint.outstanding += 1
+        endpoint.requests += 1
+        return endpoint
+
+    def release(self, endpoint, elapsed=None, kind=None):
+        """
+        记录请求结果，kind 为空表示成功，否则为 classify_error 返回的错误类型，被取消的请求为 cancelled
+        """
+        endpoint.outstanding -= 1
+        if kind == "cancelled":
+            return
+        if kind is None:
+            endpoint.failures = 0
+            if endpoint.latency is None:
+                endpoint.latency = elapsed
+            else:
+                endpoint.latency += self.ewma_alpha * (elapsed - endpoint.latency)
+            return
+        endpoint.errors += 1
+        if kind not in FAILURE_KINDS or len(self.endpoints) == 1:
+            return
+        endpoint.failures += 1
+        if endpoint.healthy and endpoint.failures >= self.max_failures:
+            self.eject(endpoint)
+
+    def eject(self, endpoint):
+        seconds = min(self.max_eject_seconds, self.eject_seconds * 2 ** endpoint.eject_streak)
+        endpoint.ejected_until = time.monotonic() + seconds
+        endpoint.ejections += 1
+        endpoint.eject_streak += 1
+        print(f"端点 {endpoint.base_url} 连续失败 {endpoint.failures} 次，摘除 {seconds:.0f} 秒", flush=True)
+
+    async def probe(self, endpoint):
+        """健康检查：请求 /models，成功则重新加入，失败则再次摘除"""
+        try:
+            await asyncio.wait_for(endpoint.client.models.list(), self.probe_timeout)
+        except Exception as e:
+            print(f"端点 {endpoint.base_url} 健康检查失败: {e}", flush=True)
+            self.eject(endpoint)
+        else:
+            print(f"端点 {endpoint.base_url} 已恢复", flush=True)
+            endpoint.ejected_until = None
+            endpoint.failures = 0
+            endpoint.eject_streak = 0
+        finally:
+            endpoint.probing = False
+
+    def summary(self):
+        return "\n".join(endpoint.summary() for endpoint in self.endpoints)
@@ -0,0 +1,48 @@
+import collections
+
+
+class Hedger:
+    """
+    对冲请求的策略
+
+    记录最近 window 个成功请求的耗时，请求超过其中 percentile 分位数的耗时（不少于 min_delay 秒）仍未返回时，
+    再发送一个相同的请求。样本少于 min_samples 时不对冲；对冲请求数最多为请求总数的 max_ratio，避免服务变慢时加倍负载。
+    """
+
+    def __init__(self, enabled=True, percentile=95, min_samples=20, min_delay=1, max_ratio=0.1, window=1000):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_ratio = max_ratio
+        self.samples = collections.deque(maxlen=window)
+        self.attempts = 0
+        self.hedges = 0
+        self._delay = None
+        self._stale = 0 # 上次计算分位数之后新增的样本数
+
+    def observe(self, elapsed):
+        if not self.enabled:
+            return
+        self.samples.append(elapsed)
+        self._stale += 1
+
+    def delay(self):
+        """返回这次请求的对冲延迟（秒），不对冲时返回 None，每次调用计为一次请求"""
+        if not self.enabled or len(self.samples) < self.min_samples:
+            return None
+        self.attempts += 1
+        # 每新增 50 个样本重新计算一次分位数
+        if self._delay is None or self._stale >= 50:
+            samples = sorted(self.samples)
+            index = min(len(samples) - 1, int(len(samples) * self.percentile / 100))
+            self._delay = max(self.min_delay, samples[index])
+            self._stale = 0
+        return self._delay
+
+    def allow(self):
+        """对冲请求数没有超过上限时计入一次对冲并返回 True"""
+        if self.hedges + 1 > self.attempts * self.max_ratio:
+            return False
+        self.hedges += 1
+        return True
@@ -72,11 +72,9 @@ Today Date: {date.today().strftime('%d %b %Y')}"""
     def get_tool_call(self, output):
         if "<|python_tag|>" in output:
             content, tool_calls = output.split("<|python_tag|>")
-            if "</think>" in self.tokenizer.get_vocab():
-                if "</think>" in content:
-                    think, content = content.split("</think>")
-            else:
-                think = ""
+            think = ""
+            if self.has_think_token() and "</think>" in content:
+                think, content = content.split("</think>")
             tool_calls = self.safe_parse_arguments(tool_calls, default_value=[])
             if not isinstance(tool_calls, list):
                 tool_calls = [tool_calls]
@@ -0,0 +1,177 @@
+import json
+import time
+import random
+import asyncio
+import email.utils
+
+import openai
+
+# 每个 tag 的请求计数，会出现在评测报告中，Deduplicated 为与其它请求相同而没有发送的请求数
+# PromptTokens 和 CompletionTokens 来自响应中的 usage，BudgetSkipped 为预算用完后没有发送的请求数
+# Hedges 为发出对冲请求的次数，HedgeWins 为其中对冲请求先返回的次数
+COUNTER_KEYS = [
+    "Requests", "Retries", "Timeouts", "Throttled", "GiveUps", "Deduplicated",
+    "PromptTokens", "CompletionTokens", "BudgetSkipped", "Hedges", "HedgeWins",
+]
+
+
+class TokenBucket:
+    """令牌桶，rate_per_min 为每分钟补充的令牌数，最多积累 10 秒的令牌"""
+
+    def __init__(self, rate_per_min):
+        self.rate = rate_per_min / 60
+        self.capacity = max(1.0, rate_per_min / 6)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self, amount=1):
+        # 单个请求超过桶容量时按容量计算，避免永远等待
+        amount = min(amount, self.capacity)
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return
+            await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class RateLimiter:
+    """按每分钟请求数和每分钟 token 数限速，被限流时所有请求一起暂停"""
+
+    def __init__(self, requests_per_min=None, tokens_per_min=None):
+        self.requests = TokenBucket(requests_per_min) if requests_per_min else None
+        self.tokens = TokenBucket(tokens_per_min) if tokens_per_min else None
+        self.pause_until = 0
+
+    def pause(self, seconds):
+        self.pause_until = max(self.pause_until, time.monotonic() + seconds)
+
+    async def wait_pause(self):
+        while True:
+            wait = self.pause_until - time.monotonic()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    async def acquire(self, tokens=1):
+        await self.wait_pause()
+        if self.requests:
+            await self.requests.acquire(1)
+        if self.tokens:
+            await self.tokens.acquire(tokens)
+        # 等待令牌期间可能有请求被限流，发送前再检查一次暂停
+        await self.wait_pause()
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD 方式调整的并发上限：被限流时减半，连续成功 limit 次后加一，最多恢复到初始的并发数
+    adaptive=False 时保持固定并发，与信号量相同
+    """
+
+    def __init__(self, limit, minimum=1, adaptive=True):
+        self.maximum = max(1, limit)
+        self.limit = self.maximum
+        self.minimum = min(minimum, self.maximum)
+        self.adaptive = adaptive
+        self.in_flight = 0
+        self.successes = 0
+        self.last_decrease = 0
+        self._cond = None
+
+    async def acquire(self):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def release(self):
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify(max(1, self.limit - self.in_flight))
+
+    def on_success(self):
+        if not self.adaptive or self.limit >= self.maximum:
+            return
+        self.successes += 1
+        if self.successes >= self.limit:
+            self.limit += 1
+            self.successes = 0
+
+    def on_throttle(self):
+        # 同一时刻的多个 429 只减一次
+        now = time.monotonic()
+        if not self.adaptive or now - self.last_decrease < 1:
+            return
+        self.last_decrease = now
+        self.successes = 0
+        new_limit = max(self.minimum, self.limit // 2)
+        if new_limit < self.limit:
+            self.limit = new_limit
+            print(f"请求被限流，并发数降为 {self.limit}", flush=True)
+
+
+def estimate_usage(completion_kwargs):
+    """粗略估计请求的 (输入 token 数, 输出 token 数)：输入按每 4 个字符一个 token，输出按 max_tokens"""
+    text = json.dumps(completion_kwargs.get("messages", []), ensure_ascii=False)
+    if completion_kwargs.get("tools"):
+        text += json.dumps(completion_kwargs["tools"], ensure_ascii=False)
+    return len(text) // 4, completion_kwargs.get("max_tokens", 0)
+
+
+def estimate_tokens(completion_kwargs):
+    """粗略估计请求消耗的 token 数"""
+    return sum(estimate_usage(completion_kwargs))
+
+
+def classify_error(error):
+    """
+    判断请求错误的类型
+
+    Returns:
+        str: throttled (429)、server (5xx)、timeout、connection、client（其它 4xx，不重试）或 other
+    """
+    if isinstance(error, (openai.APITimeoutError, asyncio.TimeoutError)):
+        return "timeout"
+    if isinstance(error, openai.APIStatusError):
+        if error.status_code == 429:
+            return "throttled"
+        if error.status_code >= 500 or error.status_code in (408, 409):
+            return "server"
+        return "client"
+    if isinstance(error, openai.APIConnectionError):
+        return "connection"
+    return "other"
+
+
+def get_retry_after(error):
+    """读取响应头中的 Retry-After（秒数或 HTTP 日期）与 retry-after-ms，没有时返回 None"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, base_delay=1, max_delay=60):
+    """带完全随机抖动的指数退避"""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
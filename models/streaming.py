@@ -0,0 +1,91 @@
+import time
+
+import numpy as np
+
+# 写入报告的延迟指标：首 token 时间（毫秒）、token 间平均间隔（毫秒）和每秒输出 token 数
+LATENCY_KEYS = ["TTFT", "ITL", "TokensPerSec"]
+PERCENTILES = [50, 95, 99]
+
+
+async def consume_stream(stream, start):
+    """
+    读取流式响应，把 content、reasoning_content 和 tool_calls 的增量拼接为完整的 ChatCompletion（json 格式）
+    同时记录首 token 时间、token 间隔和输出速度，start 为发出请求时的 time.monotonic()
+
+    Returns:
+        completion, timing: timing 中没有输出 token 时对应的值为 None
+    """
+    completion = {"id": "", "object": "chat.completion", "created": 0, "model": ""}
+    content, reasoning = [], []
+    tool_calls = {} # index -> 工具调用
+    finish_reason = None
+    usage = None
+    token_times = []
+    async for chunk in stream:
+        now = time.monotonic()
+        completion["id"] = chunk.id or completion["id"]
+        completion["created"] = chunk.created or completion["created"]
+        completion["model"] = chunk.model or completion["model"]
+        if chunk.usage is not None:
+            usage = chunk.usage.model_dump()
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        delta = choice.delta
+        has_token = False
+        if delta.content:
+            content.append(delta.content)
+            has_token = True
+        reasoning_content = getattr(delta, "reasoning_content", None)
+        if reasoning_content:
+            reasoning.append(reasoning_content)
+            has_token = True
+        for call in delta.tool_calls or []:
+            merged = tool_calls.setdefault(call.index, {"id": "", "type": "function", "function": {"name": "", "arguments": ""}})
+            if call.id:
+                merged["id"] = call.id
+            if call.type:
+                merged["type"] = call.type
+            if call.function is not None:
+                merged["function"]["name"] += call.function.name or ""
+                merged["function"]["arguments"] += call.function.arguments or ""
+            has_token = True
+        if has_token:
+            token_times.append(now)
+        if choice.finish_reason:
+            finish_reason = choice.finish_reason
+    end = time.monotonic()
+
+    message = {
+        "role": "assistant",
+        "content": "".join(content) if content or not tool_calls else None,
+        "tool_calls": [tool_calls[i] for i in sorted(tool_calls)] or None,
+    }
+    if reasoning:
+        message["reasoning_content"] = "".join(reasoning)
+    completion["choices"] = [{"index": 0, "finish_reason": finish_reason or "stop", "message": message}]
+    if usage is not None:
+        completion["usage"] = usage
+
+    # 没有 usage 时按输出的分块数估计 token 数
+    output_tokens = usage["completion_tokens"] if usage else len(token_times)
+    timing = dict.fromkeys(LATENCY_KEYS)
+    if token_times:
+        timing["TTFT"] = (token_times[0] - start) * 1000
+        if len(token_times) > 1:
+            timing["ITL"] = (token_times[-1] - token_times[0]) * 1000 / (len(token_times) - 1)
+        if end > token_times[0] and output_tokens > 1:
+            timing["TokensPerSec"] = (output_tokens - 1) / (end - token_times[0])
+    return completion, timing
+
+
+def summarize_latency(timings):
+    """把多个请求的 timing 汇总为 TTFT_p50、ITL_p95、TokensPerSec_p99 等指标"""
+    result = {}
+    for key in LATENCY_KEYS:
+        values = [timing[key] for timing in timings if timing[key] is not None]
+        if not values:
+            continue
+        for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+            result[f"{key}_p{p}"] = float(value)
+    return result
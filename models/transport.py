@@ -0,0 +1,57 @@
+import os
+
+import httpx
+
+# HTTP 连接池的默认配置，可以通过模型配置中的 http 修改
+HTTP_DEFAULTS = {
+    "http2": False,
+    "max_connections": 100,
+    "max_keepalive_connections": 100,
+    "keepalive_expiry": 60,
+}
+
+# (进程号, 配置) -> 同步的 httpx.Client，fork 出的子进程会按自己的进程号重新创建
+_sync_clients = {}
+
+
+def get_http_options(http=None, max_connections=None):
+    """合并默认配置，max_connections 不为空时作为连接数的默认值（如 API_Requester 的并发数）"""
+    options = dict(HTTP_DEFAULTS)
+    if max_connections:
+        options["max_connections"] = options["max_keepalive_connections"] = max_connections
+    options.update(http or {})
+    if options["http2"]:
+        try:
+            import h2 # noqa: F401
+        except ImportError:
+            print("没有安装 h2，使用 HTTP/1.1。需要 HTTP/2 时请安装 httpx[http2]", flush=True)
+            options["http2"] = False
+    return options
+
+
+def _client_kwargs(options):
+    return {
+        "http2": options["http2"],
+        "limits": httpx.Limits(
+            max_connections=options["max_connections"],
+            max_keepalive_connections=options["max_keepalive_connections"],
+            keepalive_expiry=options["keepalive_expiry"],
+        ),
+    }
+
+
+def build_async_http_client(http=None, max_connections=None):
+    """创建 AsyncOpenAI 使用的 httpx.AsyncClient，同一个 API_Requester 的所有端点共用一个连接池"""
+    return httpx.AsyncClient(**_client_kwargs(get_http_options(http, max_connections)))
+
+
+def get_http_client(http=None, max_connections=None):
+    """
+    返回当前进程共享的 httpx.Client，相同配置只创建一次，连接在多次请求之间保持
+    不能在 fork 前创建后给子进程使用（连接会被多个进程共用），因此按进程号区分
+    """
+    options = get_http_options(http, max_connections)
+    key = (os.getpid(), tuple(sorted(options.items())))
+    if key not in _sync_clients:
+        _sync_clients[key] = httpx.Client(**_client_kwargs(options))
+    return _sync_clients[key]
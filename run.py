@@ -4,8 +4,12 @@ import datetime
 import os
 import json
 
+import numpy as np
+
 import models
-from evaluate import evaluate_model_for_single_round_tool_call, evaluate_model_for_multiple_round_tool_call
+from evaluate import evaluate_model_for_single_round_tool_call, evaluate_model_for_multiple_round_tool_call, rescore_results, release_engines
+from evaluate.scores import concat_tables, group_results
+from evaluate.statistics import score_statistics, load_saved_scores
 from train import prepare_datasets_for_transformers_trainer
 from tag import stat_tagger, normal_tagger
 
@@ -22,7 +26,13 @@ def setup_parser():
 
     # Test 子命令
     test_parser = subparsers.add_parser('evaluate', help='Evaluate the model')
-    test_parser.add_argument('config', type=str, help='Config path')
+    test_parser.add_argument('config', type=str, nargs='+', help='Config path(s), models are reused across configs')
+
+    # Rescore 子命令
+    rescore_parser = subparsers.add_parser('rescore', help='Recompute metrics from saved results')
+    rescore_parser.add_argument('results', type=str, help='Result file or directory')
+    rescore_parser.add_argument('--config', type=str, default=None, help='Config path (is_strict, test_metrics, report_strategy)')
+    rescore_parser.add_argument('--workers', type=int, default=None, help='Number of scoring processes')
 
     # Tag 子命令
     tag_parser = subparsers.add_parser('tag', help='Tag new data')    
@@ -31,42 +41,57 @@ def setup_parser():
     
     return parser
 
-def get_tag_filter(test_datasets, test_tags):
-    if test_tags is None:
-        return lambda x:True
-    else:
-        tag_map_list = []
-        mode = test_tags.get("mode", "and")
-        schemes = test_tags.get("schemes", [])
-        for scheme in schemes:
-            if '*' in scheme["path"] and scheme["path"].endswith(".*.json"):
-                union_map = {}
-                dir_path = os.path.dirname(scheme["path"])
-                for filename in os.listdir(dir_path):
-                    if filename.endswith(".json") and filename.startswith(os.path.basename(scheme["path"])[:-len(".*.json")]):
-                        with open(os.path.join(dir_path, filename), "r", encoding="utf-8") as f:
-                            tag_map = json.load(f).get("tagged_result", {})
-                            for key, value in tag_map.items():
-                                if key not in union_map:
-                                    union_map[key] = value
-                                else:
-                                    union_map[key].extend(value)
+def load_tag_maps(test_tags):
+    """读取标签配置中的所有标签体系，返回 [{"map": data_id -> 标签列表, "tags": ..., "mode": ...}]"""
+    tag_map_list = []
+    for scheme in (test_tags or {}).get("schemes", []):
+        if '*' in scheme["path"] and scheme["path"].endswith(".*.json"):
+            union_map = {}
+            dir_path = os.path.dirname(scheme["path"])
+            for filename in os.listdir(dir_path):
+                if filename.endswith(".json") and filename.startswith(os.path.basename(scheme["path"])[:-len(".*.json")]):
+                    with open(os.path.join(dir_path, filename), "r", encoding="utf-8") as f:
+                        tag_map = json.load(f).get("tagged_result", {})
+                        for key, value in tag_map.items():
+                            if key not in union_map:
+                                union_map[key] = value
+                            else:
+                                union_map[key].extend(value)
+            tag_map_list.append(
+                {
+                    "path": scheme["path"],
+                    "map": union_map,
+                    "tags": scheme.get("tags", {}),
+                    "mode": scheme.get("mode", "and"),
+                }
+            )
+        else:
+            with open(scheme["path"], "r", encoding="utf-8") as f:
                 tag_map_list.append(
                     {
-                        "map": union_map,
+                        "path": scheme["path"],
+                        "map": json.load(f).get("tagged_result", {}),
                         "tags": scheme.get("tags", {}),
                         "mode": scheme.get("mode", "and"),
                     }
                 )
-            else:
-                with open(scheme["path"], "r", encoding="utf-8") as f:
-                    tag_map_list.append(
-                        {
-                            "map": json.load(f).get("tagged_result", {}),
-                            "tags": scheme.get("tags", {}),
-                            "mode": scheme.get("mode", "and"),
-                        }
-                    )
+    return tag_map_list
+
+def get_tag_map(test_tags):
+    """合并所有标签体系，返回 data_id -> 标签列表，用于按标签分组统计"""
+    merged = {}
+    for tag_map in load_tag_maps(test_tags):
+        for data_id, tags in tag_map["map"].items():
+            known = merged.setdefault(data_id, [])
+            known.extend(tag for tag in tags if tag not in known)
+    return merged
+
+def get_tag_filter(test_datasets, test_tags):
+    if test_tags is None:
+        return lambda x:True
+    else:
+        mode = test_tags.get("mode", "and")
+        tag_map_list = load_tag_maps(test_tags)
         def check(data):
             if data[0]["role"] != "id":
                 return False
@@ -101,7 +126,7 @@ def get_tag_filter(test_datasets, test_tags):
                             data_flag = True
                             break
                     else:
-                        print(f"标签体系{scheme['path']}的模式{tag_map['mode']}不支持，已忽略")
+                        print(f"标签体系{tag_map['path']}的模式{tag_map['mode']}不支持，已忽略")
             elif mode == "and":
                 data_flag = True
                 for tag_map in tag_map_list:
@@ -132,7 +157,7 @@ def get_tag_filter(test_datasets, test_tags):
                             data_flag = False
                             break
                     else:
-                        print(f"标签体系{scheme['path']}的模式{tag_map['mode']}不支持，已忽略")
+                        print(f"标签体系{tag_map['path']}的模式{tag_map['mode']}不支持，已忽略")
             else:
                 print(f"标签的模式{mode}不支持，已忽略")
                 return True
@@ -251,26 +276,75 @@ def prepare_datasets(test_datasets, mode, tag_filter, doc_type=None):
 
     return cut_dataset
 
-def get_average_result(all_result, report=None):
-    average_result = {}
-    all_metrics = set()
-    all_names = set()
-    total_samples = 0
-    for name, dataset_result in all_result.items():
-        total_samples += dataset_result["Size"]
-        all_names.add(name.split("_")[0])
-        all_metrics.update(dataset_result.keys())
-    for metric in all_metrics:
-        if metric != "Size":
-            average_result[metric] = sum([
-                all_result[dataset_name]["Size"] * dataset_result[metric]
-                for dataset_name, dataset_result in all_result.items()
-            ]) / total_samples
-    average_result["Size"] = total_samples
-    dataset_name = "Avg-[{}]".format(",".join(list(all_names)))
-    all_result[dataset_name] = average_result
-    if report:
-        report(dataset_name, average_result)
+def get_statistics(tables, metrics, report_statistics, baseline=None):
+    """一个或多个数据集合并后各指标的置信区间，有基线时与基线按 (数据集, data_id) 配对比较"""
+    tables = list(tables)
+    if not report_statistics or not tables:
+        return {}
+    options = {k: v for k, v in report_statistics.items() if k != "baseline"}
+    return score_statistics(concat_tables(tables), metrics, baseline, **options)
+
+def get_average_result(all_result, report=None, score_tables=None, breakdown=None, metrics=None, tag_map=None, statistics=None):
+    """
+    计算多个数据集按样本数加权的平均结果
+
+    传入 score_tables（数据集名称 -> ScoreTable）和 breakdown 时，还从拼接后的每样本得分中分组统计，不需要重新计算指标：
+    "benchmark" 按评测集（数据集名称的第一段）分组，"tag" 按 tag_map（data_id -> 标签列表）中的标签分组，一个样本可以属于多个标签。
+    分组结果的正确率按样本平均，长度按调用轮次平均。
+    statistics(tables) 不为空时，平均结果和评测集分组的报告中附带这些数据集合并后的置信区间和显著性检验
+    """
+    if len(all_result) > 1:
+        names = list(all_result)
+        all_names = dict.fromkeys(name.split("_")[0] for name in names)
+        all_metrics = [metric for metric in dict.fromkeys(k for result in all_result.values() for k in result) if metric not in ("Size", "Scored")]
+        # 有样本因预算用完被跳过时，数据集的指标只在 Scored 条样本上平均，按 Scored 加权
+        sizes = np.array([all_result[name].get("Scored", all_result[name]["Size"]) for name in names], dtype=np.float64)
+        values = np.array([[all_result[name].get(metric, 0) for metric in all_metrics] for name in names], dtype=np.float64)
+        average_result = dict(zip(all_metrics, (sizes @ values / max(sizes.sum(), 1)).tolist()))
+        average_result["Size"] = sum(all_result[name]["Size"] for name in names)
+        if any("Scored" in all_result[name] for name in names):
+            average_result["Scored"] = int(sizes.sum())
+        dataset_name = "Avg-[{}]".format(",".join(all_names))
+        all_result[dataset_name] = average_result
+        if report:
+            extra = statistics(score_tables.values()) if statistics and score_tables else {}
+            report(dataset_name, {**average_result, **extra})
+
+    if not score_tables or not breakdown:
+        return
+    columns = concat_tables(score_tables.values())
+    group_result = {}
+    group_tables = {}
+    if "benchmark" in breakdown:
+        benchmarks = [name.split("_")[0] for name in columns["dataset"]]
+        for name, result in group_results(columns, benchmarks, metrics).items():
+            group_result[f"Benchmark-{name}"] = result
+            group_tables[f"Benchmark-{name}"] = [table for key, table in score_tables.items() if key.split("_")[0] == name]
+    if "tag" in breakdown:
+        tags = [(tag_map or {}).get(data_id, []) for data_id in columns["data_id"]]
+        for name, result in group_results(columns, tags, metrics).items():
+            group_result[f"Tag-{name}"] = result
+    for dataset_name, result in group_result.items():
+        all_result[dataset_name] = result
+        if report:
+            extra = statistics(group_tables[dataset_name]) if statistics and dataset_name in group_tables else {}
+            report(dataset_name, {**result, **extra})
+
+def send_report(to_send, report_strategy, json_config, lark_reporter, model_name, datetime_str):
+    if 'lark' in report_strategy:
+        try:
+            lark_reporter.send(to_send)
+        except:
+            pass
+    if 'json' in report_strategy:
+        path = os.path.join(
+            json_config.get("path", "./results"), 
+            f"report_{model_name}_{datetime_str}.json"
+        )
+        history = json.load(open(path, "r", encoding="utf-8")) if os.path.exists(path) else []
+        with open(path, "w", encoding="utf-8") as fout:
+            json.dump(history + [to_send], fout, indent=4, ensure_ascii=False)
+            print(f"报告已保存至: {fout.name}")
 
 def evaluate_with_config(config_path, debug=False):
     datetime_str = str(datetime.datetime.now().strftime("%y%m%d_%H%M"))
@@ -303,12 +377,24 @@ def evaluate_with_config(config_path, debug=False):
     report_strategy = getattr(config_module, 'report_strategy', ["json"])
     json_config = getattr(config_module, 'json_config', {"path": "./results"})
     lark_config = getattr(config_module, 'lark_config', {})
+    checkpoint_strategy = getattr(config_module, 'checkpoint_strategy', None)
+    cache_strategy = getattr(config_module, 'cache_strategy', None)
+    generate_strategy = getattr(config_module, 'generate_strategy', None)
+    report_breakdown = getattr(config_module, 'report_breakdown', [])
+    report_statistics = getattr(config_module, 'report_statistics', None)
 
     tag_filter = get_tag_filter(test_datasets, test_tags)
-    datasets = prepare_datasets(test_datasets, test_mode, tag_filter, doc_type=doc_type)
-
-    if len(datasets) == 0:
-        raise ValueError("没有数据集被选中")
+    tag_map = get_tag_map(test_tags) if "tag" in report_breakdown else None
+    baseline = load_saved_scores(report_statistics["baseline"]) if report_statistics and report_statistics.get("baseline") else None
+    # test_mode 可以是列表，同一个模型的引擎会在不同模式之间复用
+    test_modes = test_mode if isinstance(test_mode, list) else [test_mode]
+    datasets_by_mode = {}
+    for test_mode in test_modes:
+        datasets = prepare_datasets(test_datasets, test_mode, tag_filter, doc_type=doc_type)
+
+        if len(datasets) == 0:
+            raise ValueError("没有数据集被选中")
+        datasets_by_mode[test_mode] = datasets
 
     if save_strategy.get("save_output") or save_strategy.get("save_result"):
         save_path = save_strategy["save_path"]
@@ -321,6 +407,7 @@ def evaluate_with_config(config_path, debug=False):
             save_strategy["save_path"] = save_path
         os.makedirs(save_path, exist_ok=True)
 
+    lark_reporter = None
     if 'lark' in report_strategy:
         from lark_report import LarkReport
         lark_reporter = LarkReport(**lark_config)
@@ -351,39 +438,91 @@ def evaluate_with_config(config_path, debug=False):
             print("模型类型不支持")
             continue
     
-        def final_report(dataset_name, result):
-            to_send = {
-                "Note": model_config["note"] if "note" in model_config else model_config["path"].strip("/").split("/")[-1],
-                "Model": model_config["path"],
-                "Dataset": dataset_name,
-                "test_mode": test_mode,
-                **result
-            }
-            if not debug:
-                if 'lark' in report_strategy:
-                    try:
-                        lark_reporter.send(to_send)
-                    except:
-                        pass
-                if 'json' in report_strategy:
-                    path = os.path.join(
-                        json_config.get("path", "./results"), 
-                        f"report_{model_config['path'].strip('/').split('/')[-1]}_{datetime_str}.json"
-                    )
-                    history = json.load(open(path, "r", encoding="utf-8")) if os.path.exists(path) else []
-                    with open(path, "w", encoding="utf-8") as fout:
-                        json.dump(history + [to_send], fout, indent=4, ensure_ascii=False)
-                        print(f"报告已保存至: {fout.name}")
-
-        if test_mode.startswith("single"):
-            all_result = evaluate_model_for_single_round_tool_call(model_config, datasets, test_metrics, save_strategy, debug=debug, is_strict=is_strict, report=final_report)
-        elif test_mode.startswith("multiple"):
-            all_result = evaluate_model_for_multiple_round_tool_call(model_config, datasets, test_metrics, save_strategy, evaluate_mode=test_mode.split("_")[1], debug=debug, is_strict=is_strict, report=final_report)
-        if len(all_result) > 1:
-            get_average_result(all_result, final_report)
-
-        
+        for test_mode, datasets in datasets_by_mode.items():
+            score_tables = {}
+            def statistics(tables):
+                return get_statistics(tables, test_metrics, report_statistics, baseline)
+
+            def final_report(dataset_name, result):
+                # 数据集的得分在报告前已经写入 score_tables
+                extra = statistics([score_tables[dataset_name]]) if dataset_name in score_tables else {}
+                to_send = {
+                    "Note": model_config["note"] if "note" in model_config else model_config["path"].strip("/").split("/")[-1],
+                    "Model": model_config["path"],
+                    "Dataset": dataset_name,
+                    "test_mode": test_mode,
+                    **result,
+                    **extra,
+                }
+                if not debug:
+                    send_report(to_send, report_strategy, json_config, lark_reporter, model_config['path'].strip('/').split('/')[-1], datetime_str)
+
+            if test_mode.startswith("single"):
+                all_result = evaluate_model_for_single_round_tool_call(model_config, datasets, test_metrics, save_strategy, debug=debug, is_strict=is_strict, report=final_report, checkpoint_strategy=checkpoint_strategy, cache_strategy=cache_strategy, generate_strategy=generate_strategy, score_tables=score_tables, test_mode=test_mode)
+            elif test_mode.startswith("multiple"):
+                all_result = evaluate_model_for_multiple_round_tool_call(model_config, datasets, test_metrics, save_strategy, evaluate_mode=test_mode.split("_")[1], debug=debug, is_strict=is_strict, report=final_report, checkpoint_strategy=checkpoint_strategy, cache_strategy=cache_strategy, generate_strategy=generate_strategy, score_tables=score_tables, test_mode=test_mode)
+            get_average_result(all_result, final_report, score_tables=score_tables, breakdown=report_breakdown, metrics=test_metrics, tag_map=tag_map, statistics=statistics)
+
+
+def rescore_with_config(results_path, config_path=None, workers=None):
+    datetime_str = str(datetime.datetime.now().strftime("%y%m%d_%H%M"))
+
+    config_module = None
+    if config_path:
+        if not os.path.exists(config_path):
+            raise FileNotFoundError(f"配置文件不存在: {config_path}")
+
+        spec = importlib.util.spec_from_file_location("config", config_path)
+        if spec is None or spec.loader is None:
+            raise ImportError(f"无法加载配置文件: {config_path}")
+
+        config_module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(config_module)
+
+    is_strict = getattr(config_module, 'is_strict', True)
+    test_mode = getattr(config_module, 'test_mode', "single_last")
+    test_metrics = getattr(config_module, 'test_metrics', ["ExactMatch", "ToolAccuracy", "ParameterAccuracy"])
+    report_strategy = getattr(config_module, 'report_strategy', ["json"])
+    json_config = getattr(config_module, 'json_config', {"path": results_path if os.path.isdir(results_path) else "./results"})
+    lark_config = getattr(config_module, 'lark_config', {})
+    report_breakdown = getattr(config_module, 'report_breakdown', [])
+    tag_map = get_tag_map(getattr(config_module, 'test_tags', None)) if "tag" in report_breakdown else None
+    report_statistics = getattr(config_module, 'report_statistics', None)
+    baseline = load_saved_scores(report_statistics["baseline"]) if report_statistics and report_statistics.get("baseline") else None
 
+    if not os.path.exists(results_path):
+        raise FileNotFoundError(f"结果路径不存在: {results_path}")
+
+    lark_reporter = None
+    if 'lark' in report_strategy:
+        from lark_report import LarkReport
+        lark_reporter = LarkReport(**lark_config)
+
+    score_tables = {}
+    def statistics(tables):
+        return get_statistics(tables, test_metrics, report_statistics, baseline)
+
+    def rescore_report(model_name, dataset_name, result):
+        model_tables = score_tables.get(model_name, {})
+        extra = statistics([model_tables[dataset_name]]) if dataset_name in model_tables else {}
+        to_send = {
+            "Note": f"{model_name} (rescore)",
+            "Model": model_name,
+            "Dataset": dataset_name,
+            "test_mode": test_mode,
+            "is_strict": is_strict,
+            **result,
+            **extra,
+        }
+        send_report(to_send, report_strategy, json_config, lark_reporter, f"rescore_{model_name}", datetime_str)
+
+    all_model_result = rescore_results(results_path, test_metrics, is_strict=is_strict, workers=workers, report=rescore_report, score_tables=score_tables)
+    for model_name, all_result in all_model_result.items():
+        get_average_result(
+            all_result, lambda dataset_name, result: rescore_report(model_name, dataset_name, result),
+            score_tables=score_tables.get(model_name), breakdown=report_breakdown, metrics=test_metrics, tag_map=tag_map,
+            statistics=statistics,
+        )
 
 def tag_with_config(config_path):
     if not os.path.exists(config_path):
@@ -468,7 +607,11 @@ def main():
     if args.command == 'train':
         train_with_config(args.config)
     elif args.command == 'evaluate':
-        evaluate_with_config(args.config)
+        for config_path in args.config:
+            evaluate_with_config(config_path)
+        release_engines()
+    elif args.command == 'rescore':
+        rescore_with_config(args.results, args.config, args.workers)
     elif args.command == 'tag':
         tag_with_config(args.config)
     else:
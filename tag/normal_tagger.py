@@ -10,6 +10,7 @@ from multiprocessing import Pool, cpu_count
 import requests
 from openai import OpenAI
 
+from models.transport import get_http_client
 from .dataset_analyzer import find_json_files, get_tag_statistics, load_file
 
 VLLM_LLM_OPTS = [
@@ -21,13 +22,30 @@ VLLM_LLM_OPTS = [
 ]
 
 class Requester:
-    def __init__(self, base_url, api_key="EMPTY"):
-        self.client = OpenAI(
-            api_key=api_key,
-            base_url=base_url,
-        )
+    """
+    OpenAI 接口的请求器，客户端在每个进程中第一次使用时创建，使用进程内共享、保持连接的连接池
+    父进程中的客户端不会被 fork 出的子进程继续使用
+    """
+
+    def __init__(self, base_url, api_key="EMPTY", http=None):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.http = http
+        self._client = None
+        self._pid = None
         self.model = self.client.models.list().data[0].id
 
+    @property
+    def client(self):
+        if self._pid != os.getpid():
+            self._client = OpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                http_client=get_http_client(self.http),
+            )
+            self._pid = os.getpid()
+        return self._client
+
     def chat(self, messages: list, **kwargs):
         params = {
             "model": self.model,
@@ -114,30 +132,34 @@ def online_tagger(requester_list, sampling_params, data_list, preprocess_func, p
                 "time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             })))
     
-    for i in range(from_idx, to_idx, save_step):
-        j = min(i+save_step, to_idx)
-        print(f"\n\nTagging Dataset-[{i},{j}) 使用在线API")
-        
-        batch_data = data_list[i:j]
-        
-        params = [
-            (idx%T, data, preprocess_func(data)) 
-            for idx, data in enumerate(batch_data)
-        ]
-        
-        with Pool(processes=min(processes_num, len(batch_data))) as pool:
+    # 进程池在各批之间复用，子进程中建立的连接可以保持到标注结束
+    # 某一批出错时 with 退出会终止子进程，不会遗留进程和连接
+    with Pool(processes=max(1, min(processes_num, to_idx - from_idx))) as pool:
+        for i in range(from_idx, to_idx, save_step):
+            j = min(i+save_step, to_idx)
+            print(f"\n\nTagging Dataset-[{i},{j}) 使用在线API")
+
+            batch_data = data_list[i:j]
+
+            params = [
+                (idx%T, data, preprocess_func(data)) 
+                for idx, data in enumerate(batch_data)
+            ]
+
             results = pool.starmap(online_request, params)
-        
-        processed_results = []
-        for data, result_text in zip(batch_data, results):
-            processed_result = postprocess_func(data, result_text)
-            processed_results.append(processed_result)
-        
-        if save_step != to_idx - from_idx and tmp_save_file:
-            with open(tmp_save_file, "a") as fout:
-                fout.write("\n".join([json.dumps(r) for r in processed_results])+"\n")
-        
-        all_result.extend(processed_results)
+
+            processed_results = []
+            for data, result_text in zip(batch_data, results):
+                processed_result = postprocess_func(data, result_text)
+                processed_results.append(processed_result)
+
+            if save_step != to_idx - from_idx and tmp_save_file:
+                with open(tmp_save_file, "a") as fout:
+                    fout.write("\n".join([json.dumps(r) for r in processed_results])+"\n")
+
+            all_result.extend(processed_results)
+        pool.close()
+        pool.join()
     
     return all_result
 
@@ -184,7 +206,7 @@ def normal_tagger(input_path: str | list[str], output_file, model_config, prepro
             model_config["base_url"] = [model_config["base_url"]]
         # 使用 API 进行标记
         requester_list = [
-            Requester(base_url=base_url, api_key=model_config["api_key"]) for base_url in model_config["base_url"]
+            Requester(base_url=base_url, api_key=model_config["api_key"], http=model_config.get("http")) for base_url in model_config["base_url"]
         ]
         sampling_params = model_config.get("sampling_params", {})
         res_list = online_tagger(
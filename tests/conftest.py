@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from evaluate import session as session_module
+from benchmarks.bench import MODEL_CONFIG, install_mock_engine
+from benchmarks.mock import write_synthetic_dataset
+
+
+@pytest.fixture
+def release_engines():
+    """测试结束后释放引擎注册表中的所有引擎，下一个测试不会复用"""
+    yield
+    session_module.release_engines()
+
+
+@pytest.fixture
+def mock_engine(release_engines):
+    """在注册表中安装 MODEL_CONFIG 对应的 MockEngine（不模拟延迟）"""
+    return install_mock_engine(dict(MODEL_CONFIG))
+
+
+@pytest.fixture
+def synthetic_dataset(tmp_path):
+    """返回 write(name, size)：在临时目录中写入名为 name 的合成数据集，返回文件路径"""
+    def write(name, size):
+        path = os.path.join(tmp_path, f"{name}.jsonl")
+        write_synthetic_dataset(path, size, dataset_name=name)
+        return path
+    return write
@@ -0,0 +1,186 @@
+import os
+import json
+import types
+import asyncio
+
+from models.batch import OpenAIBatchRunner, batch_file_name, custom_id, read_batch_output, write_batch_file
+from benchmarks.mock import MockEngine
+
+SAMPLING_PARAMS = {"temperature": 0, "max_tokens": 16}
+
+
+class InFlightEngine(MockEngine):
+    """记录发送的请求数和同时进行的请求数的最大值"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.sent = 0
+
+    async def send(self, completion_kwargs, tag=None, exclude=None, sent=None):
+        self.sent += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return await super().send(completion_kwargs, tag, exclude, sent)
+        finally:
+            self.in_flight -= 1
+
+
+def make_prompt(i):
+    return {"new_messages": [{"role": "user", "content": f"Please call tool_{i} for C{i} over the next {i % 7 + 1} days."}]}
+
+
+def called_tool(output):
+    return output.outputs[0].text.message.tool_calls[0].function.name
+
+
+def test_generate_keeps_order_and_bounds_concurrency():
+    engine = InFlightEngine(latency=0.002, concurrency=4)
+    try:
+        # 约 5% 的请求延迟为 10 倍，完成顺序与提交顺序不同
+        outputs = engine.generate([make_prompt(i) for i in range(60)], SAMPLING_PARAMS, tags=["Bench"] * 60)
+        assert [called_tool(output) for output in outputs] == [f"tool_{i}" for i in range(60)]
+        assert 1 < engine.max_in_flight <= 4
+        assert engine.stats("Bench")["Requests"] == 60
+    finally:
+        engine.close()
+
+
+def test_generate_inside_running_event_loop():
+    engine = MockEngine(latency=0.001, concurrency=2)
+
+    async def run():
+        # 请求在后台事件循环中执行，调用方已经处于事件循环中时也可以同步调用
+        return engine.generate([make_prompt(i) for i in range(5)], SAMPLING_PARAMS)
+
+    try:
+        outputs = asyncio.run(run())
+        assert [called_tool(output) for output in outputs] == [f"tool_{i}" for i in range(5)]
+    finally:
+        engine.close()
+
+
+def test_local_batch_matches_direct_requests(tmp_path):
+    prompts = [make_prompt(i) for i in range(20)]
+    direct = MockEngine(latency=0.001, concurrency=4)
+    engine = InFlightEngine(latency=0.001, concurrency=4)
+    engine.batch = {"backend": "local", "work_dir": str(tmp_path), "max_requests_per_file": 8}
+    try:
+        expected = [called_tool(output) for output in direct.generate(prompts, SAMPLING_PARAMS)]
+        outputs = engine.generate(prompts, SAMPLING_PARAMS)
+        assert [called_tool(output) for output in outputs] == expected
+        assert engine.sent == 20
+        # 每 8 条一个输入文件，每个输入文件有对应的输出文件
+        assert len([name for name in os.listdir(tmp_path) if name.endswith(".output.jsonl")]) == 3
+        # 同样的请求再次执行时直接读取已有的输出文件
+        assert [called_tool(output) for output in engine.generate(prompts, SAMPLING_PARAMS)] == expected
+        assert engine.sent == 20
+    finally:
+        direct.close()
+        engine.close()
+
+
+def test_batch_file_name_and_output_parsing(tmp_path):
+    assert batch_file_name([{"a": 1, "b": 2}]) == batch_file_name([{"b": 2, "a": 1}])
+    assert batch_file_name([{"a": 1}]) != batch_file_name([{"a": 2}])
+    lines = [
+        json.dumps({"custom_id": custom_id(0), "response": {"status_code": 200, "body": {"id": "ok"}}, "error": None}),
+        json.dumps({"custom_id": custom_id(1), "response": {"status_code": 500, "body": {}}, "error": None}),
+        json.dumps({"custom_id": custom_id(2), "response": None, "error": {"message": "expired"}}),
+        "",
+    ]
+    assert read_batch_output(lines) == {custom_id(0): {"id": "ok"}, custom_id(1): None, custom_id(2): None}
+
+
+class FakeBatchClient:
+    """Batch API 的替代：创建的任务第一次查询时仍在执行，第二次查询时完成"""
+
+    def __init__(self):
+        self.created = 0
+        self.retrieved = 0
+        self.inputs = {}
+        self.files = types.SimpleNamespace(create=self.create_file, content=self.file_content)
+        self.batches = types.SimpleNamespace(create=self.create_batch, retrieve=self.retrieve_batch)
+
+    async def create_file(self, file, purpose):
+        self.inputs["file-1"] = file.read().decode("utf-8")
+        return types.SimpleNamespace(id="file-1")
+
+    async def file_content(self, file_id):
+        lines = []
+        for line in self.inputs["file-1"].splitlines():
+            item = json.loads(line)
+            lines.append(json.dumps({"custom_id": item["custom_id"], "response": {"status_code": 200, "body": item["body"]}}))
+        return types.SimpleNamespace(text="\n".join(lines))
+
+    async def create_batch(self, input_file_id, endpoint, completion_window):
+        self.created += 1
+        return self.batch("in_progress")
+
+    async def retrieve_batch(self, batch_id):
+        self.retrieved += 1
+        return self.batch("completed" if self.retrieved > 1 else "in_progress")
+
+    def batch(self, status):
+        return types.SimpleNamespace(
+            id="batch-1", status=status, errors=None, output_file_id="output-1", error_file_id=None,
+            request_counts=types.SimpleNamespace(completed=0, total=2, failed=0),
+        )
+
+
+def test_openai_batch_runner_resumes_submitted_batch(tmp_path):
+    input_path = os.path.join(tmp_path, "batch.jsonl")
+    output_path = os.path.join(tmp_path, "batch.output.jsonl")
+    write_batch_file(input_path, [{"messages": [{"role": "user", "content": str(i)}]} for i in range(2)])
+    client = FakeBatchClient()
+    runner = OpenAIBatchRunner(client, poll_interval=0)
+    with open(input_path, encoding="utf-8") as fin:
+        client.inputs["file-1"] = fin.read()
+    # 已经保存了任务 id 时继续等待同一个任务，不重新提交
+    with open(input_path + ".batch_id", "w") as fout:
+        fout.write("batch-1")
+    asyncio.run(runner.run(input_path, output_path))
+    assert client.created == 0
+    with open(output_path, encoding="utf-8") as fin:
+        results = read_batch_output(fin)
+    assert sorted(results) == [custom_id(0), custom_id(1)]
+
+    os.remove(input_path + ".batch_id")
+    client.retrieved = 0
+    asyncio.run(runner.run(input_path, output_path))
+    assert client.created == 1
+    with open(input_path + ".batch_id") as fin:
+        assert fin.read() == "batch-1"
+
+
+def test_identical_requests_are_sent_once():
+    engine = InFlightEngine(latency=0.001, concurrency=4)
+    prompts = [make_prompt(i % 5) for i in range(20)]
+    try:
+        outputs = engine.generate(prompts, SAMPLING_PARAMS, tags=["Bench"] * 20)
+        assert [called_tool(output) for output in outputs] == [f"tool_{i % 5}" for i in range(20)]
+        assert engine.sent == 5
+        stats = engine.stats("Bench")
+        assert stats["Requests"] == 5 and stats["Deduplicated"] == 15
+        assert stats["DedupRatio"] == 75
+
+        # temperature 不为 0 时相同的请求是独立的采样，默认不合并
+        engine.generate(prompts, {**SAMPLING_PARAMS, "temperature": 1.0})
+        assert engine.sent == 25
+        engine.dedup = False
+        engine.generate(prompts, SAMPLING_PARAMS)
+        assert engine.sent == 45
+    finally:
+        engine.close()
+
+
+def test_dedup_keeps_tool_name_maps_apart():
+    engine = MockEngine()
+    prompt = make_prompt(1)
+    prompts = [prompt, {**prompt, "tool_name_map": {"tool_1": "tool.1"}}, dict(prompt)]
+    unique_index, index_of = engine.dedup_prompts(prompts, SAMPLING_PARAMS)
+    # 请求参数相同但工具名的还原方式不同时不能合并
+    assert unique_index == [0, 1]
+    assert index_of == [0, 1, 0]
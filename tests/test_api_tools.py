@@ -0,0 +1,30 @@
+import copy
+
+from models.api_requester import API_Requester
+
+
+def test_convert_tools_does_not_modify_dataset():
+    tools = [{
+        "name": "weather.get",
+        "description": "Get the weather.",
+        "parameters": {
+            "type": "dict",
+            "properties": {
+                "cities": {"type": "list", "items": {"type": "str"}, "description": "Cities."},
+                "options": {
+                    "type": "dict",
+                    "properties": {"days": {"type": "array", "items": {"type": "int"}}},
+                },
+            },
+            "required": ["cities"],
+        },
+    }]
+    original = copy.deepcopy(tools)
+    requester = API_Requester(api_key="mock", base_url="http://localhost")
+    name_map = {}
+    converted = requester.convert_to_openai_tools(tools, name_map)
+    assert tools == original
+    assert name_map == {"weather_get": "weather.get"}
+    properties = converted[0]["function"]["parameters"]["properties"]
+    assert properties["cities"]["items"] == {"type": "string"}
+    assert properties["options"]["properties"]["days"]["items"] == {"type": "integer"}
@@ -0,0 +1,123 @@
+import httpx
+import openai
+
+from run import prepare_datasets, get_average_result
+from evaluate import session as session_module
+from evaluate import evaluate_model_for_single_round_tool_call
+from evaluate.scores import ScoreTable
+from models.budget import Budget
+from benchmarks.bench import MODEL_CONFIG, METRICS
+from benchmarks.mock import MockEngine
+
+
+class ExpensiveMockEngine(MockEngine):
+    """每个请求按 2000 个输入 token 结算，预算很快用完"""
+
+    async def send(self, completion_kwargs, tag=None, exclude=None, sent=None):
+        response = await super().send(completion_kwargs, tag, exclude, sent)
+        response.usage.prompt_tokens = 2000
+        return response
+
+
+def test_budget_skipped_samples_are_not_scored(synthetic_dataset, release_engines):
+    datasets = prepare_datasets([synthetic_dataset("Bench_60", 60)], "single_first", lambda x: True)
+    model_config = dict(MODEL_CONFIG)
+    engine = ExpensiveMockEngine(model=model_config["path"], latency=0.001, concurrency=4)
+    engine.budget = Budget(max_tokens=30000)
+    session_module._engines[session_module.get_engine_key(model_config)] = engine
+    reports = {}
+    result = evaluate_model_for_single_round_tool_call(
+        model_config, datasets, METRICS, {}, report=lambda name, r: reports.setdefault(name, r),
+    )
+    (dataset_name, summary), = result.items()
+    assert summary["Size"] == 60
+    assert 0 < summary["Scored"] < 60
+    assert summary["Scored"] + reports[dataset_name]["BudgetSkipped"] == 60
+    # 没有发送的样本不按 0 分计入，MockEngine 约四分之三的输出完全正确
+    assert summary["ExactMatch-AllTools"] > 50
+
+
+def test_skip_removes_all_rounds_of_a_sample():
+    table = ScoreTable("Bench")
+    table.add("a", None, {"ExactMatch-AllTools": 1}, num_rounds=2, row=0)
+    table.add("b", None, {"ExactMatch-AllTools": 0}, num_rounds=1, row=1)
+    table.add("a", None, {"ExactMatch-AllTools": 1}, num_rounds=2, row=0)
+    table.skip("b", row=1)
+    assert len(table) == 1
+    assert list(table.columns()["data_id"]) == ["a"]
+    summary = table.summarize(["ExactMatch"], size=3)
+    assert summary["ExactMatch-AllTools"] == 50
+    assert summary["Size"] == 3 and summary["Scored"] == 2
+
+
+def test_average_is_weighted_by_scored_samples():
+    all_result = {
+        "A_x": {"ExactMatch-AllTools": 100.0, "Size": 10, "Scored": 2},
+        "B_y": {"ExactMatch-AllTools": 50.0, "Size": 2},
+    }
+    get_average_result(all_result)
+    average = all_result["Avg-[A,B]"]
+    assert average["ExactMatch-AllTools"] == 75.0
+    assert average["Size"] == 12 and average["Scored"] == 4
+
+
+def test_reserve_commit_release():
+    budget = Budget(max_tokens=1000, prices={"prompt": 2, "completion": 10})
+    first = budget.reserve(300, 300)
+    assert first == (600, (300 * 2 + 300 * 10) / 1e6)
+    # 进行中的请求预留了预算，这次放不下，但结算后可能还有剩余，不标记为用完
+    assert budget.reserve(300, 200) is None
+    assert not budget.exhausted
+    # 按实际用量结算，多预留的部分释放出来
+    budget.commit(first, (300, 50))
+    assert (budget.spent_tokens, budget.reserved_tokens) == (350, 0)
+    assert budget.spent_cost == budget.cost(300, 50)
+    second = budget.reserve(300, 200)
+    budget.release(second)
+    assert (budget.spent_tokens, budget.reserved_tokens) == (350, 0)
+    # 不计预留也超出预算时才标记为用完
+    assert budget.reserve(400, 300) is None
+    assert budget.exhausted
+
+
+def test_cost_budget():
+    budget = Budget(max_cost=0.01, prices={"prompt": 10, "completion": 10})
+    reservation = budget.reserve(500, 400)
+    assert reservation is not None
+    budget.commit(reservation)
+    # 没有 usage 时按预留的用量结算
+    assert budget.spent_cost == 0.009
+    assert budget.reserve(100, 50) is None and budget.exhausted
+
+
+class RejectingMockEngine(MockEngine):
+    """每个请求都返回 400，不重试"""
+
+    async def send(self, completion_kwargs, tag=None, exclude=None, sent=None):
+        response = httpx.Response(400, request=httpx.Request("POST", "http://localhost"))
+        raise openai.BadRequestError("bad request", response=response, body=None)
+
+
+def test_requests_settle_their_reservations():
+    prompts = [{"new_messages": [{"role": "user", "content": f"Please call tool_{i} for C{i} over the next 2 days."}]} for i in range(6)]
+    sampling_params = {"temperature": 1.0, "max_tokens": 64}
+
+    engine = ExpensiveMockEngine(latency=0.001, concurrency=2)
+    engine.budget = Budget(max_tokens=100000)
+    try:
+        engine.generate(prompts, sampling_params)
+    finally:
+        engine.close()
+    # 成功的请求按 usage 结算（每个请求 2000 个输入 token），预留全部释放
+    assert (engine.budget.spent_tokens, engine.budget.reserved_tokens) == (6 * 2000, 0)
+
+    engine = RejectingMockEngine(latency=0.001, concurrency=2)
+    engine.budget = Budget(max_tokens=100000)
+    try:
+        outputs = engine.generate(prompts, sampling_params)
+    finally:
+        engine.close()
+    # 失败的请求不消耗预算，也不标记为 skipped
+    assert (engine.budget.spent_tokens, engine.budget.reserved_tokens) == (0, 0)
+    assert engine.stats()["GiveUps"] == 6
+    assert not any(output.skipped for output in outputs)
@@ -0,0 +1,91 @@
+import os
+import itertools
+
+from run import prepare_datasets
+from evaluate import cache as cache_module
+from evaluate import evaluate_model_for_single_round_tool_call
+from evaluate.cache import GenerationCache
+from models.api_requester import API_Requester
+from benchmarks.bench import MODEL_CONFIG, METRICS
+
+
+def make_outputs(texts):
+    return [API_Requester.MockVLLMResponse(text) for text in texts]
+
+
+def test_key_is_stable(tmp_path):
+    path = os.path.join(tmp_path, "generation.sqlite")
+    cache = GenerationCache(path, "model-a")
+    payload = {"messages": [{"role": "user", "content": "hi"}], "temperature": 0}
+    key = cache.key(payload)
+    # 键与字典的顺序无关，不同的模型和采样参数（namespace）不共享
+    assert cache.key({"temperature": 0, "messages": [{"content": "hi", "role": "user"}]}) == key
+    assert GenerationCache(path, "model-b").key(payload) != key
+    assert cache.key([1, 2, 3]) != cache.key([1, 2, 4])
+
+    cache.put_many([key], make_outputs(["out"]))
+    cache.close()
+    # 重新打开后相同的请求仍然命中
+    reopened = GenerationCache(path, "model-a")
+    found = reopened.get_many([reopened.key(payload)], tags=["Bench"])
+    assert found[key].outputs[0].text == "out"
+    assert reopened.stats("Bench") == {"CacheHit": 1, "CacheMiss": 0}
+
+
+def test_empty_outputs_are_not_cached(tmp_path):
+    cache = GenerationCache(os.path.join(tmp_path, "generation.sqlite"), "model")
+    cache.put_many(["a", "b"], make_outputs(["", "b"]))
+    assert sorted(cache.get_many(["a", "b"])) == ["b"]
+    assert cache.stats() == {"CacheHit": 1, "CacheMiss": 1}
+
+
+def test_evicts_least_recently_accessed(tmp_path, monkeypatch):
+    clock = itertools.count()
+    monkeypatch.setattr(cache_module.time, "time", lambda: next(clock))
+    cache = GenerationCache(os.path.join(tmp_path, "generation.sqlite"), "model", max_size_mb=0)
+    record_size = len('{"text": "xxxx"}')
+    cache.max_size = record_size * 3
+    cache.put_many(["a", "b", "c"], make_outputs(["xxxx"] * 3))
+    assert len(cache.get_many(["a", "b", "c"])) == 3
+    # a 最近被访问过，超出上限时淘汰最久未访问的 b
+    cache.get_many(["a"])
+    cache.get_many(["c"])
+    cache.put_many(["d"], make_outputs(["xxxx"]))
+    assert sorted(cache.get_many(["a", "b", "c", "d"])) == ["a", "c", "d"]
+
+
+def test_total_size_is_tracked_without_scanning(tmp_path, monkeypatch):
+    path = os.path.join(tmp_path, "generation.sqlite")
+    cache = GenerationCache(path, "model")
+    scans = []
+    scan_size = cache._scan_size
+    monkeypatch.setattr(cache, "_scan_size", lambda: scans.append(1) or scan_size())
+    cache.put_many(["a", "b"], make_outputs(["xx", "yyyy"]))
+    # 替换已有的记录时按新旧大小之差更新
+    cache.put_many(["a", "c"], make_outputs(["xxxxxx", "z"]))
+    assert cache.total_size == scan_size()
+    # 没有超过上限时不扫描全表
+    assert scans == []
+
+    cache.max_size = cache.total_size - 1
+    cache.put_many(["a"], make_outputs(["xxxxxx"]))
+    assert len(scans) == 1
+    assert cache.total_size == scan_size() <= cache.max_size
+    cache.close()
+    assert GenerationCache(path, "model").total_size == cache.total_size
+
+
+def test_cache_is_shared_across_configs(tmp_path, mock_engine, synthetic_dataset):
+    datasets = prepare_datasets([synthetic_dataset("Bench_40", 40)], "single_first", lambda x: True)
+    cache_strategy = {"path": os.path.join(tmp_path, "cache", "generation.sqlite")}
+    first = evaluate_model_for_single_round_tool_call(dict(MODEL_CONFIG), datasets, METRICS, {}, cache_strategy=cache_strategy)
+    assert mock_engine.calls == 40
+
+    # 只改变 is_strict 时请求相同，全部命中缓存
+    mock_engine.calls = 0
+    lenient = evaluate_model_for_single_round_tool_call(
+        dict(MODEL_CONFIG), datasets, METRICS, {}, is_strict=False, cache_strategy=cache_strategy,
+    )
+    assert mock_engine.calls == 0
+    assert lenient == evaluate_model_for_single_round_tool_call(dict(MODEL_CONFIG), datasets, METRICS, {}, is_strict=False)
+    assert evaluate_model_for_single_round_tool_call(dict(MODEL_CONFIG), datasets, METRICS, {}, cache_strategy=cache_strategy) == first
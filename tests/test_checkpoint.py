@@ -0,0 +1,58 @@
+import os
+import threading
+
+from run import prepare_datasets
+from evaluate import evaluate_model_for_single_round_tool_call
+from evaluate.checkpoint import CheckpointStore
+from models.api_requester import API_Requester
+from benchmarks.bench import MODEL_CONFIG, METRICS
+
+
+def evaluate(dataset_path, test_mode, checkpoint_strategy=None):
+    datasets = prepare_datasets([dataset_path], test_mode, lambda x: True)
+    return evaluate_model_for_single_round_tool_call(
+        dict(MODEL_CONFIG), datasets, METRICS, {}, checkpoint_strategy=checkpoint_strategy, test_mode=test_mode,
+    )
+
+
+def test_test_modes_do_not_share_checkpoint(tmp_path, mock_engine, synthetic_dataset):
+    dataset_path = synthetic_dataset("Bench_30", 30)
+    checkpoint_strategy = {"path": os.path.join(tmp_path, "checkpoints")}
+    expected = {mode: evaluate(dataset_path, mode) for mode in ("single_first", "single_last")}
+
+    mock_engine.calls = 0
+    first = evaluate(dataset_path, "single_first", checkpoint_strategy)
+    assert mock_engine.calls == 30
+    # single_last 的 prompt 与 single_first 不同，不能复用 single_first 的断点
+    mock_engine.calls = 0
+    last = evaluate(dataset_path, "single_last", checkpoint_strategy)
+    assert mock_engine.calls == 30
+    assert first == expected["single_first"]
+    assert last == expected["single_last"]
+
+    # 两种 test_mode 的断点都完整保存，再次评测时不需要生成
+    mock_engine.calls = 0
+    assert evaluate(dataset_path, "single_first", checkpoint_strategy) == expected["single_first"]
+    assert evaluate(dataset_path, "single_last", checkpoint_strategy) == expected["single_last"]
+    assert mock_engine.calls == 0
+
+
+def test_concurrent_appends_are_all_loaded(tmp_path):
+    store = CheckpointStore(str(tmp_path), "mock/model", {"temperature": 0})
+    store.load("Bench")
+
+    def append(start):
+        keys = [f"k{i}" for i in range(start, start + 50)]
+        store.append("Bench", keys, [API_Requester.MockVLLMResponse(key) for key in keys], keys)
+
+    threads = [threading.Thread(target=append, args=(start,)) for start in range(0, 400, 50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 内存中的断点与重新读取的文件一致
+    reloaded = CheckpointStore(str(tmp_path), "mock/model", {"temperature": 0})
+    for checkpoint in (store, reloaded):
+        saved = checkpoint.load("Bench")
+        assert len(saved) == 400
+        assert all(checkpoint.get("Bench", key, key).outputs[0].text == key for key in saved)
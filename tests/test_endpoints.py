@@ -0,0 +1,17 @@
+from models.endpoints import Endpoint, EndpointPool
+
+
+def test_latency_policy_scores_unknown_endpoint_with_mean_latency():
+    a, b = Endpoint("http://a", None), Endpoint("http://b", None)
+    a.latency = 0.5
+    b.outstanding = 10
+    pool = EndpointPool([a, b], policy="latency")
+    # 没有延迟数据的 b 按平均延迟 0.5 秒计算，进行中的请求更多，不应被选中
+    assert pool.pick() is a
+
+
+def test_latency_policy_without_samples_uses_outstanding():
+    a, b = Endpoint("http://a", None), Endpoint("http://b", None)
+    a.outstanding = 3
+    pool = EndpointPool([a, b], policy="latency")
+    assert pool.pick() is b
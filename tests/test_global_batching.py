@@ -0,0 +1,40 @@
+from run import prepare_datasets
+from evaluate import evaluate_model_for_single_round_tool_call, evaluate_model_for_multiple_round_tool_call
+from benchmarks.bench import MODEL_CONFIG, METRICS
+
+
+def record_batches(engine, monkeypatch):
+    """记录每次提交给引擎的请求数"""
+    batches = []
+    generate = engine.generate
+
+    def recording_generate(prompt_list, *args, **kwargs):
+        batches.append(len(prompt_list))
+        return generate(prompt_list, *args, **kwargs)
+
+    monkeypatch.setattr(engine, "generate", recording_generate)
+    return batches
+
+
+def test_global_batching_matches_per_dataset(tmp_path, monkeypatch, mock_engine, synthetic_dataset):
+    for name, size in (("Bench_A", 30), ("Bench_B", 7), ("Other_C", 50)):
+        synthetic_dataset(name, size)
+    batches = record_batches(mock_engine, monkeypatch)
+
+    datasets = prepare_datasets([str(tmp_path)], "single_first", lambda x: True)
+    expected = evaluate_model_for_single_round_tool_call(dict(MODEL_CONFIG), datasets, METRICS, {})
+    assert sorted(batches) == [7, 30, 50]
+    batches.clear()
+    result = evaluate_model_for_single_round_tool_call(dict(MODEL_CONFIG), datasets, METRICS, {}, generate_strategy={"global_batching": True})
+    # 所有数据集一起提交，生成后按来源拆分，每个数据集的结果不变
+    assert batches == [87]
+    assert result == expected
+
+    datasets = prepare_datasets([str(tmp_path)], "multiple_avg", lambda x: True)
+    expected = evaluate_model_for_multiple_round_tool_call(dict(MODEL_CONFIG), datasets, METRICS, {}, evaluate_mode="avg")
+    batches.clear()
+    result = evaluate_model_for_multiple_round_tool_call(
+        dict(MODEL_CONFIG), datasets, METRICS, {}, evaluate_mode="avg", generate_strategy={"global_batching": True},
+    )
+    assert len(batches) == 1
+    assert result == expected
@@ -0,0 +1,55 @@
+import types
+import asyncio
+
+from models.api_requester import API_Requester
+
+USAGE = {"prompt_tokens": 100, "completion_tokens": 10}
+
+
+class SlowPrimaryRequester(API_Requester):
+    """原请求耗时 0.5 秒，对冲请求立即返回，记录发出的请求"""
+
+    def __init__(self, **kwargs):
+        super().__init__(
+            api_key="mock", base_url="http://localhost",
+            hedge={"min_samples": 1, "min_delay": 0.05, "max_ratio": 1}, **kwargs,
+        )
+        self.hedger.observe(0.01)
+        self.sent = []
+
+    async def send(self, completion_kwargs, tag=None, exclude=None, sent=None):
+        is_primary = sent is not None
+        self.sent.append("primary" if is_primary else "hedge")
+        await asyncio.sleep(0.5 if is_primary else 0.01)
+        return types.SimpleNamespace(usage=dict(USAGE))
+
+
+def create(requester):
+    kwargs = {"messages": [{"role": "user", "content": "hi"}], "max_tokens": 10}
+    return requester._run(requester.create(kwargs, tag="test"))
+
+
+def test_hedge_waits_for_concurrency_slot():
+    requester = SlowPrimaryRequester(max_workers=1)
+    assert create(requester) is not None
+    # 原请求占用了唯一的并发名额，对冲请求不能绕过并发上限
+    assert requester.sent == ["primary"]
+    assert requester.counters["test"]["Hedges"] == 0
+
+
+def test_hedge_waits_for_rate_limiter():
+    requester = SlowPrimaryRequester(max_workers=2, rate_limit={"requests_per_min": 6})
+    assert create(requester) is not None
+    assert requester.sent == ["primary"]
+
+
+def test_cancelled_primary_is_charged():
+    requester = SlowPrimaryRequester(max_workers=2, budget={"max_tokens": 10000})
+    assert create(requester) is not None
+    assert requester.sent == ["primary", "hedge"]
+    counter = requester.counters["test"]
+    assert counter["Hedges"] == 1 and counter["HedgeWins"] == 1
+    # 被取消的原请求已经发出，按返回结果的用量计入
+    assert counter["PromptTokens"] == 200 and counter["CompletionTokens"] == 20
+    assert requester.budget.spent_tokens == 220
+    assert requester.budget.reserved_tokens == 0
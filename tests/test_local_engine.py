@@ -0,0 +1,81 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from run import prepare_datasets
+from evaluate import session as session_module
+from evaluate.session import get_session, common_prefix_len
+from evaluate import evaluate_model_for_single_round_tool_call
+from benchmarks.bench import LOCAL_MODEL_CONFIG, METRICS, install_mock_llm
+
+
+def test_local_pipeline_matches_staged(synthetic_dataset, release_engines):
+    datasets = prepare_datasets([synthetic_dataset("Bench_200", 200)], "single_first", lambda x: True)
+    engine = install_mock_llm(dict(LOCAL_MODEL_CONFIG))
+    results = [
+        evaluate_model_for_single_round_tool_call(dict(LOCAL_MODEL_CONFIG), datasets, METRICS, {}, generate_strategy=strategy)
+        for strategy in (
+            {},
+            {"pipeline": True, "chunk_size": 32, "in_flight": 4},
+        )
+    ]
+    # 流水线通过 StreamingEngine 的 add_request / step 生成
+    assert engine._streaming_engine is not None
+    assert results[0] == results[1]
+    (summary,) = results[0].values()
+    assert 0 < summary["ExactMatch-AllTools"] < 100
+
+
+def test_sort_prompts_restores_original_order(monkeypatch, synthetic_dataset, release_engines):
+    datasets = prepare_datasets([synthetic_dataset("Bench_120", 120)], "single_first", lambda x: True)
+    engine = install_mock_llm(dict(LOCAL_MODEL_CONFIG))
+    submitted = []
+    generate = engine.generate
+
+    def recording_generate(request_list, *args, **kwargs):
+        submitted.append([request["prompt_token_ids"] for request in request_list])
+        return generate(request_list, *args, **kwargs)
+
+    monkeypatch.setattr(engine, "generate", recording_generate)
+    reports, tables = [], []
+    results = []
+    for strategy in ({}, {"sort_prompts": True}):
+        tables.append({})
+        results.append(evaluate_model_for_single_round_tool_call(
+            dict(LOCAL_MODEL_CONFIG), datasets, METRICS, {}, generate_strategy=strategy,
+            report=lambda name, result: reports.append(result), score_tables=tables[-1],
+        ))
+
+    # 按 token ids 排序后提交，生成后恢复原来的顺序，每个样本的得分不变
+    assert submitted[1] == sorted(submitted[0]) != submitted[0]
+    assert results[0] == results[1]
+    (unsorted_table,), (sorted_table,) = (list(t.values()) for t in tables)
+    for key, values in unsorted_table.columns().items():
+        assert list(sorted_table.columns()[key]) == list(values)
+    assert "PrefixShare" not in reports[0] and reports[1]["PrefixShare"] > 0
+
+
+def test_prefix_stats_from_concurrent_batches(monkeypatch, release_engines):
+    install_mock_llm(dict(LOCAL_MODEL_CONFIG))
+    session = get_session(dict(LOCAL_MODEL_CONFIG), {"sort_prompts": True, "pipeline": True})
+
+    def slow_common_prefix_len(a, b):
+        # 让计算前缀的线程让出执行，多个批次的统计交错进行
+        time.sleep(0.001)
+        return common_prefix_len(a, b)
+
+    monkeypatch.setattr(session_module, "common_prefix_len", slow_common_prefix_len)
+    batches = [
+        session.encode([f"Please call tool_{i} for C{j}." for j in range(10)])
+        for i in range(8)
+    ]
+    # 流水线中多批请求在不同线程中同时生成
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(lambda encoded: session.generate(None, tags=["Bench"] * 10, encoded=encoded), batches))
+    expected = [0, 0]
+    for _, payload_list in batches:
+        prev_ids = []
+        for ids in sorted(payload_list):
+            expected[0] += common_prefix_len(prev_ids, ids)
+            expected[1] += len(ids)
+            prev_ids = ids
+    assert session.prefix_stats["Bench"] == expected
@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+from evaluate.metrics import (
+    metrics_for_single_round_tool_call, compare_params_simple, compare_params_bfcl, fingerprint_params, compare_fingerprints,
+)
+from benchmarks.parity import check_metric_parity
+
+# 随机用例不容易覆盖、曾经出现过不一致或容易出错的用例
+FIXED_CASES = [
+    # 答案调用多于输出时，按列取最小成本会选中与 KM 算法不同的答案调用，参数总数不同
+    (
+        [
+            {"name": "f", "parameters": {"p0": 1, "p1": "a"}},
+            {"name": "f", "parameters": {"p0": "b"}},
+            {"name": "f", "parameters": {"p0": "b"}},
+            {"name": "f", "parameters": {"p0": 1}},
+        ],
+        [
+            {"name": "f", "parameters": {"p0": 1}},
+            {"name": "f", "parameters": {"p0": "b"}},
+            {"name": "f", "parameters": {"p0": "a"}},
+        ],
+    ),
+    # 两行的最优位置相同，需要 KM 算法
+    (
+        [
+            {"name": "f", "parameters": {"p0": 1, "p1": 2}},
+            {"name": "f", "parameters": {"p0": 1, "p1": 3}},
+        ],
+        [
+            {"name": "f", "parameters": {"p0": 1, "p1": 2}},
+            {"name": "f", "parameters": {"p0": 2, "p1": 4}},
+        ],
+    ),
+    # 字典值的键顺序不同时序列化结果不同
+    (
+        [{"name": "g", "parameters": {"p0": {"x": 1, "y": " b"}}}],
+        [{"name": "g", "parameters": {"p0": {"y": " b", "x": 1}}}],
+    ),
+    # 缺少参数与参数为 None 相同
+    (
+        [{"name": "g", "parameters": {"p0": None, "p1": "a"}}],
+        [{"name": "g", "parameters": {"p1": " a "}}],
+    ),
+    ([], []),
+    ([], [{"name": "g", "parameters": {}}]),
+    ([{"name": "g", "parameters": {}}], []),
+]
+
+
+@pytest.mark.parametrize("golden_answer, tool_calls", FIXED_CASES)
+@pytest.mark.parametrize("is_strict", [True, False])
+@pytest.mark.parametrize("compare_params", [compare_params_simple, compare_params_bfcl])
+def test_fast_path_matches_hungarian(golden_answer, tool_calls, is_strict, compare_params):
+    try:
+        expected = metrics_for_single_round_tool_call(golden_answer, tool_calls, is_strict, compare_params, fast_path=False)
+    except Exception:
+        pytest.skip("原实现不支持这组参数")
+    assert metrics_for_single_round_tool_call(golden_answer, tool_calls, is_strict, compare_params, fast_path=True) == expected
+
+
+def test_ambiguous_case_uses_optimal_assignment():
+    golden_answer, tool_calls = FIXED_CASES[0]
+    result = metrics_for_single_round_tool_call(golden_answer, tool_calls)
+    assert result["ExactMatch-PerTool"] == 0.5
+    assert result["ToolAccuracy"] == 0.75
+
+
+def test_random_cases_match_hungarian():
+    assert check_metric_parity(count=3000, seed=0) == []
+
+
+FINGERPRINT_VALUES = ["a", " a", 1, 1.0, True, 0, False, None, [1, 2], [2, 1], {"x": 1, "y": 2}, {"y": 2, "x": 1}, "中文", float("nan")]
+
+
+def test_fingerprints_match_compare_params_simple():
+    rng = random.Random(0)
+    for _ in range(2000):
+        gold = {f"p{k}": rng.choice(FINGERPRINT_VALUES) for k in range(rng.randint(0, 3))}
+        output = {f"p{k}": rng.choice(FINGERPRINT_VALUES) for k in range(rng.randint(0, 3))}
+        assert compare_fingerprints(fingerprint_params(gold), fingerprint_params(output)) == compare_params_simple(gold, output)
+
+
+def test_fingerprint_params_falls_back_for_unusual_arguments():
+    assert fingerprint_params("not a dict") is None
+    assert fingerprint_params({"p": {1, 2}}) is None
+    # 无法生成指纹时回到 compare_params，与不使用快速路径时一样报错
+    golden_answer = [{"name": "f", "parameters": {"p": {1, 2}}}]
+    tool_calls = [{"name": "f", "parameters": {"p": {1, 2}}}]
+    for fast_path in (False, True):
+        with pytest.raises(TypeError):
+            metrics_for_single_round_tool_call(golden_answer, tool_calls, fast_path=fast_path)
@@ -0,0 +1,39 @@
+import json
+import types
+
+from models.base import BaseFormatter
+from evaluate.evaluate_model import create_parse_pool
+from benchmarks.mock import MockEngine
+
+
+class LineParser:
+    """把每行 name {json} 解析为一个工具调用"""
+
+    def extract_tool_calls(self, output, request):
+        calls = []
+        for line in output.splitlines():
+            name, _, arguments = line.partition(" ")
+            calls.append(types.SimpleNamespace(type="function", function=types.SimpleNamespace(name=name, arguments=arguments)))
+        return types.SimpleNamespace(content="", tool_calls=calls)
+
+
+class LineFormatter(BaseFormatter):
+
+    def __init__(self):
+        self.tokenizer = None
+        self.parser = LineParser()
+
+
+def test_parse_pool_matches_serial():
+    formatter = LineFormatter()
+    outputs = [f"search {json.dumps({'q': i})}\nbook {{'id': {i}}}" for i in range(200)]
+    pool = create_parse_pool(2, formatter)
+    try:
+        assert formatter.get_tool_calls(outputs, pool=pool) == formatter.get_tool_calls(outputs)
+    finally:
+        pool.shutdown()
+
+
+def test_no_parse_pool_for_api_models():
+    assert create_parse_pool(4, MockEngine()) is None
+    assert create_parse_pool(1, LineFormatter()) is None
@@ -0,0 +1,52 @@
+import time
+import random
+
+from run import prepare_datasets
+from evaluate import evaluate_model_for_single_round_tool_call, evaluate_model_for_multiple_round_tool_call
+from evaluate.pipeline import run_pipeline
+from benchmarks.bench import MODEL_CONFIG, METRICS, install_mock_engine
+
+
+def test_in_flight_keeps_order():
+    rng = random.Random(0)
+    delays = [rng.random() * 0.01 for _ in range(40)]
+    results = []
+
+    def process(i):
+        time.sleep(delays[i])
+        return i
+
+    run_pipeline(lambda: iter(range(40)), process, results.append, queue_size=2, in_flight=4)
+    assert results == list(range(40))
+
+
+def test_pipeline_matches_staged(synthetic_dataset, release_engines):
+    datasets = prepare_datasets([synthetic_dataset("Bench_300", 300)], "single_first", lambda x: True)
+    install_mock_engine(dict(MODEL_CONFIG), latency=0.001)
+    reports = []
+    results = [
+        evaluate_model_for_single_round_tool_call(
+            dict(MODEL_CONFIG), datasets, METRICS, {}, generate_strategy=strategy,
+            report=lambda name, result: reports.append(result),
+        )
+        for strategy in (
+            {"pipeline": False},
+            {"pipeline": True, "chunk_size": 32, "in_flight": 1},
+            {"pipeline": True, "chunk_size": 32, "in_flight": 4},
+        )
+    ]
+    assert results[0] == results[1] == results[2]
+    # 引擎在多次评测之间复用，每次评测的报告只包含本次的请求
+    assert [report["Requests"] for report in reports] == [300, 300, 300]
+
+
+def test_multiple_round_ignores_pipeline(mock_engine, synthetic_dataset, capsys):
+    datasets = prepare_datasets([synthetic_dataset("Bench_50", 50)], "multiple_seq", lambda x: True)
+    results = [
+        evaluate_model_for_multiple_round_tool_call(
+            dict(MODEL_CONFIG), datasets, METRICS, {}, evaluate_mode="seq", generate_strategy=strategy,
+        )
+        for strategy in ({}, {"pipeline": True})
+    ]
+    assert results[0] == results[1]
+    assert "pipeline 只用于单轮评测" in capsys.readouterr().out
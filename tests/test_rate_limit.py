@@ -0,0 +1,46 @@
+import time
+import types
+import asyncio
+
+import httpx
+import openai
+
+from models.api_requester import API_Requester
+
+PAUSE = 0.3
+
+
+class ThrottledRequester(API_Requester):
+    """第一个请求返回 429 和 Retry-After，记录每个请求的发送时间"""
+
+    def __init__(self, **kwargs):
+        super().__init__(api_key="mock", base_url="http://localhost", **kwargs)
+        self.sent = []
+        self.throttled_at = None
+
+    async def send(self, completion_kwargs, tag=None, exclude=None, sent=None):
+        now = time.monotonic()
+        self.sent.append(now)
+        await asyncio.sleep(0.05)
+        if self.throttled_at is None:
+            self.throttled_at = time.monotonic()
+            response = httpx.Response(429, headers={"retry-after": str(PAUSE)}, request=httpx.Request("POST", "http://localhost"))
+            raise openai.RateLimitError("rate limited", response=response, body=None)
+        return types.SimpleNamespace(usage=None)
+
+
+def test_no_sends_during_throttle_pause():
+    requester = ThrottledRequester(max_workers=2, rate_limit={"adaptive": False})
+
+    async def run():
+        await asyncio.gather(*[
+            requester.create({"messages": [{"role": "user", "content": str(i)}], "max_tokens": 1}, tag="test")
+            for i in range(8)
+        ])
+
+    requester._run(run())
+    start, end = requester.throttled_at, requester.throttled_at + PAUSE
+    assert len(requester.sent) == 9
+    # 在并发名额上排队的请求也要等待限流暂停结束
+    assert not [t for t in requester.sent if start < t < end - 0.01]
+    assert requester.counters["test"]["Throttled"] == 1
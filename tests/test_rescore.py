@@ -0,0 +1,46 @@
+import os
+
+from evaluate.evaluate_model import save_results, get_key_map
+from evaluate.rescore import rescore_results
+
+
+def make_save(data_id, name):
+    call = [{"name": name, "parameters": {"city": "C"}}]
+    return {
+        "data_id": data_id,
+        "golden_answer": call,
+        "golden_role": "tool_call",
+        "result": {"think": "", "content": "", "tool_call": call},
+        "metrics": {},
+    }
+
+
+def test_rescore_groups_by_saved_model_name(tmp_path):
+    save_strategy = dict(save_result=True, save_golden_answer=True, jsonl=True, save_path=str(tmp_path))
+    # 模型名和数据集名中都含有 _，data_id 的前缀只是数据集名的一部分，从文件名中无法正确拆分
+    for model_path in ("org/gpt-4o_A", "org/gpt-4o"):
+        for dataset_name in ("Bench_A", "Bench_B"):
+            saves = [make_save(f"{dataset_name.split('_')[-1]}_{i}", "search") for i in range(3)]
+            save_results(saves, save_strategy, {"path": model_path}, dataset_name, get_key_map(save_strategy))
+    assert len(os.listdir(tmp_path)) == 4
+
+    all_model_result = rescore_results(str(tmp_path), ["ExactMatch"], workers=1)
+    assert sorted(all_model_result) == ["gpt-4o", "gpt-4o_A"]
+    for all_result in all_model_result.values():
+        assert sorted(all_result) == ["Bench_A", "Bench_B"]
+        assert all(result["Size"] == 3 for result in all_result.values())
+
+
+def test_rescore_keeps_results_of_each_test_mode(tmp_path):
+    save_strategy = dict(save_result=True, save_golden_answer=True, jsonl=True, save_path=str(tmp_path))
+    for test_mode, name in (("single_first", "search"), ("single_last", "book")):
+        saves = [make_save(f"A_{i}", "search") for i in range(4)]
+        saves[0]["result"]["tool_call"] = [{"name": name, "parameters": {"city": "C"}}]
+        save_results(saves, save_strategy, {"path": "org/gpt-4o"}, "Bench_A", get_key_map(save_strategy), test_mode=test_mode)
+    # 同一分钟内保存的两个 test_mode 不会互相覆盖
+    assert len(os.listdir(tmp_path)) == 2
+
+    all_model_result = rescore_results(str(tmp_path), ["ExactMatch"], workers=1)
+    all_result = all_model_result["gpt-4o"]
+    assert len(all_result) == 2
+    assert sorted(result["ExactMatch-AllTools"] for result in all_result.values()) == [75.0, 100.0]
@@ -0,0 +1,50 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from run import prepare_datasets
+from evaluate import evaluate_model
+from evaluate import evaluate_model_for_single_round_tool_call, evaluate_model_for_multiple_round_tool_call
+from benchmarks.bench import MODEL_CONFIG, METRICS
+
+
+class CountingPool(ProcessPoolExecutor):
+    """记录创建的进程池和提交给进程池的任务数"""
+
+    pools = []
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tasks = 0
+        self.pools.append(self)
+
+    def submit(self, *args, **kwargs):
+        self.tasks += 1
+        return super().submit(*args, **kwargs)
+
+
+def test_pipeline_scores_in_worker_pool(tmp_path, monkeypatch, mock_engine, synthetic_dataset):
+    for name in ("A", "B"):
+        synthetic_dataset(f"Bench_{name}", 300)
+    datasets = prepare_datasets([str(tmp_path)], "single_first", lambda x: True)
+    expected = evaluate_model_for_single_round_tool_call(dict(MODEL_CONFIG), datasets, METRICS, {})
+    monkeypatch.setattr(evaluate_model, "ProcessPoolExecutor", CountingPool)
+    # 流水线每批 128 条，两个数据集共用同一个进程池
+    result = evaluate_model_for_single_round_tool_call(
+        dict(MODEL_CONFIG), datasets, METRICS, {},
+        generate_strategy={"pipeline": True, "chunk_size": 128, "score_workers": 2},
+    )
+    assert result == expected
+    assert len(CountingPool.pools) == 1
+    assert CountingPool.pools[0].tasks > 0
+
+
+def test_multiple_round_scores_in_worker_pool(mock_engine, synthetic_dataset):
+    dataset_path = synthetic_dataset("Bench_A", 200)
+    for evaluate_mode in ("avg", "seq"):
+        datasets = prepare_datasets([dataset_path], f"multiple_{evaluate_mode}", lambda x: True)
+        results = [
+            evaluate_model_for_multiple_round_tool_call(
+                dict(MODEL_CONFIG), datasets, METRICS, {}, evaluate_mode=evaluate_mode, generate_strategy=strategy,
+            )
+            for strategy in ({}, {"score_workers": 2})
+        ]
+        assert results[0] == results[1]
@@ -0,0 +1,115 @@
+import random
+
+import pytest
+
+from evaluate.scores import ScoreTable, LENGTH_KEYS, concat_tables, group_results
+
+METRICS = ["ExactMatch", "ToolAccuracy"]
+TAGS = ["search", "math", "travel"]
+
+
+def random_samples(rng, count, prefix):
+    """随机生成样本：每个样本有若干轮，每轮有输出各部分和指标"""
+    samples = []
+    for i in range(count):
+        rounds = []
+        for _ in range(rng.randint(1, 3)):
+            result = {part: "x" * rng.randint(0, 20) for part in ("think", "content", "tool_call")}
+            test_result = {
+                "ExactMatch-AllTools": rng.choice([0, 1]),
+                "ExactMatch-PerTool": rng.choice([0, 0.5, 1]),
+                "ToolAccuracy": rng.choice([0, 1 / 3, 1]),
+                "Unlisted": 1, # 不在 metrics 中，不计入结果
+            }
+            rounds.append((result, test_result))
+        samples.append({"data_id": f"{prefix}_{i}", "rounds": rounds, "tags": rng.sample(TAGS, rng.randint(0, 2))})
+    return samples
+
+
+def build_table(dataset_name, samples):
+    table = ScoreTable(dataset_name)
+    for row, sample in enumerate(samples):
+        for result, test_result in sample["rounds"]:
+            table.add(sample["data_id"], result, test_result, num_rounds=len(sample["rounds"]), row=row)
+    return table
+
+
+def naive_summary(samples, metrics):
+    """原来的写法：在字典中逐个累加，长度除以总轮数，指标除以样本数再乘以 100"""
+    final_result = {key: 0 for key in LENGTH_KEYS}
+    total_rounds = 0
+    for sample in samples:
+        num_rounds = len(sample["rounds"])
+        for result, test_result in sample["rounds"]:
+            total_rounds += 1
+            for key, part in zip(LENGTH_KEYS, ("think", "content", "tool_call")):
+                final_result[key] += len(result[part])
+            for k, v in test_result.items():
+                final_result[k] = final_result.get(k, 0) + v / num_rounds
+    summary = {
+        k: (v / total_rounds if k.startswith("avg_") else v * 100 / len(samples))
+        for k, v in final_result.items()
+            if k.split("-")[0] in metrics or k.startswith("avg_")
+    }
+    summary["Size"] = len(samples)
+    return summary
+
+
+def test_summarize_matches_dict_sums():
+    rng = random.Random(0)
+    for count in (1, 7, 50):
+        samples = random_samples(rng, count, "A")
+        summary = build_table("A", samples).summarize(METRICS)
+        assert summary == pytest.approx(naive_summary(samples, METRICS))
+        assert "Unlisted" not in summary
+
+
+def test_summarize_with_skipped_samples():
+    samples = random_samples(random.Random(1), 10, "A")
+    table = build_table("A", samples)
+    table.skip("A_3", row=3)
+    table.skip("A_8", row=8)
+    kept = [sample for i, sample in enumerate(samples) if i not in (3, 8)]
+    summary = table.summarize(METRICS)
+    # 被跳过的样本不计入得分和长度，Size 仍为全部样本数
+    expected = {**naive_summary(kept, METRICS), "Size": 10, "Scored": 8}
+    assert summary == pytest.approx(expected)
+
+
+def test_group_results_match_dict_sums():
+    rng = random.Random(2)
+    datasets = {"A": random_samples(rng, 30, "A"), "B": random_samples(rng, 12, "B")}
+    tables = [build_table(name, samples) for name, samples in datasets.items()]
+    columns = concat_tables(tables)
+    all_samples = [sample for samples in datasets.values() for sample in samples]
+
+    by_dataset = group_results(columns, columns["dataset"], METRICS)
+    for name, samples in datasets.items():
+        assert by_dataset[name] == pytest.approx(naive_summary(samples, METRICS))
+    assert group_results(columns, ["all"] * len(all_samples), METRICS)["all"] == pytest.approx(naive_summary(all_samples, METRICS))
+
+    # 多个标签的样本计入每个标签，没有标签的样本不计入任何分组
+    by_tag = group_results(columns, [sample["tags"] for sample in all_samples], METRICS)
+    expected = {
+        tag: naive_summary([sample for sample in all_samples if tag in sample["tags"]], METRICS)
+        for tag in TAGS if any(tag in sample["tags"] for sample in all_samples)
+    }
+    assert sorted(by_tag) == sorted(expected)
+    for tag, summary in expected.items():
+        assert by_tag[tag] == pytest.approx(summary)
+    assert group_results(columns, [[] for _ in all_samples], METRICS) == {}
+
+
+def test_concat_tables_fills_missing_metrics():
+    first = ScoreTable("A")
+    first.add("a0", None, {"ExactMatch-AllTools": 1, "ToolAccuracy": 1})
+    second = ScoreTable("B")
+    second.add("b0", None, {"ToolAccuracy": 0.5})
+    second.add("b1", None, {"ToolAccuracy": 1})
+    columns = concat_tables([first, second])
+    assert list(columns["data_id"]) == ["a0", "b0", "b1"]
+    assert list(columns["dataset"]) == ["A", "B", "B"]
+    # B 中没有的指标按 0 分计入
+    assert list(columns["ExactMatch-AllTools"]) == [1, 0, 0]
+    assert list(columns["ToolAccuracy"]) == [1, 0.5, 1]
+    assert concat_tables([]) == {}
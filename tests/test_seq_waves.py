@@ -0,0 +1,52 @@
+import os
+import json
+from collections import defaultdict
+
+from run import prepare_datasets
+from evaluate import evaluate_model_for_multiple_round_tool_call
+from evaluate.scores import LENGTH_KEYS, GENERATED_LENGTH_KEYS
+from benchmarks.bench import MODEL_CONFIG, METRICS
+
+
+def sequential_reference(save_path):
+    """按原来的 seq 规则，从 avg 模式保存的每轮指标计算结果：样本内之前各轮都完全正确时才计入该轮"""
+    (filename,) = os.listdir(save_path)
+    rounds = defaultdict(list)
+    with open(os.path.join(save_path, filename), "r", encoding="utf-8") as f:
+        for line in f:
+            save = json.loads(line)
+            data_id, round_idx = save["data_id"].rsplit("_round_", 1)
+            rounds[data_id].append((int(round_idx), save["metrics"]))
+    totals = defaultdict(float)
+    for sample_rounds in rounds.values():
+        for _, metrics in sorted(sample_rounds, key=lambda x: x[0]):
+            for key, value in metrics.items():
+                totals[key] += value / len(sample_rounds)
+            if metrics["ExactMatch-AllTools"] != 1:
+                break
+    return {key: value * 100 / len(rounds) for key, value in totals.items()}
+
+
+def test_seq_waves_match_sequential_reference(tmp_path, mock_engine, synthetic_dataset):
+    dataset_path = synthetic_dataset("Bench_90", 90)
+    save_path = os.path.join(tmp_path, "results")
+    os.makedirs(save_path)
+    datasets = prepare_datasets([dataset_path], "multiple_avg", lambda x: True)
+    avg_result = evaluate_model_for_multiple_round_tool_call(
+        dict(MODEL_CONFIG), datasets, METRICS, dict(save_result=True, jsonl=True, save_path=save_path), evaluate_mode="avg",
+    )
+    all_rounds = mock_engine.calls
+
+    datasets = prepare_datasets([dataset_path], "multiple_seq", lambda x: True)
+    mock_engine.calls = 0
+    seq_result = evaluate_model_for_multiple_round_tool_call(dict(MODEL_CONFIG), datasets, METRICS, {}, evaluate_mode="seq")
+
+    (avg_summary,) = avg_result.values()
+    (seq_summary,) = seq_result.values()
+    for key, value in sequential_reference(save_path).items():
+        assert abs(seq_summary[key] - value) < 1e-9
+    # 前面轮次出错的样本不再生成后续轮次
+    assert 0 < mock_engine.calls < all_rounds
+    # 只在生成的轮次上平均的长度使用不同的名称，不与按全部轮次平均的长度混在一起
+    assert all(key in avg_summary and key not in seq_summary for key in LENGTH_KEYS)
+    assert all(key in seq_summary for key in GENERATED_LENGTH_KEYS)
@@ -0,0 +1,59 @@
+from evaluate import session as session_module
+from evaluate.session import get_engine_key, get_session, get_streaming_engine
+from benchmarks.bench import MODEL_CONFIG, LOCAL_MODEL_CONFIG, install_mock_llm
+from benchmarks.mock import MockEngine
+
+
+class ClosingMockEngine(MockEngine):
+    """记录是否被释放"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        super().close()
+
+
+def test_engine_key_only_depends_on_engine_options():
+    for config in (MODEL_CONFIG, LOCAL_MODEL_CONFIG):
+        key = get_engine_key(config)
+        # 采样参数可以在复用的引擎上改变
+        assert get_engine_key({**config, "sampling_params": {"temperature": 1.0}}) == key
+    assert get_engine_key({**MODEL_CONFIG, "concurrency": 8}) != get_engine_key(MODEL_CONFIG)
+    assert get_engine_key({**LOCAL_MODEL_CONFIG, "tp": 2}) != get_engine_key(LOCAL_MODEL_CONFIG)
+    assert get_engine_key({**LOCAL_MODEL_CONFIG, "enable_prefix_caching": True}) != get_engine_key(LOCAL_MODEL_CONFIG)
+
+
+def test_session_reuses_engine_and_releases_previous(monkeypatch, release_engines):
+    built = []
+
+    def build_engine(model_config):
+        built.append(ClosingMockEngine(model=model_config["path"]))
+        return built[-1]
+
+    monkeypatch.setattr(session_module, "build_engine", build_engine)
+    first = get_session(dict(MODEL_CONFIG))
+    second = get_session({**MODEL_CONFIG, "sampling_params": {"max_tokens": 64, "temperature": 0.5}})
+    assert len(built) == 1
+    assert second.llm is first.llm
+    assert second.sampling_config["temperature"] == 0.5
+
+    # 引擎参数不同时先释放之前的引擎，注册表中只保留一个
+    third = get_session({**MODEL_CONFIG, "concurrency": 8})
+    assert len(built) == 2
+    assert third.llm is built[1]
+    assert built[0].closed and not built[1].closed
+    assert list(session_module._engines.values()) == [built[1]]
+
+
+def test_release_stops_streaming_engine(release_engines):
+    llm = install_mock_llm(dict(LOCAL_MODEL_CONFIG))
+    session = get_session(dict(LOCAL_MODEL_CONFIG))
+    assert session.llm is llm
+    streaming = get_streaming_engine(llm)
+    assert get_streaming_engine(llm) is streaming
+    session_module.release_engines()
+    assert session_module._engines == {}
+    assert not streaming._thread.is_alive()
@@ -0,0 +1,118 @@
+import json
+import itertools
+
+import numpy as np
+import pytest
+
+from evaluate import statistics
+from evaluate.statistics import bootstrap_ci, paired_permutation_test, score_statistics, load_saved_scores
+
+
+def naive_bootstrap_ci(values, n_resamples, confidence=0.95, seed=0):
+    """逐个有放回地抽取样本"""
+    rng = np.random.default_rng(seed)
+    index = rng.integers(0, len(values), size=(n_resamples, len(values)))
+    means = values[index].mean(axis=1)
+    alpha = (1 - confidence) / 2
+    return np.quantile(means, [alpha, 1 - alpha], axis=0)
+
+
+def exact_permutation_p(diff):
+    """枚举所有符号翻转，计算精确的双侧 p 值"""
+    observed = np.abs(diff.sum(axis=0))
+    signs = np.array(list(itertools.product([1, -1], repeat=len(diff))))
+    return (np.abs(signs @ diff) >= observed - 1e-9).mean(axis=0)
+
+
+@pytest.mark.parametrize("chunk_elements", [statistics.CHUNK_ELEMENTS, 10])
+def test_bootstrap_ci_matches_naive_resampling(monkeypatch, chunk_elements):
+    monkeypatch.setattr(statistics, "CHUNK_ELEMENTS", chunk_elements)
+    rng = np.random.default_rng(0)
+    values = np.stack([rng.choice([0, 1], 200), rng.choice([0, 0.5, 1], 200), np.ones(200)], axis=1)
+    low, high = bootstrap_ci(values, n_resamples=4000)
+    expected_low, expected_high = naive_bootstrap_ci(values, n_resamples=4000, seed=1)
+    # 两种抽样方式的随机数不同，区间只在抽样误差内一致
+    assert low == pytest.approx(expected_low, abs=0.01)
+    assert high == pytest.approx(expected_high, abs=0.01)
+    assert low[2] == high[2] == 1
+    # 相同的 seed 得到相同的结果
+    assert np.array_equal(bootstrap_ci(values, n_resamples=4000)[0], low)
+
+
+@pytest.mark.parametrize("chunk_elements", [statistics.CHUNK_ELEMENTS, 10])
+def test_permutation_test_matches_exact_enumeration(monkeypatch, chunk_elements):
+    monkeypatch.setattr(statistics, "CHUNK_ELEMENTS", chunk_elements)
+    rng = np.random.default_rng(0)
+    diff = np.stack([
+        rng.choice([-1, -0.5, 0, 0.5, 1], 12),
+        rng.choice([0, 0.5, 1], 12, p=[0.3, 0.3, 0.4]), # 明显大于 0
+        np.zeros(12), # 没有差异，p 值为 1
+    ], axis=1)
+    p_values = paired_permutation_test(diff, n_resamples=20000)
+    expected = exact_permutation_p(diff)
+    assert p_values == pytest.approx(expected, abs=0.02)
+    assert p_values[1] < 0.05
+    assert p_values[2] == 1
+
+
+def test_score_statistics_pairs_by_data_id():
+    columns = {
+        "data_id": np.array(["a", "b", "c", "d"], dtype=object),
+        "ExactMatch-AllTools": np.array([1.0, 1.0, 0.0, 1.0]),
+        "avg_think": np.array([3.0, 4.0, 5.0, 6.0]),
+    }
+    baseline = {
+        "data_id": np.array(["d", "c", "b", "x"], dtype=object),
+        "ExactMatch-AllTools": np.array([0.0, 0.0, 1.0, 1.0]),
+    }
+    result = score_statistics(columns, ["ExactMatch"], baseline, n_resamples=200, n_permutations=200)
+    # 只配对两组中都有的 b、c、d，长度等列不统计
+    assert result["Matched"] == 3
+    assert result["ExactMatch-AllTools-Diff"] == pytest.approx(100 / 3)
+    assert result["ExactMatch-AllTools-CI-Low"] <= 75 <= result["ExactMatch-AllTools-CI-High"]
+    assert not any(key.startswith("avg_think") for key in result)
+
+
+def test_score_statistics_pairs_within_dataset():
+    # 两个数据集中有相同的 data_id，只与基线中同一数据集的样本配对
+    columns = {
+        "data_id": np.array(["0", "1", "0", "1"], dtype=object),
+        "dataset": np.array(["path/Bench_A", "path/Bench_A", "Bench_B", "Bench_B"], dtype=object),
+        "ExactMatch-AllTools": np.array([1.0, 1.0, 0.0, 0.0]),
+    }
+    baseline = {
+        "data_id": np.array(["0", "1", "0"], dtype=object),
+        "dataset": np.array(["Bench_B", "Bench_B", "Bench_A"], dtype=object),
+        "ExactMatch-AllTools": np.array([0.0, 0.0, 1.0]),
+    }
+    result = score_statistics(columns, ["ExactMatch"], baseline, n_resamples=200, n_permutations=200)
+    assert result["Matched"] == 3
+    assert result["ExactMatch-AllTools-Diff"] == 0
+
+    # 同一数据集中重复的 data_id 无法确定配对
+    duplicated = {key: values[[0, 0, 2]] for key, values in columns.items()}
+    with pytest.raises(ValueError):
+        score_statistics(duplicated, ["ExactMatch"], baseline, n_resamples=200, n_permutations=200)
+
+
+def test_score_statistics_skips_metrics_missing_from_baseline():
+    columns = {
+        "data_id": np.array(["a", "b", "c"], dtype=object),
+        "ExactMatch-AllTools": np.array([1.0, 1.0, 0.0]),
+        "ToolAccuracy": np.array([1.0, 1.0, 1.0]),
+    }
+    baseline = {"data_id": np.array(["a", "b", "c"], dtype=object), "ToolAccuracy": np.array([1.0, 0.0, 1.0])}
+    result = score_statistics(columns, ["ExactMatch", "ToolAccuracy"], baseline, n_resamples=200, n_permutations=200)
+    # 基线中没有的指标不按 0 分比较
+    assert result["Unmatched-Metrics"] == "ExactMatch-AllTools"
+    assert not any(key.startswith("ExactMatch-AllTools-Diff") or key == "ExactMatch-AllTools-p" for key in result)
+    assert result["ExactMatch-AllTools-CI-High"] > 0
+    assert result["ToolAccuracy-Diff"] == pytest.approx(100 / 3)
+
+
+def test_saved_baseline_uses_dataset_name(tmp_path):
+    with open(tmp_path / "0101_1200_model-a_Bench_A.jsonl", "w", encoding="utf-8") as fout:
+        for i in range(2):
+            fout.write(json.dumps({"data_id": str(i), "metrics": {"ExactMatch-AllTools": 1}, "model": "model-a", "dataset": "Bench_A"}) + "\n")
+    baseline = load_saved_scores(str(tmp_path))
+    assert list(baseline["dataset"]) == ["Bench_A", "Bench_A"]
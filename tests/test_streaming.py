@@ -0,0 +1,79 @@
+import time
+import types
+import asyncio
+
+import numpy as np
+from openai.types.chat import ChatCompletionChunk
+
+from models.api_requester import API_Requester
+from models.streaming import consume_stream, summarize_latency
+
+DELAY = 0.02
+
+
+def make_chunk(delta, finish_reason=None, usage=None):
+    return ChatCompletionChunk.model_validate({
+        "id": "chunk", "object": "chat.completion.chunk", "created": 1, "model": "mock",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else [],
+        "usage": usage,
+    })
+
+
+async def fake_stream():
+    """第一个 token 在 DELAY 后到达，之后每隔 DELAY / 2 到达一个，工具名和参数分多块输出"""
+    chunks = [
+        make_chunk({"role": "assistant", "reasoning_content": "think "}),
+        make_chunk({"reasoning_content": "more"}),
+        make_chunk({"tool_calls": [{"index": 0, "id": "call_0", "type": "function", "function": {"name": "sear", "arguments": '{"q": '}}]}),
+        make_chunk({"tool_calls": [{"index": 0, "function": {"name": "ch", "arguments": '"x"}'}}]}),
+        make_chunk({}, finish_reason="tool_calls"),
+        make_chunk(None, usage={"prompt_tokens": 3, "completion_tokens": 9, "total_tokens": 12}),
+    ]
+    await asyncio.sleep(DELAY)
+    for chunk in chunks:
+        yield chunk
+        await asyncio.sleep(DELAY / 2)
+
+
+def test_consume_stream_merges_deltas_and_times_tokens():
+    completion, timing = asyncio.run(consume_stream(fake_stream(), time.monotonic()))
+    message = completion["choices"][0]["message"]
+    assert message["reasoning_content"] == "think more"
+    assert message["tool_calls"] == [{"id": "call_0", "type": "function", "function": {"name": "search", "arguments": '{"q": "x"}'}}]
+    assert completion["choices"][0]["finish_reason"] == "tool_calls"
+    assert completion["usage"]["completion_tokens"] == 9
+    assert timing["TTFT"] >= DELAY * 1000
+    assert timing["ITL"] >= DELAY / 2 * 1000
+    assert timing["TokensPerSec"] > 0
+
+
+def test_summarize_latency_matches_numpy():
+    timings = [{"TTFT": float(i), "ITL": None if i % 3 == 0 else i / 2, "TokensPerSec": 100.0 - i} for i in range(1, 41)]
+    result = summarize_latency(timings)
+    itl = [i / 2 for i in range(1, 41) if i % 3 != 0]
+    for p in (50, 95, 99):
+        assert result[f"TTFT_p{p}"] == np.percentile(range(1, 41), p)
+        assert result[f"ITL_p{p}"] == np.percentile(itl, p)
+    assert summarize_latency([{"TTFT": None, "ITL": None, "TokensPerSec": None}]) == {}
+
+
+def test_stream_mode_reports_latency_percentiles():
+    requester = API_Requester(model="gpt-4o", api_key="mock", base_url="http://localhost", max_workers=4, stream=True)
+
+    async def create(**kwargs):
+        assert kwargs["stream"] and kwargs["stream_options"] == {"include_usage": True}
+        return fake_stream()
+
+    client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+    for endpoint in requester.endpoints.endpoints:
+        endpoint.client = client
+    prompt = {"new_messages": [{"role": "user", "content": "hi"}]}
+    try:
+        outputs = requester.generate([prompt] * 4, {"temperature": 1.0, "max_tokens": 16}, tags=["Bench"] * 4)
+    finally:
+        requester.close()
+    assert [output.outputs[0].text.message.tool_calls[0].function.name for output in outputs] == ["search"] * 4
+    stats = requester.stats("Bench")
+    assert stats["Requests"] == 4 and stats["CompletionTokens"] == 36
+    assert all(f"{key}_p{p}" in stats for key in ("TTFT", "ITL", "TokensPerSec") for p in (50, 95, 99))
+    assert stats["TTFT_p50"] >= DELAY * 1000
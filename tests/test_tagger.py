@@ -0,0 +1,62 @@
+import types
+import importlib
+import multiprocessing.pool
+
+import pytest
+
+from tag.normal_tagger import online_tagger
+
+# tag 包导出了同名的 normal_tagger 函数，需要通过模块名取得模块
+normal_tagger = importlib.import_module("tag.normal_tagger")
+
+
+class RecordingPool(multiprocessing.pool.Pool):
+    """记录创建的进程池，检查子进程是否已经退出"""
+
+    pools = []
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.workers = list(self._pool)
+        self.pools.append(self)
+
+
+class EchoRequester:
+    """把最后一条消息原样作为标注结果返回"""
+
+    def chat(self, chat, **kwargs):
+        message = types.SimpleNamespace(content=chat[-1]["content"])
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+
+def preprocess(data):
+    return [{"role": "user", "content": str(data["id"])}]
+
+
+def test_online_tagger_reuses_pool_across_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(normal_tagger, "Pool", RecordingPool)
+    RecordingPool.pools.clear()
+    data_list = [{"id": i} for i in range(10)]
+    results = online_tagger(
+        [EchoRequester()], {}, data_list, preprocess, lambda data, text: {"id": data["id"], "tag": text},
+        0, 10, 4, str(tmp_path / "tmp.jsonl"), 2,
+    )
+    assert results == [{"id": i, "tag": str(i)} for i in range(10)]
+    (pool,) = RecordingPool.pools
+    assert not any(worker.is_alive() for worker in pool.workers)
+
+
+def test_online_tagger_releases_pool_on_error(monkeypatch):
+    monkeypatch.setattr(normal_tagger, "Pool", RecordingPool)
+    RecordingPool.pools.clear()
+
+    def postprocess(data, text):
+        if data["id"] == 5:
+            raise ValueError(text)
+        return text
+
+    with pytest.raises(ValueError):
+        online_tagger([EchoRequester()], {}, [{"id": i} for i in range(10)], preprocess, postprocess, 0, 10, 4, None, 2)
+    # 出错的批次之后子进程也被终止
+    (pool,) = RecordingPool.pools
+    assert not any(worker.is_alive() for worker in pool.workers)